@@ -0,0 +1,31 @@
+function patients = cohort_patients(results_directory)
+    % COHORT_PATIENTS Returns the patients with results from the cohort index.
+    %
+    % The index is maintained by python_scripts/cohort_index.py: main_comak_workflow_function records
+    % every stage of a patient as it completes ("python cohort_index.py record"), the worker service
+    % records its jobs, and "python cohort_index.py refresh" rebuilds it. It is exported to
+    % cohort_index.json in the results directory.
+    %
+    % Inputs:
+    %   results_directory - Results directory (e.g., '../results').
+    %
+    % Outputs:
+    %   patients - Struct array with the fields name (e.g., 'STRATO_001'), project_id and numeric_id.
+
+    index_file = fullfile(results_directory, 'cohort_index.json');
+    patients = struct('name', {}, 'project_id', {}, 'numeric_id', {});
+
+    if isfile(index_file)
+        index = jsondecode(fileread(index_file));
+        entries = index.patients;
+        if ~iscell(entries)
+            entries = num2cell(entries);
+        end
+        for i = 1:numel(entries)
+            patients(end+1) = struct('name', entries{i}.name, 'project_id', entries{i}.project_id, ...
+                'numeric_id', entries{i}.numeric_id); %#ok<AGROW>
+        end
+    else
+        disp(['ERROR: No cohort index in ' results_directory ' (run python cohort_index.py refresh).']);
+    end
+end
@@ -1,4 +1,4 @@
-function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file, BW, gif_save_path)
+function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file, BW, gif_save_path, tier)
     % CREATE_ANIMATED_JOINT_MECHANICS_GIF Generates an animated GIF of joint mechanics data.
     %
     % This function reads joint mechanics data from an OpenSim .mot file and generates
@@ -8,18 +8,35 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
     % Parameters:
     % project_id (string): The project identifier (e.g., 'HOLOA' or 'STRATO').
     % numeric_id (string): The numeric identifier for the patient.
-    % forces_file (string): The path to the OpenSim .mot file containing the joint mechanics data.
+    % forces_file (string): The joint mechanics results (.h5 file, ForceReporter .sto file or
+    %                      results path without extension, see read_joint_mechanics).
     % BW (double): The body weight of the patient in kilograms.
     % gif_save_path (string): The directory path where the GIF should be saved.
+    % tier (string): Render tier, 'preview', 'report' (default) or 'archive'. The figure is
+    %                rendered directly at the GIF size of the tier with the tier's frame rate.
     %
     % Author: Aurel Berger
     % Date: July 2024
     
+    if nargin < 6
+        tier = 'report';
+    end
+
+    % Render tiers: figure size in pixels and frames per second (same names as paraview_renderer.py)
+    tiers = struct( ...
+        'archive', struct('size', [1800, 1200], 'fps', 25), ...
+        'report', struct('size', [1200, 800], 'fps', 20), ...
+        'preview', struct('size', [720, 480], 'fps', 8));
+    if ~isfield(tiers, tier)
+        error('Unknown render tier ''%s''.', tier);
+    end
+
     % Load data
-    [forces_data, ~, ~] = read_opensim_mot(forces_file);
+    jm = read_joint_mechanics(forces_file, {'mean_pressure', 'mean_pressure_medial', 'mean_pressure_lateral', ...
+        'max_pressure', 'max_pressure_medial', 'max_pressure_lateral', 'contact_area', 'contact_area_medial', 'contact_area_lateral'});
 
     % Normalize time
-    forces_time = forces_data(:, 1);
+    forces_time = jm.time;
     forces_time_norm = (forces_time - forces_time(1)) / (forces_time(end) - forces_time(1)) * 100;
 
     % Body weight
@@ -37,20 +54,20 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
 
     % Animation parameters
     duration = 4; % Total duration of the GIF in seconds
-    fps = 20; % Frames per second
+    fps = tiers.(tier).fps; % Frames per second
     num_frames = duration * fps;
     dt = duration / num_frames;
 
     % Prepare figure for animation
-    fig = figure('Name', 'Animated Joint Mechanics', 'Position', [100, 100, 1200, 800], 'Color', 'w', 'Visible', 'off');
-    set(gcf, 'units', 'normalized', 'outerposition', [0 0 1 1]);
+    % The figure is rendered at the final GIF size, so no frame has to be downscaled
+    fig = figure('Name', 'Animated Joint Mechanics', 'Units', 'pixels', 'Position', [100, 100, tiers.(tier).size], 'Color', 'w', 'Visible', 'off');
 
     % Create subplots for Pressure and Area
     subplot(3, 1, 1);
-    plot(forces_time_norm, forces_data(:, 584) / 1000000, 'k', 'LineWidth', thin_line_width);
+    plot(forces_time_norm, jm.mean_pressure / 1000000, 'k', 'LineWidth', thin_line_width);
     hold on;
-    plot(forces_time_norm, forces_data(:, 635) / 1000000, 'r', 'LineWidth', thick_line_width);
-    plot(forces_time_norm, forces_data(:, 636) / 1000000, 'b', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.mean_pressure_medial / 1000000, 'r', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.mean_pressure_lateral / 1000000, 'b', 'LineWidth', thick_line_width);
     vline1 = xline(0, 'r', 'LineWidth', 2);
     hold off;
     ylabel('Pressure (MPa)', 'FontSize', label_font_size);
@@ -59,10 +76,10 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
     grid on;
 
     subplot(3, 1, 2);
-    plot(forces_time_norm, forces_data(:, 585) / 1000000, 'k', 'LineWidth', thin_line_width);
+    plot(forces_time_norm, jm.max_pressure / 1000000, 'k', 'LineWidth', thin_line_width);
     hold on;
-    plot(forces_time_norm, forces_data(:, 641) / 1000000, 'r', 'LineWidth', thick_line_width);
-    plot(forces_time_norm, forces_data(:, 642) / 1000000, 'b', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.max_pressure_medial / 1000000, 'r', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.max_pressure_lateral / 1000000, 'b', 'LineWidth', thick_line_width);
     vline2 = xline(0, 'r', 'LineWidth', 2);
     hold off;
     ylabel('Pressure (MPa)', 'FontSize', label_font_size);
@@ -71,10 +88,10 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
     grid on;
 
     subplot(3, 1, 3);
-    plot(forces_time_norm, forces_data(:, 578) * 1000000, 'k', 'LineWidth', thin_line_width);
+    plot(forces_time_norm, jm.contact_area * 1000000, 'k', 'LineWidth', thin_line_width);
     hold on;
-    plot(forces_time_norm, forces_data(:, 599) * 1000000, 'r', 'LineWidth', thick_line_width);
-    plot(forces_time_norm, forces_data(:, 600) * 1000000, 'b', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.contact_area_medial * 1000000, 'r', 'LineWidth', thick_line_width);
+    plot(forces_time_norm, jm.contact_area_lateral * 1000000, 'b', 'LineWidth', thick_line_width);
     vline3 = xline(0, 'r', 'LineWidth', 2);
     hold off;
     ylabel('Area (mm^2)', 'FontSize', label_font_size);
@@ -87,7 +104,12 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
     legend_handle = legend({'Total', 'Medial', 'Lateral'}, 'FontSize', legend_font_size, 'Position', [0.9, 0.5, 0.05, 0.1]);
 
     % Initialize the GIF
-    filename = fullfile(gif_save_path, [project_id '_' numeric_id '_animated_joint_mechanics.gif']);
+    % The report tier keeps the file name referenced by the HTML reports
+    if strcmp(tier, 'report')
+        filename = fullfile(gif_save_path, [project_id '_' numeric_id '_animated_joint_mechanics.gif']);
+    else
+        filename = fullfile(gif_save_path, [project_id '_' numeric_id '_animated_joint_mechanics_' tier '.gif']);
+    end
     for t = 1:num_frames
         % Update vertical line position
         time = t * dt / duration * 100;
@@ -108,9 +130,6 @@ function create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file
         else
             imwrite(imind, cm, filename, 'gif', 'WriteMode', 'append', 'DelayTime', delayTimeMilliseconds / 1000);
         end
-
-        % Pause to create animation effect
-        pause(dt);
     end
 
     % Close the figure
@@ -1,7 +1,20 @@
-function create_report()
+function create_report(render_tier)
     % CREATE_REPORT Generates an updated simulation report including all
     % analyzed patients and mean simulation results
-    
+    %
+    % render_tier (string): Tier of the animations shown in the patient reports,
+    %                       'preview', 'report' (default) or 'archive'.
+    %
+    % The report is generated incrementally: report_manifest.json in the
+    % report directory stores a signature of the inputs of every page (the
+    % files of its graphics, the render tier and the generator script) and
+    % only pages whose signature changed are rewritten. The patient
+    % navigation is written once to patients.js and included by all pages,
+    % so adding a patient does not rewrite the existing patient pages.
+
+    if nargin < 1
+        render_tier = 'report';
+    end
     
     % Output directory for the report
     resultsDir = '../results';
@@ -41,34 +54,57 @@ function create_report()
         'Knee Translation X Reserve Actuator', 'Knee Translation Y Reserve Actuator', ...
         'Knee Translation Z Reserve Actuator', 'Ankle Flexor Reserve Actuator'});
     
-    % Find all patient directories
-    patientDirs = dir(resultsDir);
-    patientDirs = patientDirs([patientDirs.isdir]);
-    patientDirs = patientDirs(~ismember({patientDirs.name}, {'.', '..', 'reports'}));
+    % Patients with results from the cohort index (python_scripts/cohort_index.py)
+    patients = cohort_patients(resultsDir);
     
     % Check if there are patient directories
-    if isempty(patientDirs)
+    if isempty(patients)
         error('No patient directories found in the specified results directory.');
     end
     
-    % Create individual patient report links
-    patientLinks = '';
-    for i = 1:length(patientDirs)
-        patientID = patientDirs(i).name;
-        patientReportPath = fullfile(outputDir, [patientID '_results.html']);
-        patientLinks = [patientLinks, sprintf('<option value="%s">%s</option>\n', [patientID '_results.html'], patientID)];
-        generatePatientReport(patientID, patientReportPath, display_names, patientLinks);
-    end
-
-    for i = 1:length(patientDirs)
-        patientID = patientDirs(i).name;
-        patientReportPath = fullfile(outputDir, [patientID '_results.html']);
-        generatePatientReport(patientID, patientReportPath, display_names, patientLinks);
+    % Load the signatures of the pages of the previous run
+    manifestPath = fullfile(outputDir, 'report_manifest.json');
+    manifest = load_manifest(manifestPath);
+    
+    % Shared patient navigation (only rewritten when the patient list changes)
+    patientIDs = {patients.name};
+    write_if_changed(fullfile(outputDir, 'patients.js'), patient_navigation_script(patientIDs));
+    
+    % Create individual patient reports whose inputs changed
+    % The display names are rendered into the patient and mean pages
+    names_version = strjoin(strcat(keys(display_names), '=', values(display_names)), '|');
+    nUpdated = 0;
+    for i = 1:length(patientIDs)
+        patientID = patientIDs{i};
+        pageName = [patientID '_results.html'];
+        info = dir(fullfile(resultsDir, patientID));  % Date shown on the page
+        signature = input_signature({fullfile(resultsDir, patientID, 'graphics')}, ...
+            {render_tier, sprintf('%.10f', info(1).datenum), generator_version('generatePatientReport'), names_version});
+        if needs_update(manifest, pageName, signature, outputDir)
+            generatePatientReport(patientID, fullfile(outputDir, pageName), display_names, render_tier);
+            manifest(pageName) = signature;
+            nUpdated = nUpdated + 1;
+        end
     end
 
     % Create mean report
     meanReportPath = fullfile(outputDir, 'mean_results.html');
-    generateMeanReport(meanReportPath, display_names, patientLinks);
+    signature = input_signature({'../mean_results'}, {strjoin(patientIDs, ','), generator_version('generateMeanReport'), names_version});
+    if needs_update(manifest, 'mean_results.html', signature, outputDir)
+        generateMeanReport(meanReportPath, display_names);
+        manifest('mean_results.html') = signature;
+        nUpdated = nUpdated + 1;
+    end
+    
+    % The main page only depends on this script
+    signature = input_signature({}, {generator_version('create_report')});
+    if ~needs_update(manifest, 'COMAK_Simulation_Results.html', signature, outputDir)
+        save_manifest(manifestPath, manifest);
+        fprintf('Report up to date: %d of %d pages regenerated.\n', nUpdated, length(patientIDs) + 2);
+        return;
+    end
+    manifest('COMAK_Simulation_Results.html') = signature;
+    nUpdated = nUpdated + 1;
     
     % Open the HTML file for writing the main report
     fid = fopen(reportFilePath, 'w');
@@ -102,6 +138,7 @@ function create_report()
     fprintf(fid, '  }\n');
     fprintf(fid, '}\n');
     fprintf(fid, '</script>\n');
+    fprintf(fid, '<script src="patients.js"></script>\n');  % Patient navigation shared by all pages
     fprintf(fid, '</head>\n<body>\n');
     
     % Navigation Bar
@@ -115,7 +152,6 @@ function create_report()
     fprintf(fid, '  <a href="mean_results.html" class="mean-result-page">Mean Simulation Results</a>\n');  % Add class "mean-result-page"
     fprintf(fid, '<select id="patientSelect" onchange="goToPatientReport()">\n');
     fprintf(fid, '<option value="">Select Patient</option>\n');
-    fprintf(fid, '%s\n', patientLinks);
     fprintf(fid, '</select>\n');
     fprintf(fid, '</nav>\n');
     
@@ -264,7 +300,97 @@ function create_report()
     % Close the file
     fclose(fid);
     
+    save_manifest(manifestPath, manifest);
+    
     % Display message
     disp('Main report generated successfully.');
+    fprintf('%d of %d pages regenerated.\n', nUpdated, length(patientIDs) + 2);
+end
+
+
+function manifest = load_manifest(manifestPath)
+    % Loads the page -> input signature map of the previous report run
+    manifest = containers.Map('KeyType', 'char', 'ValueType', 'char');
+    if exist(manifestPath, 'file')
+        entries = jsondecode(fileread(manifestPath));
+        for i = 1:numel(entries)
+            manifest(entries(i).page) = entries(i).signature;
+        end
+    end
 end
 
+
+function save_manifest(manifestPath, manifest)
+    % Saves the page -> input signature map as a list of {page, signature}
+    pages = keys(manifest);
+    entries = struct('page', pages, 'signature', values(manifest, pages));
+    write_if_changed(manifestPath, jsonencode(entries));
+end
+
+
+function update = needs_update(manifest, pageName, signature, outputDir)
+    % A page is rewritten if it is missing or the signature of its inputs changed
+    update = ~isKey(manifest, pageName) || ~strcmp(manifest(pageName), signature) || ...
+        ~exist(fullfile(outputDir, pageName), 'file');
+end
+
+
+function signature = input_signature(directories, extra)
+    % MD5 over the names, sizes and modification dates of all files in the
+    % directories (recursively) and the extra text inputs of a page
+    parts = extra;
+    for d = 1:numel(directories)
+        if ~exist(directories{d}, 'dir')
+            parts{end+1} = [directories{d} '|missing']; %#ok<AGROW>
+            continue;
+        end
+        files = dir(fullfile(directories{d}, '**', '*'));
+        files = files(~[files.isdir]);
+        for f = 1:numel(files)
+            parts{end+1} = sprintf('%s|%d|%.10f', fullfile(files(f).folder, files(f).name), files(f).bytes, files(f).datenum); %#ok<AGROW>
+        end
+    end
+    md = java.security.MessageDigest.getInstance('MD5');
+    md.update(uint8(strjoin(parts, newline)));
+    signature = sprintf('%02x', typecast(md.digest(), 'uint8'));
+end
+
+
+function version = generator_version(scriptName)
+    % Modification date of a report script, so changed layouts are regenerated
+    info = dir(which(scriptName));
+    version = sprintf('%s|%.10f', scriptName, info.datenum);
+end
+
+
+function script = patient_navigation_script(patientIDs)
+    % JavaScript filling the patient select of every page from one list
+    quoted = cellfun(@(id) ['"' id '"'], patientIDs, 'UniformOutput', false);
+    script = sprintf([ ...
+        '// Generated by create_report.m\n' ...
+        'var COMAK_PATIENTS = [%s];\n' ...
+        'document.addEventListener("DOMContentLoaded", function() {\n' ...
+        '  var select = document.getElementById("patientSelect");\n' ...
+        '  if (!select) { return; }\n' ...
+        '  for (var i = 0; i < COMAK_PATIENTS.length; i++) {\n' ...
+        '    var option = document.createElement("option");\n' ...
+        '    option.value = COMAK_PATIENTS[i] + "_results.html";\n' ...
+        '    option.text = COMAK_PATIENTS[i];\n' ...
+        '    select.appendChild(option);\n' ...
+        '  }\n' ...
+        '});\n'], strjoin(quoted, ', '));
+end
+
+
+function write_if_changed(filePath, content)
+    % Writes a text file only if its content differs from the file on disk
+    if exist(filePath, 'file') && strcmp(fileread(filePath), content)
+        return;
+    end
+    fid = fopen(filePath, 'w');
+    if fid == -1
+        error('Could not open %s for writing.', filePath);
+    end
+    fwrite(fid, content, 'char');
+    fclose(fid);
+end
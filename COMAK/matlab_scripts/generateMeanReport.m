@@ -1,4 +1,4 @@
-function generateMeanReport(MeanReportPath, display_names, patientLinks)
+function generateMeanReport(MeanReportPath, display_names)
     % Generate an individual report for a patient
     fid = fopen(MeanReportPath, 'w');
     if fid == -1
@@ -62,6 +62,7 @@ function generateMeanReport(MeanReportPath, display_names, patientLinks)
     fprintf(fid, '  setInterval(resetGIFs, 4000); // Reset every 4 seconds (duration of GIFs)\n');
     fprintf(fid, '};\n');
     fprintf(fid, '</script>\n');
+    fprintf(fid, '<script src="patients.js"></script>\n');  % Patient navigation shared by all pages
     fprintf(fid, '</head>\n<body>\n');
     
     % Navigation Bar
@@ -74,7 +75,6 @@ function generateMeanReport(MeanReportPath, display_names, patientLinks)
     fprintf(fid, '  <a href="#Validation_Muscle_Activations_EMG">Validation of Muscle Activations with EMG</a>\n');
     fprintf(fid, '  <select id="patientSelect" onchange="goToPatientReport()">\n');
     fprintf(fid, '    <option value="">Select Patient</option>\n');
-    fprintf(fid, '%s\n', patientLinks);
     fprintf(fid, '  </select>\n');
     fprintf(fid, '</nav>\n');
 
@@ -1,5 +1,12 @@
-function generatePatientReport(patientID, patientReportPath, display_names, patientLinks)
+function generatePatientReport(patientID, patientReportPath, display_names, render_tier)
     % Generate an individual report for a patient
+    % render_tier selects the animation files ('report' uses the files without a tier suffix)
+    if nargin < 4 || strcmp(render_tier, 'report')
+        animationSuffix = '';
+    else
+        animationSuffix = ['_' render_tier];
+    end
+
     fid = fopen(patientReportPath, 'w');
     if fid == -1
         error('Could not open file for writing.');
@@ -52,6 +59,7 @@ function generatePatientReport(patientID, patientReportPath, display_names, pati
     fprintf(fid, '  setInterval(resetGIFs, 4000); // Reset every 4 seconds (duration of GIFs)\n');
     fprintf(fid, '};\n');
     fprintf(fid, '</script>\n');
+    fprintf(fid, '<script src="patients.js"></script>\n');  % Patient navigation shared by all pages
     fprintf(fid, '</head>\n<body>\n');
     
     % Navigation Bar
@@ -64,7 +72,6 @@ function generatePatientReport(patientID, patientReportPath, display_names, pati
     fprintf(fid, '  <a href="#Validation_Muscle_Activations_EMG">Validation of Muscle Activations with EMG</a>\n');
     fprintf(fid, '  <select id="patientSelect" onchange="goToPatientReport()">\n');
     fprintf(fid, '    <option value="">Select Patient</option>\n');
-    fprintf(fid, '%s\n', patientLinks);
     fprintf(fid, '  </select>\n');
     fprintf(fid, '</nav>\n');
 
@@ -85,13 +92,13 @@ function generatePatientReport(patientID, patientReportPath, display_names, pati
     % Side View GIF
     fprintf(fid, '<div style="text-align: center; margin: 10px;">\n');
     fprintf(fid, '<h3 id="Side_View" style="font-size: 1.5em; color: #444;">Joint Contact Pressure (Side View)</h3>\n');
-    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/side_animation_%s.gif" alt="Side View Animation" style="max-width:100%%; height:auto;">\n', patientID, patientID);
+    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/side_animation_%s%s.gif" alt="Side View Animation" style="max-width:100%%; height:auto;">\n', patientID, patientID, animationSuffix);
     fprintf(fid, '</div>\n');
     
     % Top View GIF
     fprintf(fid, '<div style="text-align: center; margin: 10px;">\n');
     fprintf(fid, '<h3 id="Top_View" style="font-size: 1.5em; color: #444;">Joint Contact Pressure (Top View)</h3>\n');
-    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/top_animation_%s.gif" alt="Top View Animation" style="max-width:100%%; height:auto;">\n', patientID, patientID);
+    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/top_animation_%s%s.gif" alt="Top View Animation" style="max-width:100%%; height:auto;">\n', patientID, patientID, animationSuffix);
     fprintf(fid, '</div>\n');
     
     % End of flexbox container
@@ -104,7 +111,7 @@ function generatePatientReport(patientID, patientReportPath, display_names, pati
     fprintf(fid, '</div>\n');  % Close the left-margin div
     
     % Plot without left margin
-    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/%s_animated_joint_mechanics.gif" alt="Contact Area and Pressure Plot" style="max-width:100%%; height:auto;">\n', patientID, patientID);
+    fprintf(fid, '<img class="sync-gif" src="../results/%s/graphics/paraview/%s_animated_joint_mechanics%s.gif" alt="Contact Area and Pressure Plot" style="max-width:100%%; height:auto;">\n', patientID, patientID, animationSuffix);
     fprintf(fid, '</section>\n');
 
 
@@ -0,0 +1,39 @@
+function channels = joint_mechanics_channels()
+    % JOINT_MECHANICS_CHANNELS Returns the joint mechanics channels used by the plots and reports.
+    %
+    % Every channel is read from the tibiofemoral contact (tibia cartilage) either from the
+    % HDF5 file of the JointMechanicsTool or, for older results, from the columns of the
+    % ForceReporter .sto file. Keep in sync with CHANNELS in python_scripts/joint_mechanics_h5.py.
+    %
+    % Outputs:
+    %   channels - Struct, channel name -> struct with fields:
+    %              output      - Smith2018ArticularContactForce output in the HDF5 file.
+    %              region      - Region index of regional outputs, 0 for totals. The six regions are the
+    %                            half spaces [+x, -x, +y, -y, +z, -z] of the tibia cartilage frame,
+    %                            so 5 (+z) is the medial and 6 (-z) the lateral compartment.
+    %              sto_columns - Columns in the ForceReporter .sto file.
+
+    channels = struct();
+    channels.contact_area = channel('total_contact_area', 0, 578);
+    channels.contact_area_medial = channel('regional_contact_area', 5, 599);
+    channels.contact_area_lateral = channel('regional_contact_area', 6, 600);
+    channels.mean_pressure = channel('total_mean_pressure', 0, 584);
+    channels.mean_pressure_medial = channel('regional_mean_pressure', 5, 635);
+    channels.mean_pressure_lateral = channel('regional_mean_pressure', 6, 636);
+    channels.max_pressure = channel('total_max_pressure', 0, 585);
+    channels.max_pressure_medial = channel('regional_max_pressure', 5, 641);
+    channels.max_pressure_lateral = channel('regional_max_pressure', 6, 642);
+    channels.center_of_pressure = channel('total_center_of_pressure', 0, 586:588);
+    channels.center_of_pressure_medial = channel('regional_center_of_pressure', 5, 655:657);
+    channels.center_of_pressure_lateral = channel('regional_center_of_pressure', 6, 658:660);
+    channels.contact_force = channel('total_contact_force', 0, 589:591);
+    channels.contact_force_medial = channel('regional_contact_force', 5, 673:675);
+    channels.contact_force_lateral = channel('regional_contact_force', 6, 676:678);
+    channels.contact_moment = channel('total_contact_moment', 0, 592:594);
+    channels.contact_moment_medial = channel('regional_contact_moment', 5, 691:693);
+    channels.contact_moment_lateral = channel('regional_contact_moment', 6, 694:696);
+end
+
+function c = channel(output, region, sto_columns)
+    c = struct('output', output, 'region', region, 'sto_columns', sto_columns);
+end
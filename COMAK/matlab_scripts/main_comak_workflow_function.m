@@ -1,4 +1,4 @@
-function main_comak_workflow_function(directory_path)
+function main_comak_workflow_function(directory_path, render_tier)
     % MAIN_COMAK_WORKFLOW_FUNCTION Executes the COMAK workflow for motion analysis.
     %
     % This function processes directories containing patient data, extracting
@@ -7,11 +7,15 @@ function main_comak_workflow_function(directory_path)
     %
     % Parameters:
     %   directory_path (string): The path to the main directory containing patient subdirectories.
+    %   render_tier (string): Tier of the report animations, 'preview', 'report' (default) or 'archive'.
     %
     % Author: Aurel Berger
     % Date: July 2024
 
     import org.opensim.modeling.*
+    if nargin < 2
+        render_tier = 'report';
+    end
     Logger.setLevelString('Debug');
     
     % Get the full path of the currently running MATLAB file
@@ -139,19 +143,25 @@ function main_comak_workflow_function(directory_path)
             ik_time_start = tic;
             run_ik(model_file, motion_file, comak_inverse_kinematics_result_dir, numeric_id, project_id, results_basename, time_start, time_stop);
             time_ik = time_ik + toc(ik_time_start);
+            record_cohort_stage(project_id, numeric_id, 'comak_inverse_kinematics', directory_path);
             fprintf('Run time for IK %s: %.2f seconds\n', subdir, time_ik);
 
             % Run standard comak without muscle weights and contact energy = 100
             comak_time_start = tic;
             run_comak(model_file, ext_load_file, comak_result_dir, numeric_id, project_id, results_basename, time_start, time_stop);
             time_comak = time_comak + toc(comak_time_start);
+            record_cohort_stage(project_id, numeric_id, 'comak', directory_path);
             fprintf('Run time for COMAK %s: %.2f seconds\n', subdir, time_comak);
 
             mech_time_start = tic;
             run_joint_mechanics(model_file, comak_result_dir, joint_mechanics_result_dir, numeric_id, project_id, results_basename, time_start, time_stop);
             time_mech = time_mech + toc(mech_time_start);
+            record_cohort_stage(project_id, numeric_id, 'joint_mechanics', directory_path);
             fprintf('Run time for Joint Mechanics %s: %.2f seconds\n', subdir, time_mech);
 
+            % Summary metrics of the patient (peak pressures, contact forces, ...) in the cohort index
+            run_summary_metrics(project_id, numeric_id);
+
     
             %% Set global plot parameters
             set(0, 'DefaultLineLineWidth', 2); % Default line width
@@ -163,7 +173,8 @@ function main_comak_workflow_function(directory_path)
 
             %% Set parameters for functions
             sf_emg = 1000;
-            forces_file = fullfile(currentDirectory, ['../results/' project_id '_' numeric_id '/joint_mechanics/walking_' numeric_id '_ForceReporter_forces.sto']);
+            % Joint mechanics results without extension: the .h5 file is read if it exists (see read_joint_mechanics)
+            forces_file = fullfile(currentDirectory, ['../results/' project_id '_' numeric_id '/joint_mechanics/walking_' numeric_id]);
             gif_save_path = ['../results/' project_id '_' numeric_id '/graphics/paraview'];
 
             %% Call plotting function for specific patients
@@ -171,21 +182,18 @@ function main_comak_workflow_function(directory_path)
             time_visualization_start = tic;
 
             % Paraview Visualization of vtp files
-            runParaviewVisualization(numeric_id, project_id);
+            runParaviewVisualization(numeric_id, project_id, render_tier);
 
             % Plot joint mechanics
-            create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file, BW, gif_save_path);
+            create_animated_joint_mechanics_gif(project_id, numeric_id, forces_file, BW, gif_save_path, render_tier);
             plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW);
 
-            % Plot all kinematics (tibiofemoral and patellofemoral)
-            plot_kinematics(numeric_id, project_id);
+            % Plot all kinematics (tibiofemoral and patellofemoral), muscle activations and reserve actuators
+            render_plots({'kinematics', 'activations'}, {[project_id '_' numeric_id]});
 
             % Compare IK results with MoCap
             plot_primary_coordinates_vs_mocap(numeric_id, project_id, directory_walking);
 
-            % Plot muscle activations and reserve actuators
-            plot_activations(project_id, numeric_id);
-
             % Compare results with EMG data
             plot_activation_vs_emg(project_id, numeric_id, BW, time_start, time_stop, sf_emg);
 
@@ -219,8 +227,8 @@ function main_comak_workflow_function(directory_path)
     % Compare IK results with MoCap
     plot_all_patients_primary_coordinates_vs_mocap();
 
-    % Plot muscle activations and reserve actuators
-    plot_all_patients_activations();
+    % Plot mean muscle activations and reserve actuators
+    render_plots({'mean_activations'});
 
     % Compare results with EMG data
     plot_all_patients_activation_vs_emg(sf_emg);
@@ -230,7 +238,7 @@ function main_comak_workflow_function(directory_path)
 
 
     %% Create HTML report
-    create_report();
+    create_report(render_tier);
 
 end
 
@@ -58,17 +58,14 @@ function plot_all_patients_activations()
     % Suppress warnings temporarily
     warning('off', 'MATLAB:table:ModifiedAndSavedVarnames');
 
-    % Get all subdirectories in the results directory, excluding specified ones
-    subdirs = dir(results_directory);
-    subdirs = subdirs([subdirs.isdir]);
-    exclude_dirs = {'.', '..', 'images_for_visualizations', 'paraview_template_files', 'reports'};
-    subdirs = subdirs(~ismember({subdirs.name}, exclude_dirs));
+    % Patients with results from the cohort index (python_scripts/cohort_index.py)
+    patients = cohort_patients(results_directory);
 
     % Iterate through each patient directory
-    for i = 1:length(subdirs)
-        subdir = subdirs(i).name;
+    for i = 1:length(patients)
+        subdir = patients(i).name;
         project_patient_dir = fullfile(results_directory, subdir, 'comak');
-        patient_id = subdir(end-2:end); % last 3 characters of the directory name
+        patient_id = patients(i).numeric_id;
 
         % Try to load simulation activation data
         try
@@ -26,7 +26,6 @@ function plot_all_patients_joint_mechanics()
     % Set parameters
     Time_steps = 100;
     Time_normed = linspace(0, 100, Time_steps);
-    ftype = fittype('linearinterp');
 
     % Initialize data storage for each joint mechanics variable
     contact_forces_labels = {'contact_force_ap', 'contact_force_si', 'contact_force_ml'};
@@ -45,57 +44,52 @@ function plot_all_patients_joint_mechanics()
     % Suppress warnings temporarily
     warning('off', 'MATLAB:table:ModifiedAndSavedVarnames');
 
-    % Get all subdirectories in the results directory, excluding specified ones
-    subdirs = dir(results_directory);
-    subdirs = subdirs([subdirs.isdir]);
-    exclude_dirs = {'.', '..', 'images_for_visualizations', 'paraview_template_files', 'reports'};
-    subdirs = subdirs(~ismember({subdirs.name}, exclude_dirs));
+    % Patients with results from the cohort index (python_scripts/cohort_index.py)
+    patients = cohort_patients(results_directory);
 
     % Iterate through each patient directory
-    for i = 1:length(subdirs)
-        subdir = subdirs(i).name;
+    for i = 1:length(patients)
+        subdir = patients(i).name;
         project_patient_dir = fullfile(results_directory, subdir, 'joint_mechanics');
-        patient_id = subdir(end-2:end); % last 3 characters of the directory name
+        patient_id = patients(i).numeric_id;
 
         % Try to load simulation joint mechanics data
         try
-            [forces_data, ~, ~] = read_opensim_mot(fullfile(project_patient_dir, ['walking_' patient_id '_ForceReporter_forces.sto']));
+            jm = read_joint_mechanics(fullfile(project_patient_dir, ['walking_' patient_id]), ...
+                {'contact_force', 'contact_force_medial', 'contact_force_lateral', 'contact_moment', 'contact_moment_medial', ...
+                'contact_moment_lateral', 'center_of_pressure', 'center_of_pressure_medial', 'center_of_pressure_lateral'});
         catch
             disp(['ERROR: Simulation results not found for ' subdir '!']);
             continue;
         end
 
-        % Normalize and resample simulation data
-        time = forces_data(:, 1);
+        % Normalize and resample simulation data (only the channels used below)
+        time = jm.time;
         time_normed = (time - time(1)) / (time(end) - time(1)) * 100;
-        resampled_forces_data = zeros(length(Time_normed), size(forces_data, 2));
-        for j = 2:size(forces_data, 2) % Start from 2 to skip the time column
-            fit_values = fit(time_normed, forces_data(:, j), ftype);
-            resampled_forces_data(:, j) = feval(fit_values, Time_normed');
-        end
+        resample = @(x) interp1(time_normed, x, Time_normed', 'linear');
 
         % Append resampled joint mechanics data to the corresponding variable field
         for k = 1:3
             all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end)]) = ...
-                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end)]); resampled_forces_data(:, 588 + k)'];
+                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end)]); resample(jm.contact_force(:, k))'];
             all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_medial']) = ...
-                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_medial']); resampled_forces_data(:, 672 + k)'];
+                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_medial']); resample(jm.contact_force_medial(:, k))'];
             all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_lateral']) = ...
-                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_lateral']); resampled_forces_data(:, 675 + k)'];
+                [all_joint_mech_data.(['contact_force' contact_forces_labels{k}(14:end) '_lateral']); resample(jm.contact_force_lateral(:, k))'];
 
             all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end)]) = ...
-                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end)]); resampled_forces_data(:, 591 + k)'];
+                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end)]); resample(jm.contact_moment(:, k))'];
             all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_medial']) = ...
-                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_medial']); resampled_forces_data(:, 690 + k)'];
+                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_medial']); resample(jm.contact_moment_medial(:, k))'];
             all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_lateral']) = ...
-                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_lateral']); resampled_forces_data(:, 693 + k)'];
+                [all_joint_mech_data.(['reaction_moment' reaction_moments_labels{k}(16:end) '_lateral']); resample(jm.contact_moment_lateral(:, k))'];
 
             all_joint_mech_data.(['cop_' cop_labels{k}(5:end)]) = ...
-                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end)]); resampled_forces_data(:, 585 + k)' * 1000];
+                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end)]); resample(jm.center_of_pressure(:, k))' * 1000];
             all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_medial']) = ...
-                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_medial']); resampled_forces_data(:, 654 + k)' * 1000];
+                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_medial']); resample(jm.center_of_pressure_medial(:, k))' * 1000];
             all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_lateral']) = ...
-                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_lateral']); resampled_forces_data(:, 657 + k)' * 1000];
+                [all_joint_mech_data.(['cop_' cop_labels{k}(5:end) '_lateral']); resample(jm.center_of_pressure_lateral(:, k))' * 1000];
         end
     end
 
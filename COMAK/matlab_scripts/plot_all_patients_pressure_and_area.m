@@ -26,7 +26,6 @@ function plot_all_patients_pressure_and_area()
     % Set parameters
     Time_steps = 100;
     Time_normed = linspace(0, 100, Time_steps);
-    ftype = fittype('linearinterp');
 
     % Initialize data storage for each joint mechanics variable
     labels = {'mean_contact_pressure', 'max_contact_pressure', 'contact_area'};
@@ -40,56 +39,51 @@ function plot_all_patients_pressure_and_area()
     % Suppress warnings temporarily
     warning('off', 'MATLAB:table:ModifiedAndSavedVarnames');
 
-    % Get all subdirectories in the results directory, excluding specified ones
-    subdirs = dir(results_directory);
-    subdirs = subdirs([subdirs.isdir]);
-    exclude_dirs = {'.', '..', 'images_for_visualizations', 'paraview_template_files', 'reports'};
-    subdirs = subdirs(~ismember({subdirs.name}, exclude_dirs));
+    % Patients with results from the cohort index (python_scripts/cohort_index.py)
+    patients = cohort_patients(results_directory);
 
     % Iterate through each patient directory
-    for i = 1:length(subdirs)
-        subdir = subdirs(i).name;
+    for i = 1:length(patients)
+        subdir = patients(i).name;
         project_patient_dir = fullfile(results_directory, subdir, 'joint_mechanics');
-        patient_id = subdir(end-2:end); % last 3 characters of the directory name
+        patient_id = patients(i).numeric_id;
 
         % Try to load simulation joint mechanics data
         try
-            [forces_data, ~, ~] = read_opensim_mot(fullfile(project_patient_dir, ['walking_' patient_id '_ForceReporter_forces.sto']));
+            jm = read_joint_mechanics(fullfile(project_patient_dir, ['walking_' patient_id]), ...
+                {'mean_pressure', 'mean_pressure_medial', 'mean_pressure_lateral', 'max_pressure', 'max_pressure_medial', ...
+                'max_pressure_lateral', 'contact_area', 'contact_area_medial', 'contact_area_lateral'});
         catch
             disp(['ERROR: Simulation results not found for ' subdir '!']);
             continue;
         end
 
-        % Normalize and resample simulation data
-        time = forces_data(:, 1);
+        % Normalize and resample simulation data (only the channels used below)
+        time = jm.time;
         time_normed = (time - time(1)) / (time(end) - time(1)) * 100;
-        resampled_forces_data = zeros(length(Time_normed), size(forces_data, 2));
-        for j = 2:size(forces_data, 2) % Start from 2 to skip the time column
-            fit_values = fit(time_normed, forces_data(:, j), ftype);
-            resampled_forces_data(:, j) = feval(fit_values, Time_normed');
-        end
+        resample = @(x) interp1(time_normed, x, Time_normed', 'linear');
 
         % Append resampled joint mechanics data to the corresponding variable field
         all_joint_mech_data.mean_contact_pressure = ...
-            [all_joint_mech_data.mean_contact_pressure; resampled_forces_data(:, 584)'];
+            [all_joint_mech_data.mean_contact_pressure; resample(jm.mean_pressure)'];
         all_joint_mech_data.mean_contact_pressure_medial = ...
-            [all_joint_mech_data.mean_contact_pressure_medial; resampled_forces_data(:, 635)'];
+            [all_joint_mech_data.mean_contact_pressure_medial; resample(jm.mean_pressure_medial)'];
         all_joint_mech_data.mean_contact_pressure_lateral = ...
-            [all_joint_mech_data.mean_contact_pressure_lateral; resampled_forces_data(:, 636)'];
+            [all_joint_mech_data.mean_contact_pressure_lateral; resample(jm.mean_pressure_lateral)'];
 
         all_joint_mech_data.max_contact_pressure = ...
-            [all_joint_mech_data.max_contact_pressure; resampled_forces_data(:, 585)'];
+            [all_joint_mech_data.max_contact_pressure; resample(jm.max_pressure)'];
         all_joint_mech_data.max_contact_pressure_medial = ...
-            [all_joint_mech_data.max_contact_pressure_medial; resampled_forces_data(:, 641)'];
+            [all_joint_mech_data.max_contact_pressure_medial; resample(jm.max_pressure_medial)'];
         all_joint_mech_data.max_contact_pressure_lateral = ...
-            [all_joint_mech_data.max_contact_pressure_lateral; resampled_forces_data(:, 642)'];
+            [all_joint_mech_data.max_contact_pressure_lateral; resample(jm.max_pressure_lateral)'];
 
         all_joint_mech_data.contact_area = ...
-            [all_joint_mech_data.contact_area; resampled_forces_data(:, 578)' * 1000000];
+            [all_joint_mech_data.contact_area; resample(jm.contact_area)' * 1000000];
         all_joint_mech_data.contact_area_medial = ...
-            [all_joint_mech_data.contact_area_medial; resampled_forces_data(:, 599)' * 1000000];
+            [all_joint_mech_data.contact_area_medial; resample(jm.contact_area_medial)' * 1000000];
         all_joint_mech_data.contact_area_lateral = ...
-            [all_joint_mech_data.contact_area_lateral; resampled_forces_data(:, 600)' * 1000000];
+            [all_joint_mech_data.contact_area_lateral; resample(jm.contact_area_lateral)' * 1000000];
     end
 
     % Turn warnings back on
@@ -9,7 +9,8 @@ function plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW)
     % Inputs:
     %   project_id - Identifier for the project.
     %   numeric_id - Numeric identifier for the patient.
-    %   forces_file - Path to the file containing joint forces data.
+    %   forces_file - Joint mechanics results (.h5 file, ForceReporter .sto file or results
+    %                 path without extension, see read_joint_mechanics).
     %   BW - Body weight in kilograms, used for normalization.
     %
     % Outputs:
@@ -20,10 +21,12 @@ function plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW)
     % Date: July 2024
 
     % Load data
-    [forces_data, ~, ~] = read_opensim_mot(forces_file);
+    jm = read_joint_mechanics(forces_file, {'contact_force', 'contact_force_medial', 'contact_force_lateral', ...
+        'contact_moment', 'contact_moment_medial', 'contact_moment_lateral', ...
+        'center_of_pressure', 'center_of_pressure_medial', 'center_of_pressure_lateral'});
 
     % Normalize time
-    forces_time = forces_data(:, 1);
+    forces_time = jm.time;
     forces_time_norm = (forces_time - forces_time(1)) / (forces_time(end) - forces_time(1)) * 100;
 
     % Body weight
@@ -54,13 +57,13 @@ function plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW)
         hold on;
 
         % Plot total contact forces
-        plot(forces_time_norm, forces_data(:, 588 + i) / BW, 'k', 'LineWidth', thin_line_width);
+        plot(forces_time_norm, jm.contact_force(:, i) / BW, 'k', 'LineWidth', thin_line_width);
 
         % Plot forces for medial compartment
-        plot(forces_time_norm, forces_data(:, 672 + i) / BW, 'r', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.contact_force_medial(:, i) / BW, 'r', 'LineWidth', thick_line_width);
 
         % Plot forces for lateral compartment
-        plot(forces_time_norm, forces_data(:, 675 + i) / BW, 'b', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.contact_force_lateral(:, i) / BW, 'b', 'LineWidth', thick_line_width);
 
         hold off;
         ylabel('Joint Contact Force [BW]');
@@ -82,13 +85,13 @@ function plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW)
         hold on;
 
         % Plot total reaction moments
-        plot(forces_time_norm, forces_data(:, 591 + i), 'k', 'LineWidth', thin_line_width);
+        plot(forces_time_norm, jm.contact_moment(:, i), 'k', 'LineWidth', thin_line_width);
 
         % Plot moments for medial compartment
-        plot(forces_time_norm, forces_data(:, 690 + i), 'r', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.contact_moment_medial(:, i), 'r', 'LineWidth', thick_line_width);
 
         % Plot moments for lateral compartment
-        plot(forces_time_norm, forces_data(:, 693 + i), 'b', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.contact_moment_lateral(:, i), 'b', 'LineWidth', thick_line_width);
 
         hold off;
         ylabel('Joint Reaction Moments [Nm]');
@@ -110,13 +113,13 @@ function plot_joint_mechanics_extended(project_id, numeric_id, forces_file, BW)
         hold on;
 
         % Plot total center of pressure in each dimension
-        plot(forces_time_norm, forces_data(:, 585 + i) * 1000, 'k', 'LineWidth', thin_line_width);
+        plot(forces_time_norm, jm.center_of_pressure(:, i) * 1000, 'k', 'LineWidth', thin_line_width);
 
         % Plot center of pressure in each dimension for medial compartment
-        plot(forces_time_norm, forces_data(:, 654 + i) * 1000, 'r', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.center_of_pressure_medial(:, i) * 1000, 'r', 'LineWidth', thick_line_width);
 
         % Plot center of pressure in each dimension for lateral compartment
-        plot(forces_time_norm, forces_data(:, 657 + i) * 1000, 'b', 'LineWidth', thick_line_width);
+        plot(forces_time_norm, jm.center_of_pressure_lateral(:, i) * 1000, 'b', 'LineWidth', thick_line_width);
 
         hold off;
         ylabel('CoP [mm]');
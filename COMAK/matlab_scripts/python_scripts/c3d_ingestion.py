@@ -0,0 +1,318 @@
+import os
+import sys
+import glob
+
+import numpy as np
+
+import cohort
+import setup_generator
+import kinematics_preprocessing
+from sto_io import write_sto
+
+# Rotation of the laboratory frame of the C3D files (Z up) into the OpenSim frame (Y up)
+DEFAULT_ROTATION = ('x', -90.0)
+
+# Force plate number -> side of the foot, named like the columns of the BTS GRF export
+# so that the ExternalForce identifiers of template_ext_loads.xml stay valid
+DEFAULT_PLATES = {1: 'r', 2: 'l'}
+PLATE_BODIES = {'r': 'calcn_r', 'l': 'calcn_l'}
+
+# C3DFileAdapter force table columns (N, mm, Nmm) -> (GRF column prefix, scale to N, m, Nm)
+FORCE_COLUMNS = {'f': ('gr_force_v', 1.0), 'p': ('gr_force_p', 1e-3), 'm': ('gr_torque_', 1e-3)}
+
+
+def rotation_matrix(axis, degrees):
+    """
+    Returns the rotation matrix about a coordinate axis.
+
+    Parameters:
+    axis (str): 'x', 'y' or 'z'.
+    degrees (float): Rotation angle in degrees.
+
+    Returns:
+    np.ndarray: 3x3 rotation matrix.
+    """
+    c, s = np.cos(np.radians(degrees)), np.sin(np.radians(degrees))
+    i, j = [(1, 2), (2, 0), (0, 1)]['xyz'.index(axis)]
+    rotation = np.eye(3)
+    rotation[i, i], rotation[i, j], rotation[j, i], rotation[j, j] = c, -s, s, c
+    return rotation
+
+
+def vec3_table_to_numpy(table, time_start=None, time_stop=None):
+    """
+    Converts a TimeSeriesTableVec3 into NumPy, trimmed to a time window.
+
+    Parameters:
+    table (osim.TimeSeriesTableVec3): Table as returned by the C3DFileAdapter.
+    time_start (float): First time to keep. Optional.
+    time_stop (float): Last time to keep. Optional.
+
+    Returns:
+    tuple: (time (frames,), labels, data (frames x columns x 3))
+    """
+    time = np.array(table.getIndependentColumn())
+    data = table.flatten().getMatrix().to_numpy().reshape(len(time), -1, 3)
+    keep = np.ones(len(time), dtype=bool)
+    if time_start is not None:
+        keep &= time >= time_start - 1e-9
+    if time_stop is not None:
+        keep &= time <= time_stop + 1e-9
+    return time[keep], list(table.getColumnLabels()), data[keep]
+
+
+def read_c3d(c3d_file, time_start=None, time_stop=None, rotation=DEFAULT_ROTATION):
+    """
+    Reads the markers and force plates of a C3D file once, trimmed to a time window and
+    converted to the OpenSim frame and units. Nothing is written to disk.
+
+    Parameters:
+    c3d_file (str): Path to the C3D file.
+    time_start (float): Start of the window (e.g., first right heel strike). Optional.
+    time_stop (float): End of the window (e.g., second right heel strike). Optional.
+    rotation (tuple): (axis, degrees) from the laboratory frame into the OpenSim frame.
+
+    Returns:
+    dict: 'markers' (osim.TimeSeriesTableVec3 in m) and 'forces' (dict with 'time',
+    'plates' (plate numbers) and 'data' (frames x plates x [force, point, moment] x 3) in N, m, Nm).
+    """
+    import opensim as osim
+
+    if not os.path.isfile(c3d_file):
+        raise FileNotFoundError(f'C3D file not found: {c3d_file}')
+
+    adapter = osim.C3DFileAdapter()
+    adapter.setLocationForForceExpression(1)  # Forces at the center of pressure
+    tables = adapter.read(c3d_file)
+    rotation = rotation_matrix(*rotation) if rotation else np.eye(3)
+
+    # Markers: mm -> m, rotated, rebuilt as a Vec3 table for the MarkersReference
+    time, labels, data = vec3_table_to_numpy(adapter.getMarkersTable(tables), time_start, time_stop)
+    data = data @ rotation.T * 1e-3
+    flat = osim.TimeSeriesTable(osim.StdVectorDouble(time.tolist()),
+                                osim.Matrix.createFromMat(data.reshape(len(time), -1)),
+                                osim.StdVectorString([f'{label}_{i}' for label in labels for i in (1, 2, 3)]))
+    markers = flat.packVec3()
+    markers.addTableMetaDataString('Units', 'm')
+    markers.addTableMetaDataString('DataRate', f'{1 / np.mean(np.diff(time)):.6f}')
+
+    # Force plates: labels f1, p1, m1, f2, ... -> frames x plates x 3 x 3
+    time, labels, data = vec3_table_to_numpy(adapter.getForcesTable(tables), time_start, time_stop)
+    plates = sorted({int(label[1:]) for label in labels})
+    forces = np.zeros((len(time), len(plates), 3, 3))
+    for column, label in enumerate(labels):
+        quantity = 'fpm'.index(label[0])
+        forces[:, plates.index(int(label[1:])), quantity] = data[:, column] @ rotation.T * FORCE_COLUMNS[label[0]][1]
+
+    print(f'[INFO] Read {markers.getNumColumns()} markers and {len(plates)} force plates from {c3d_file}')
+    return {'markers': markers, 'forces': {'time': time, 'plates': plates, 'data': forces}}
+
+
+def marker_weights(ik_task_set):
+    """
+    Converts the marker tasks of an IKTaskSet into the weights of a MarkersReference.
+
+    Parameters:
+    ik_task_set (osim.IKTaskSet): Tasks of the COMAKInverseKinematicsTool.
+
+    Returns:
+    osim.SetMarkerWeights: Weights of the applied marker tasks.
+    """
+    import opensim as osim
+
+    weights = osim.SetMarkerWeights()
+    for i in range(ik_task_set.getSize()):
+        task = ik_task_set.get(i)
+        if task.getApply() and osim.IKMarkerTask.safeDownCast(task):
+            weights.cloneAndAppend(osim.MarkerWeight(task.getName(), task.getWeight()))
+    return weights
+
+
+def run_inverse_kinematics(setup_file, markers):
+    """
+    Runs the COMAK inverse kinematics on in-memory marker data. The secondary constraint
+    simulation of the COMAKInverseKinematicsTool is run (or reused if its constrained model
+    exists), then the markers are tracked on the constrained model with the tool's tasks,
+    constraint weight and accuracy. The _ik.mot and the _ik_marker_errors.sto (total squared,
+    RMS and max marker error per frame, as the IK tool writes it) are written.
+
+    Parameters:
+    setup_file (str): COMAKInverseKinematicsTool setup file.
+    markers (osim.TimeSeriesTableVec3): Marker trajectories in m (see read_c3d).
+
+    Returns:
+    str: Path of the _ik.mot file.
+    """
+    import opensim as osim
+
+    comak_ik = osim.COMAKInverseKinematicsTool(setup_file)
+    comak_ik.set_use_visualizer(False)
+    constrained_model_file = comak_ik.get_constrained_model_file()
+    if not os.path.isfile(constrained_model_file):
+        comak_ik.set_perform_inverse_kinematics(False)
+        print('[INFO] Running the secondary constraint simulation...')
+        comak_ik.run()
+
+    model = osim.Model(constrained_model_file)
+    state = model.initSystem()
+    markers_reference = osim.MarkersReference(markers, marker_weights(comak_ik.get_IKTaskSet()))
+    solver = osim.InverseKinematicsSolver(model, markers_reference, osim.SimTKArrayCoordinateReference(),
+                                          comak_ik.get_ik_constraint_weight())
+    solver.setAccuracy(comak_ik.get_ik_accuracy())
+
+    # Track every marker frame, rotational coordinates in degrees as written by the IK tool
+    time = list(markers.getIndependentColumn())
+    coordinates = [model.getCoordinateSet().get(i) for i in range(model.getCoordinateSet().getSize())]
+    rotational = np.array([c.getMotionType() == osim.Coordinate.Rotational for c in coordinates])
+    values = np.zeros((len(time), len(coordinates)))
+    marker_errors = np.zeros((len(time), 3))
+    errors = osim.SimTKArrayDouble()
+    state.setTime(time[0])
+    solver.assemble(state)
+    for i, t in enumerate(time):
+        state.setTime(t)
+        solver.track(state)
+        values[i] = [c.getValue(state) for c in coordinates]
+        solver.computeCurrentMarkerErrors(errors)
+        squared = np.array([errors.getElt(j) for j in range(errors.size())]) ** 2
+        if len(squared):
+            marker_errors[i] = [squared.sum(), np.sqrt(squared.mean()), np.sqrt(squared.max())]
+    values[:, rotational] = np.degrees(values[:, rotational])
+
+    table = osim.TimeSeriesTable(osim.StdVectorDouble(time), osim.Matrix.createFromMat(values),
+                                 osim.StdVectorString([c.getName() for c in coordinates]))
+    table.addTableMetaDataString('inDegrees', 'yes')
+    motion_file = os.path.join(comak_ik.get_results_directory(), comak_ik.get_output_motion_file())
+    osim.STOFileAdapter.write(table, motion_file)
+    errors_file = os.path.splitext(motion_file)[0] + '_marker_errors.sto'
+    write_sto(errors_file, {'time': np.array(time), 'labels': ['total_squared_error', 'marker_error_RMS', 'marker_error_max'],
+                            'data': marker_errors, 'in_degrees': False}, name='Model Marker Errors from IK')
+    print(f'[INFO] Inverse kinematics of {len(time)} frames written to {motion_file} (marker errors: {errors_file})')
+    return motion_file
+
+
+def external_loads(forces, plates=DEFAULT_PLATES):
+    """
+    Builds the ExternalForces of the feet from in-memory force plate data. The columns follow
+    the BTS GRF export (e.g., r.gr_force_vx, r.gr_force_px, r.gr_torque_x). The forces only
+    reference the Storage, so the caller must keep it alive until the tool has run.
+
+    Parameters:
+    forces (dict): Force plate data as returned by read_c3d.
+    plates (dict): Plate number -> side ('r' or 'l').
+
+    Returns:
+    tuple: (osim.Storage with the force plate data, list of osim.ExternalForce objects, one per assigned plate).
+    """
+    import opensim as osim
+
+    columns, assigned = [], []
+    for plate, side in plates.items():
+        if plate not in forces['plates']:
+            raise KeyError(f'Force plate {plate} not found in the C3D file (plates: {forces["plates"]})')
+        assigned.append(forces['plates'].index(plate))
+        columns += [f'{side}.{FORCE_COLUMNS[q][0]}{axis}' for q in 'fpm' for axis in 'xyz']
+
+    labels = osim.ArrayStr()
+    for label in ['time'] + columns:
+        labels.append(label)
+    storage = osim.Storage(len(forces['time']), 'ground_reaction_forces')
+    storage.setColumnLabels(labels)
+    rows = forces['data'][:, assigned].reshape(len(forces['time']), -1)
+    for t, row in zip(forces['time'], rows):
+        storage.append(float(t), osim.Vector.createFromMat(row))
+
+    loads = []
+    for plate, side in plates.items():
+        force = osim.ExternalForce(storage, f'{side}.gr_force_v', f'{side}.gr_force_p', f'{side}.gr_torque_',
+                                   PLATE_BODIES[side], 'ground', 'ground')
+        force.setName(f'FP{plate}')
+        loads.append(force)
+    return storage, loads
+
+
+def run_comak(setup_file, storage, loads):
+    """
+    Runs the COMAKTool with the external loads added to the model instead of an external loads file.
+
+    Parameters:
+    setup_file (str): COMAKTool setup file.
+    storage (osim.Storage): Force plate data referenced by the loads, held until the run is done.
+    loads (list): osim.ExternalForce objects (see external_loads).
+
+    Returns:
+    None
+    """
+    import opensim as osim
+
+    comak = osim.COMAKTool(setup_file)
+    model = osim.Model(comak.get_model_file())
+    for force in loads:
+        model.addForce(force)
+    comak.set_external_loads_file('')
+    comak.setModel(model)
+    print('[INFO] Running COMAKTool...')
+    comak.run()
+
+
+def ingest_patient(project_id, numeric_id, c3d_file=None, plates=DEFAULT_PLATES, rotation=DEFAULT_ROTATION, comak=True):
+    """
+    Runs the inverse kinematics (and COMAK) of a patient directly from the C3D file of the
+    walking trial, trimmed to the right heel strikes of the BTS event file.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    c3d_file (str): C3D file. Defaults to the C3D file in the walking directory of the patient.
+    plates (dict): Plate number -> side ('r' or 'l').
+    rotation (tuple): (axis, degrees) from the laboratory frame into the OpenSim frame.
+    comak (bool): Also run the COMAKTool with the force plate data.
+
+    Returns:
+    str: Path of the _ik.mot file.
+    """
+    patient = next((p for p in cohort.find_patients() if p['project_id'] == project_id and p['numeric_id'] == numeric_id), None)
+    if patient is None:
+        raise KeyError(f'Patient {project_id}_{numeric_id} not found in {cohort.DATA_DIRECTORY}')
+    if c3d_file is None:
+        files = glob.glob(os.path.join(patient['walking_directory'], '*.c3d'))
+        if not files:
+            raise FileNotFoundError(f"No C3D file found in {patient['walking_directory']}")
+        c3d_file = files[0]
+
+    inputs_directory = cohort.patient_inputs_directory(project_id, numeric_id)
+    setup_files = {tool: os.path.join(inputs_directory, name) for tool, name in setup_generator.SETUP_FILES.items()}
+    for setup_file in setup_files.values():
+        if not os.path.isfile(setup_file):
+            raise FileNotFoundError(f'Setup file not found (run setup_generator.py first): {setup_file}')
+
+    data = read_c3d(c3d_file, patient['time_start'], patient['time_stop'], rotation)
+    motion_file = run_inverse_kinematics(setup_files['COMAKInverseKinematicsTool'], data['markers'])
+    if comak:
+        kinematics_preprocessing.preprocess_kinematics(motion_file)
+        storage, loads = external_loads(data['forces'], plates)
+        run_comak(setup_files['COMAKTool'], storage, loads)
+    return motion_file
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the COMAK inverse kinematics (and COMAK) of a patient directly from a C3D file.')
+    parser.add_argument('project_id', type=str, help='Project identifier (e.g., STRATO).')
+    parser.add_argument('numeric_id', type=str, help='Numeric identifier of the patient (e.g., 001).')
+    parser.add_argument('--c3d', type=str, default=None, help='C3D file (default: the C3D file of the walking trial).')
+    parser.add_argument('--plates', type=str, nargs='*', default=[f'{p}:{s}' for p, s in DEFAULT_PLATES.items()],
+                        help='Force plate assignments as <plate>:<side> (default: 1:r 2:l).')
+    parser.add_argument('--rotation', type=str, nargs=2, default=list(DEFAULT_ROTATION), metavar=('AXIS', 'DEGREES'),
+                        help='Rotation of the laboratory frame into the OpenSim frame (default: x -90).')
+    parser.add_argument('--ik-only', action='store_true', help='Only run the inverse kinematics.')
+    args = parser.parse_args()
+
+    try:
+        plates = {int(plate): side for plate, side in (entry.split(':') for entry in args.plates)}
+        ingest_patient(args.project_id, args.numeric_id, args.c3d, plates,
+                       (args.rotation[0], float(args.rotation[1])), not args.ik_only)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
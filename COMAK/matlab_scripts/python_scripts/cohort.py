@@ -0,0 +1,170 @@
+import os
+import glob
+import xml.etree.ElementTree as ET
+
+# COMAK folder (data/, inputs/, results/ live next to matlab_scripts/)
+COMAK_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATA_DIRECTORY = os.path.join(COMAK_DIRECTORY, 'data')
+INPUTS_DIRECTORY = os.path.join(COMAK_DIRECTORY, 'inputs')
+RESULTS_DIRECTORY = os.path.join(COMAK_DIRECTORY, 'results')
+
+# Patient folder prefixes and the project id used in the results folder names
+PROJECTS = {'HOLOA': 'HOLOA', 'STRATO': 'STRATO'}
+
+# Result sub-directories created for every patient
+RESULT_STAGES = ['comak_inverse_kinematics', 'comak', 'joint_mechanics', 'graphics']
+
+
+def extract_bodyweight_from_emt(directory):
+    """
+    Extracts the body weight from the .emt mass file in a patient directory (see extract_bodyweight_from_emt.m).
+
+    Parameters:
+    directory (str): Patient directory containing the .emt file.
+
+    Returns:
+    float: Body weight in kg.
+    """
+    files = glob.glob(os.path.join(directory, '*.emt'))
+    if not files:
+        raise FileNotFoundError(f'No .emt file found in {directory}')
+    with open(files[0], 'r') as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines[:-1]):
+        if 'mTB' in line:
+            return float(lines[i + 1].strip())
+    raise ValueError('Body weight not found in the .emt file.')
+
+
+def extract_bodyweight_from_mdx(directory):
+    """
+    Extracts the body weight from the .mdx file in a patient directory (see extract_bodyweight_from_mdx.m).
+
+    Parameters:
+    directory (str): Patient directory containing the .mdx file.
+
+    Returns:
+    float: Body weight in kg.
+    """
+    files = glob.glob(os.path.join(directory, '*.mdx'))
+    if len(files) != 1:
+        raise FileNotFoundError(f'Expected exactly one .mdx file in {directory}, found {len(files)}')
+    for element in ET.parse(files[0]).getroot().iter('mass'):
+        if element.get('label') == 'mTB':
+            return float(element.get('data')) / 1000
+    raise ValueError('Body weight not found in the .mdx file.')
+
+
+def read_heel_strikes(walking_directory):
+    """
+    Reads the first and second right heel strike from the BTS event file of a walking trial.
+
+    Parameters:
+    walking_directory (str): Directory containing the *Event* file.
+
+    Returns:
+    tuple: (time_start, time_stop) in seconds.
+    """
+    files = glob.glob(os.path.join(walking_directory, '*Event*'))
+    if not files:
+        raise FileNotFoundError(f'No event file found in {walking_directory}')
+    with open(files[0], 'r') as f:
+        lines = f.read().splitlines()
+
+    header = next((i for i, line in enumerate(lines) if 'eRHS' in line), None)
+    if header is None:
+        raise ValueError(f'No eRHS column in {files[0]}')
+    column = [label.strip() for label in lines[header].split('\t')].index('eRHS')
+    heel_strikes = []
+    for line in lines[header + 1:]:
+        values = line.split('\t')
+        if len(values) <= column or not values[column].strip():
+            continue
+        heel_strikes.append(float(values[column]))
+    if len(heel_strikes) < 2:
+        raise ValueError(f'Less than two right heel strikes in {files[0]}')
+    return heel_strikes[0], heel_strikes[1]
+
+
+def patient_results_directory(project_id, numeric_id, stage=None):
+    """
+    Returns the results directory of a patient, optionally of one stage.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    stage (str): Result sub-directory (e.g., 'comak'). Optional.
+
+    Returns:
+    str: Absolute path.
+    """
+    directory = os.path.join(RESULTS_DIRECTORY, f'{project_id}_{numeric_id}')
+    return os.path.join(directory, stage) if stage else directory
+
+
+def patient_inputs_directory(project_id, numeric_id):
+    """
+    Returns the directory holding the setup files of a patient.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+
+    Returns:
+    str: Absolute path.
+    """
+    return os.path.join(INPUTS_DIRECTORY, f'{project_id}_{numeric_id}')
+
+
+def find_patients(data_directory=DATA_DIRECTORY):
+    """
+    Collects the inputs of every patient folder in the data directory, following
+    main_comak_workflow_function.m. Patients with missing inputs are skipped with an error message.
+
+    Parameters:
+    data_directory (str): Directory containing the HOLOA*/STRATO* patient folders.
+
+    Returns:
+    list: One dict per patient with project_id, numeric_id, patient_directory, model_file,
+    motion_file, grf_file, walking_directory, body_weight, time_start, time_stop and results_basename.
+    """
+    patients = []
+    for name in sorted(os.listdir(data_directory)):
+        patient_directory = os.path.join(data_directory, name)
+        project_id = next((PROJECTS[prefix] for prefix in PROJECTS if name.startswith(prefix)), None)
+        if project_id is None or not os.path.isdir(patient_directory):
+            continue
+
+        numeric_id = name[-3:]
+        walking_directory = os.path.join(patient_directory, 'walking')
+        try:
+            if project_id == 'HOLOA':
+                body_weight = extract_bodyweight_from_mdx(patient_directory)
+            else:
+                body_weight = extract_bodyweight_from_emt(patient_directory)
+            time_start, time_stop = read_heel_strikes(walking_directory)
+            files = {}
+            for key, pattern in (('model_file', os.path.join(patient_directory, 'model', '*.osim')),
+                                 ('motion_file', os.path.join(walking_directory, '*.trc')),
+                                 ('grf_file', os.path.join(walking_directory, '*.mot'))):
+                matches = glob.glob(pattern)
+                if not matches:
+                    raise FileNotFoundError(f'No file matching {pattern}')
+                files[key] = matches[0]
+        except (FileNotFoundError, ValueError) as e:
+            print(f'[ERROR] Skipping patient {name}: {e}')
+            continue
+
+        patients.append({
+            'name': name,
+            'project_id': project_id,
+            'numeric_id': numeric_id,
+            'patient_directory': patient_directory,
+            'walking_directory': walking_directory,
+            **files,
+            'body_weight': body_weight,
+            'time_start': time_start,
+            'time_stop': time_stop,
+            'results_basename': f'walking_{numeric_id}',
+        })
+    return patients
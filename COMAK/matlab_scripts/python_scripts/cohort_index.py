@@ -0,0 +1,333 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+
+import cohort
+
+INDEX_FILE = os.path.join(cohort.RESULTS_DIRECTORY, 'cohort_index.sqlite')
+# Snapshot of the index for the MATLAB scripts (read by cohort_patients.m)
+JSON_FILE = os.path.join(cohort.RESULTS_DIRECTORY, 'cohort_index.json')
+
+# Stage -> results sub-directory (the MocoInverse backend writes the COMAK outputs)
+STAGE_DIRECTORIES = {
+    'comak_inverse_kinematics': 'comak_inverse_kinematics',
+    'comak': 'comak',
+    'moco_inverse': 'comak',
+    'joint_mechanics': 'joint_mechanics',
+}
+
+# Results sub-directory -> output kind -> file name
+STAGE_OUTPUTS = {
+    'comak_inverse_kinematics': {
+        'ik': '{basename}_ik.mot',
+        'ik_processed': '{basename}_ik_processed.mot',
+        'ik_marker_errors': '{basename}_ik_marker_errors.sto',
+    },
+    'comak': {
+        'activation': '{basename}_activation.sto',
+        'states': '{basename}_states.sto',
+        'values': '{basename}_values.sto',
+    },
+    'joint_mechanics': {
+        'joint_mechanics_h5': '{basename}.h5',
+        'force_reporter': '{basename}_ForceReporter_forces.sto',
+    },
+}
+
+OPERATORS = ('<', '<=', '>', '>=', '=', '!=')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    name TEXT PRIMARY KEY, project_id TEXT, numeric_id TEXT, body_weight REAL,
+    time_start REAL, time_stop REAL, model_file TEXT, results_basename TEXT);
+CREATE TABLE IF NOT EXISTS stages (
+    name TEXT, stage TEXT, status TEXT, updated REAL, message TEXT, PRIMARY KEY (name, stage));
+CREATE TABLE IF NOT EXISTS outputs (
+    name TEXT, stage TEXT, kind TEXT, path TEXT, labels TEXT, size INTEGER, mtime_ns INTEGER, PRIMARY KEY (name, kind));
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT, metric TEXT, value REAL, PRIMARY KEY (name, metric));
+"""
+
+
+def patient_name(project_id, numeric_id):
+    """Returns the results folder name of a patient (e.g., 'STRATO_001')."""
+    return f'{project_id}_{numeric_id}'
+
+
+def read_labels(file_path):
+    """Returns the column labels of an OpenSim .sto/.mot file (only the header is read)."""
+    with open(file_path, 'r') as f:
+        for line in f:
+            if line.strip().lower() == 'endheader':
+                return [label.strip() for label in next(f).split('\t')]
+    raise ValueError(f'No endheader found in {file_path}')
+
+
+class CohortIndex:
+    """
+    SQLite catalog of the cohort: patients (project, ID, body weight, heel strikes), stage status,
+    output files with their column labels, and summary metrics. It is updated as runs complete
+    (worker_service.py) so reports query it instead of scanning the results directory.
+
+    Usage:
+        with CohortIndex() as index:
+            patients = index.patients('STRATO', conditions=[('peak_medial_pressure', '>', 5.0)])
+            states_file = index.output('STRATO', '001', 'states')['path']
+    """
+
+    def __init__(self, db_file=INDEX_FILE, json_file=JSON_FILE):
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self.db_file = db_file
+        self.json_file = json_file
+        self.connection = sqlite3.connect(db_file, timeout=30)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def _commit(self):
+        self.connection.commit()
+        if self.json_file:
+            self.export_json(self.json_file)
+
+    def add_patient(self, patient, commit=True):
+        """
+        Adds or updates a patient.
+
+        Parameters:
+        patient (dict): Patient entry as returned by cohort.find_patients.
+        commit (bool): Commit and export the snapshot.
+
+        Returns:
+        str: Patient name.
+        """
+        name = patient_name(patient['project_id'], patient['numeric_id'])
+        self.connection.execute('INSERT OR REPLACE INTO patients VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                (name, patient['project_id'], patient['numeric_id'], patient['body_weight'],
+                                 patient['time_start'], patient['time_stop'], patient['model_file'], patient['results_basename']))
+        if commit:
+            self._commit()
+        return name
+
+    def record_stage(self, project_id, numeric_id, stage, status='complete', message='', commit=True,
+                     data_directory=cohort.DATA_DIRECTORY):
+        """
+        Records the status of a stage and registers its output files. Column labels are only
+        read again when an output file changed.
+
+        Parameters:
+        project_id (str): Project identifier (e.g., 'STRATO').
+        numeric_id (str): Numeric identifier of the patient (e.g., '001').
+        stage (str): Stage name (see STAGE_DIRECTORIES, e.g., 'comak').
+        status (str): 'complete' or 'failed'.
+        message (str): Error message of a failed stage.
+        commit (bool): Commit and export the snapshot.
+        data_directory (str): Directory containing the patient folders, read if the patient is not indexed yet.
+
+        Returns:
+        dict: Output kind -> path of the registered files.
+        """
+        name = patient_name(project_id, numeric_id)
+        self.connection.execute('INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?)', (name, stage, status, time.time(), message))
+
+        row = self.connection.execute('SELECT results_basename FROM patients WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            patient = next((p for p in cohort.find_patients(data_directory) if p['project_id'] == project_id and p['numeric_id'] == numeric_id), None)
+            if patient is None:
+                raise KeyError(f'Patient {name} not found in {data_directory}')
+            self.add_patient(patient, commit=False)
+            basename = patient['results_basename']
+        else:
+            basename = row['results_basename']
+        directory = cohort.patient_results_directory(project_id, numeric_id, STAGE_DIRECTORIES.get(stage, stage))
+        registered = {}
+        for kind, pattern in STAGE_OUTPUTS.get(STAGE_DIRECTORIES.get(stage, stage), {}).items():
+            file_path = os.path.join(directory, pattern.format(basename=basename))
+            if not os.path.isfile(file_path):
+                continue
+            info = os.stat(file_path)
+            known = self.connection.execute('SELECT size, mtime_ns, labels FROM outputs WHERE name = ? AND kind = ?', (name, kind)).fetchone()
+            if known and (known['size'], known['mtime_ns']) == (info.st_size, info.st_mtime_ns):
+                labels = known['labels']
+            else:
+                labels = json.dumps(read_labels(file_path)) if file_path.endswith(('.sto', '.mot')) else None
+            self.connection.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                    (name, stage, kind, file_path, labels, info.st_size, info.st_mtime_ns))
+            registered[kind] = file_path
+        if commit:
+            self._commit()
+        return registered
+
+    def record_metrics(self, project_id, numeric_id, metrics, commit=True):
+        """
+        Records summary metrics of a patient.
+
+        Parameters:
+        project_id (str): Project identifier (e.g., 'STRATO').
+        numeric_id (str): Numeric identifier of the patient (e.g., '001').
+        metrics (dict): Metric name -> value.
+        commit (bool): Commit and export the snapshot.
+
+        Returns:
+        None
+        """
+        name = patient_name(project_id, numeric_id)
+        self.connection.executemany('INSERT OR REPLACE INTO metrics VALUES (?, ?, ?)',
+                                    [(name, metric, float(value)) for metric, value in metrics.items()])
+        if commit:
+            self._commit()
+
+    def patients(self, project_id=None, stage=None, conditions=()):
+        """
+        Queries the patients.
+
+        Parameters:
+        project_id (str): Only patients of this project (e.g., 'STRATO'). Optional.
+        stage (str): Only patients with this stage complete (e.g., 'joint_mechanics'). Optional.
+        conditions (list): (metric, operator, value) tuples, e.g., [('peak_medial_pressure', '>', 5.0)].
+
+        Returns:
+        list: One dict per patient with the patient fields, 'stages' (stage -> status) and 'metrics'.
+        """
+        query, values = 'SELECT * FROM patients p WHERE 1', []
+        if project_id:
+            query += ' AND p.project_id = ?'
+            values.append(project_id)
+        if stage:
+            query += " AND EXISTS (SELECT 1 FROM stages s WHERE s.name = p.name AND s.stage = ? AND s.status = 'complete')"
+            values.append(stage)
+        for metric, operator, value in conditions:
+            if operator not in OPERATORS:
+                raise ValueError(f'Unknown operator {operator}. Available: {OPERATORS}')
+            query += f' AND EXISTS (SELECT 1 FROM metrics m WHERE m.name = p.name AND m.metric = ? AND m.value {operator} ?)'
+            values += [metric, float(value)]
+
+        patients = []
+        for row in self.connection.execute(query + ' ORDER BY p.name', values).fetchall():
+            patient = dict(row)
+            patient['stages'] = {r['stage']: r['status'] for r in
+                                 self.connection.execute('SELECT stage, status FROM stages WHERE name = ?', (row['name'],))}
+            patient['metrics'] = {r['metric']: r['value'] for r in
+                                  self.connection.execute('SELECT metric, value FROM metrics WHERE name = ?', (row['name'],))}
+            patients.append(patient)
+        return patients
+
+    def output(self, project_id, numeric_id, kind):
+        """
+        Returns a registered output file of a patient.
+
+        Parameters:
+        project_id (str): Project identifier (e.g., 'STRATO').
+        numeric_id (str): Numeric identifier of the patient (e.g., '001').
+        kind (str): Output kind (see STAGE_OUTPUTS, e.g., 'activation').
+
+        Returns:
+        dict: 'path', 'stage' and 'labels' (None for non-tabular files), or None if not registered.
+        """
+        row = self.connection.execute('SELECT path, stage, labels FROM outputs WHERE name = ? AND kind = ?',
+                                      (patient_name(project_id, numeric_id), kind)).fetchone()
+        if row is None:
+            return None
+        return {'path': row['path'], 'stage': row['stage'], 'labels': json.loads(row['labels']) if row['labels'] else None}
+
+    def metrics(self, project_id, numeric_id):
+        """Returns the summary metrics of a patient (metric -> value)."""
+        return {r['metric']: r['value'] for r in self.connection.execute(
+            'SELECT metric, value FROM metrics WHERE name = ?', (patient_name(project_id, numeric_id),))}
+
+    def refresh(self, data_directory=cohort.DATA_DIRECTORY):
+        """
+        Rebuilds the index from the data and results directories once (e.g., for results of runs
+        that did not go through the worker service). Stages with output files are marked complete.
+
+        Parameters:
+        data_directory (str): Directory containing the patient folders.
+
+        Returns:
+        int: Number of patients.
+        """
+        patients = cohort.find_patients(data_directory)
+        for patient in patients:
+            self.add_patient(patient, commit=False)
+            for stage in STAGE_OUTPUTS:
+                if self.record_stage(patient['project_id'], patient['numeric_id'], stage, commit=False):
+                    continue
+                self.connection.execute('DELETE FROM stages WHERE name = ? AND stage = ?',
+                                        (patient_name(patient['project_id'], patient['numeric_id']), stage))
+        self._commit()
+        return len(patients)
+
+    def export_json(self, json_file=JSON_FILE):
+        """
+        Writes the index as JSON for the MATLAB scripts: one entry per patient with its fields,
+        stages, output paths and metrics.
+
+        Parameters:
+        json_file (str): Output file.
+
+        Returns:
+        str: Path of the file.
+        """
+        patients = self.patients()
+        for patient in patients:
+            patient['outputs'] = {r['kind']: r['path'] for r in self.connection.execute(
+                'SELECT kind, path FROM outputs WHERE name = ?', (patient['name'],))}
+        tmp_path = f'{json_file}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'patients': patients}, f, indent=1)
+        os.replace(tmp_path, json_file)
+        return json_file
+
+
+def parse_condition(text):
+    """Parses a condition like 'peak_medial_pressure>5' into (metric, operator, value)."""
+    for operator in sorted(OPERATORS, key=len, reverse=True):
+        if operator in text:
+            metric, value = text.split(operator, 1)
+            return metric.strip(), operator, float(value)
+    raise ValueError(f'Condition without operator: {text}')
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index and query the results of the cohort.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('refresh', help='Rebuild the index from the data and results directories.')
+    record_parser = subparsers.add_parser('record', help='Record a stage of a patient (called by main_comak_workflow_function.m).')
+    record_parser.add_argument('project', type=str, help='Project name (e.g., STRATO).')
+    record_parser.add_argument('id', type=str, help='Numeric ID of the patient (e.g., 001).')
+    record_parser.add_argument('stage', type=str, choices=list(STAGE_DIRECTORIES), help='Completed stage.')
+    record_parser.add_argument('--status', type=str, default='complete', choices=['complete', 'failed'], help='Stage status.')
+    record_parser.add_argument('--message', type=str, default='', help='Error message of a failed stage.')
+    record_parser.add_argument('--data-directory', type=str, default=cohort.DATA_DIRECTORY, help='Directory containing the patient folders.')
+    query_parser = subparsers.add_parser('query', help='List the patients matching a query.')
+    query_parser.add_argument('--project', type=str, default=None, help='Project name (e.g., STRATO).')
+    query_parser.add_argument('--stage', type=str, default=None, help='Only patients with this stage complete.')
+    query_parser.add_argument('--where', type=str, nargs='*', default=[], help="Metric conditions (e.g., 'peak_medial_pressure>5').")
+    args = parser.parse_args()
+
+    try:
+        with CohortIndex() as index:
+            if args.command == 'refresh':
+                print(f'[INFO] {index.refresh()} patients indexed in {index.db_file}')
+            elif args.command == 'record':
+                outputs = index.record_stage(args.project, args.id, args.stage, args.status, args.message,
+                                             data_directory=os.path.abspath(args.data_directory))
+                print(f'[INFO] {args.project}_{args.id} {args.stage}: {args.status} ({len(outputs)} output files)')
+            else:
+                for patient in index.patients(args.project, args.stage, [parse_condition(c) for c in args.where]):
+                    stages = ', '.join(f'{s}: {status}' for s, status in sorted(patient['stages'].items()))
+                    print(f"{patient['name']}\t{patient['body_weight']:.1f} kg\t{stages}")
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
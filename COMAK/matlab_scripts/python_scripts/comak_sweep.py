@@ -0,0 +1,355 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import hashlib
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cohort
+import setup_generator
+import kinematics_preprocessing
+from sto_io import read_sto, write_sto
+
+# COMAKTool properties a variant may override (besides the per-muscle weights)
+SWEEP_PROPERTIES = ['contact_energy_weight', 'activation_exponent', 'non_muscle_actuator_weight']
+
+SWEEP_DIRECTORY_NAME = 'comak_sweep'
+SETTLED_COORDINATES_FILE = 'settled_coordinates.json'
+# Coordinates file of the variants, starting from the settled secondary coordinates
+SETTLED_KINEMATICS_FILE = 'settled_coordinates.mot'
+SUMMARY_FILE = 'comak_sweep_summary.txt'
+
+
+def expand_grid(grid):
+    """
+    Expands a parameter grid into a list of variants (all combinations).
+
+    Parameters:
+    grid (dict): Property -> list of values. Properties are SWEEP_PROPERTIES and 'muscle_weights',
+    whose values are dicts of muscle name -> Constant weight (e.g., {'gasmed_r': 4}).
+
+    Returns:
+    list: One dict of overrides per variant.
+    """
+    for name in grid:
+        if name not in SWEEP_PROPERTIES and name != 'muscle_weights':
+            raise ValueError(f'Unknown sweep property: {name}')
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def variant_name(overrides):
+    """
+    Returns a short, deterministic name of a variant, used for its results directory.
+
+    Parameters:
+    overrides (dict): Property overrides of the variant.
+
+    Returns:
+    str: Name (e.g., 'cew50_ae2_mw1a2b3c4d').
+    """
+    abbreviations = {'contact_energy_weight': 'cew', 'activation_exponent': 'ae', 'non_muscle_actuator_weight': 'nmaw'}
+    parts = [f'{abbreviations[name]}{overrides[name]:g}' for name in SWEEP_PROPERTIES if name in overrides]
+    if overrides.get('muscle_weights'):
+        digest = hashlib.sha1(json.dumps(overrides['muscle_weights'], sort_keys=True).encode()).hexdigest()[:8]
+        parts.append(f'mw{digest}')
+    return '_'.join(parts) or 'default'
+
+
+def settle_secondary_coordinates(setup_file, sweep_directory):
+    """
+    Returns the settled values of the secondary coordinates at the start of the trial, so the
+    variants can skip the settling simulation. The settle results of the regular COMAK run are
+    used if they exist, otherwise the settling simulation is run once (one COMAK frame). The
+    values are stored in the sweep directory and reused until the model or the IK results change.
+
+    Parameters:
+    setup_file (str): COMAK setup file of the patient (written by setup_generator.py).
+    sweep_directory (str): Directory of the sweep results.
+
+    Returns:
+    dict: Secondary coordinate path -> settled value (rad or m).
+    """
+    import numpy as np
+    import opensim as osim
+
+    settled_file = os.path.join(sweep_directory, SETTLED_COORDINATES_FILE)
+    tool = osim.COMAKTool(setup_file)
+    inputs_time = max(os.path.getmtime(tool.get_model_file()), os.path.getmtime(tool.get_coordinates_file()))
+    if os.path.isfile(settled_file) and os.path.getmtime(settled_file) >= inputs_time:
+        with open(settled_file, 'r') as f:
+            return json.load(f)
+
+    prefix = tool.get_settle_sim_results_prefix()
+    settle_files = [file_path for file_path in glob.glob(os.path.join(tool.get_settle_sim_results_directory(), f'{prefix}*states*.sto'))
+                    if os.path.getmtime(file_path) >= inputs_time]
+    if not settle_files:
+        settle_directory = os.path.join(sweep_directory, 'settle')
+        os.makedirs(settle_directory, exist_ok=True)
+        settle = tool.clone()
+        settle.set_results_directory(settle_directory)
+        settle.set_settle_sim_results_directory(settle_directory)
+        settle.set_print_settle_sim_results(True)
+        settle.set_stop_time(tool.get_start_time() + tool.get_time_step())
+        print('[INFO] Running the settling simulation shared by all variants...')
+        settle.run()
+        settle_files = glob.glob(os.path.join(settle_directory, f'{prefix}*states*.sto'))
+        if not settle_files:
+            raise FileNotFoundError(f'No settle results written to {settle_directory}')
+
+    settle = read_sto(settle_files[0])
+    labels, data = settle['labels'], settle['data']
+    settled = {}
+    secondary_coord_set = tool.get_COMAKSecondaryCoordinateSet()
+    for i in range(secondary_coord_set.getSize()):
+        path = secondary_coord_set.get(i).get_coordinate()
+        label = f'{path}/value'
+        if label not in labels:
+            raise KeyError(f'{label} not found in {settle_files[0]}')
+        settled[path] = float(data[-1, labels.index(label)])
+    if settle['in_degrees']:
+        model = osim.Model(tool.get_model_file())
+        for path in settled:
+            if osim.Coordinate.safeDownCast(model.getComponent(path)).getMotionType() == osim.Coordinate.Rotational:
+                settled[path] = float(np.radians(settled[path]))
+
+    with open(settled_file, 'w') as f:
+        json.dump(settled, f, indent=2)
+    return settled
+
+
+def write_settled_kinematics(setup_file, settled, sweep_directory):
+    """
+    Writes the coordinates file of the variants: the IK kinematics of the COMAK setup with every
+    secondary coordinate offset so that it starts at its settled value. COMAK sets the model
+    coordinates from the coordinates file, so the settled values must be in the file (the model
+    default values are not used).
+
+    Parameters:
+    setup_file (str): COMAK setup file of the patient.
+    settled (dict): Settled secondary coordinate values (see settle_secondary_coordinates).
+    sweep_directory (str): Directory of the sweep results.
+
+    Returns:
+    str: Path of the coordinates file.
+    """
+    import numpy as np
+    import opensim as osim
+
+    tool = osim.COMAKTool(setup_file)
+    model = osim.Model(tool.get_model_file())
+    table = read_sto(tool.get_coordinates_file())
+    start_time = tool.get_start_time() if tool.get_start_time() >= 0 else table['time'][0]
+    data = table['data'].copy()
+    for path, value in settled.items():
+        coordinate = osim.Coordinate.safeDownCast(model.getComponent(path))
+        name = coordinate.getName()
+        column = next((i for i, label in enumerate(table['labels']) if label in (name, path, f'{path}/value')), None)
+        if column is None:
+            raise KeyError(f'{name} not found in {tool.get_coordinates_file()}')
+        if table['in_degrees'] and coordinate.getMotionType() == osim.Coordinate.Rotational:
+            value = np.degrees(value)
+        data[:, column] += value - np.interp(start_time, table['time'], data[:, column])
+
+    file_path = os.path.join(sweep_directory, SETTLED_KINEMATICS_FILE)
+    write_sto(file_path, dict(table, data=data), name=os.path.splitext(SETTLED_KINEMATICS_FILE)[0])
+    return file_path
+
+
+def apply_overrides(tool, overrides):
+    """
+    Applies the property overrides of a variant to a COMAKTool.
+
+    Parameters:
+    tool (opensim.COMAKTool): Tool to modify.
+    overrides (dict): Property overrides (see expand_grid).
+
+    Returns:
+    None
+    """
+    import opensim as osim
+
+    for name in SWEEP_PROPERTIES:
+        if name in overrides:
+            getattr(tool, f'set_{name}')(float(overrides[name]))
+
+    if overrides.get('muscle_weights'):
+        cost_fun_param_set = osim.COMAKCostFunctionParameterSet()
+        cost_fun_param = osim.COMAKCostFunctionParameter()
+        for muscle, weight in overrides['muscle_weights'].items():
+            cost_fun_param.setName(muscle)
+            cost_fun_param.set_actuator(f'/forceset/{muscle}')
+            cost_fun_param.set_weight(osim.Constant(float(weight)))
+            cost_fun_param_set.cloneAndAppend(cost_fun_param)
+        tool.set_COMAKCostFunctionParameterSet(cost_fun_param_set)
+
+
+def summarize_variant(results_directory, prefix):
+    """
+    Computes the comparison metrics of one variant from its COMAK results.
+
+    Parameters:
+    results_directory (str): Results directory of the variant.
+    prefix (str): Results prefix of the variant.
+
+    Returns:
+    dict: Metric name -> value.
+    """
+    import numpy as np
+
+    activation = read_sto(os.path.join(results_directory, f'{prefix}_activation.sto'))
+    labels, activations = activation['labels'], activation['data']
+    metrics = {'mean_activation': float(activations.mean()),
+               'sum_squared_activation': float((activations ** 2).sum(axis=1).mean())}
+    for label, peak in zip(labels, activations.max(axis=0)):
+        metrics[f'peak_{label.split("/")[-1]}'] = float(peak)
+
+    force_file = os.path.join(results_directory, f'{prefix}_force.sto')
+    if os.path.isfile(force_file):
+        force = read_sto(force_file)
+        labels, forces = force['labels'], force['data']
+        reserves = [i for i, label in enumerate(labels) if 'reserve' in label]
+        if reserves:
+            metrics['peak_reserve_force'] = float(np.abs(forces[:, reserves]).max())
+    return metrics
+
+
+def run_variant(setup_file, coordinates_file, sweep_directory, overrides):
+    """
+    Runs one variant as an isolated COMAKTool in a worker process.
+
+    Parameters:
+    setup_file (str): COMAK setup file of the patient.
+    coordinates_file (str): Kinematics starting from the settled secondary coordinates (see write_settled_kinematics).
+    sweep_directory (str): Directory of the sweep results.
+    overrides (dict): Property overrides of the variant.
+
+    Returns:
+    dict: Variant name, overrides, status, run time and metrics.
+    """
+    import opensim as osim
+
+    name = variant_name(overrides)
+    results_directory = os.path.join(sweep_directory, name)
+    os.makedirs(results_directory, exist_ok=True)
+
+    tool = osim.COMAKTool(setup_file)
+    prefix = f'{tool.get_results_prefix()}_{name}'
+    # Start from the shared settled secondary coordinates instead of settling again
+    tool.set_coordinates_file(coordinates_file)
+    tool.set_settle_secondary_coordinates_at_start(False)
+    tool.set_print_settle_sim_results(False)
+    tool.set_results_directory(results_directory)
+    tool.set_results_prefix(prefix)
+    apply_overrides(tool, overrides)
+    tool.printToXML(os.path.join(results_directory, 'comak_settings.xml'))
+
+    record = {'variant': name, 'overrides': overrides, 'status': 'failed', 'run_time': 0.0, 'metrics': {}}
+    start = time.time()
+    try:
+        if tool.run():
+            record['status'] = 'done'
+            record['metrics'] = summarize_variant(results_directory, prefix)
+    except Exception as e:
+        print(f'[ERROR] Variant {name} failed: {e}')
+    record['run_time'] = time.time() - start
+    return record
+
+
+def write_summary(records, file_path):
+    """
+    Writes the comparison table of all variants (one row per variant, tab-separated).
+
+    Parameters:
+    records (list): Variant records returned by run_variant.
+    file_path (str): Output file.
+
+    Returns:
+    None
+    """
+    metric_names = []
+    for record in records:
+        metric_names += [name for name in record['metrics'] if name not in metric_names]
+
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t')
+        writer.writerow(['variant'] + SWEEP_PROPERTIES + ['muscle_weights', 'status', 'run_time'] + metric_names)
+        for record in records:
+            overrides = record['overrides']
+            writer.writerow([record['variant']]
+                            + [overrides.get(name, '') for name in SWEEP_PROPERTIES]
+                            + [json.dumps(overrides.get('muscle_weights', {}), sort_keys=True), record['status'], f"{record['run_time']:.1f}"]
+                            + [f'{record["metrics"][name]:.6g}' if name in record['metrics'] else '' for name in metric_names])
+
+
+def run_sweep(project_id, numeric_id, variants, max_workers=None):
+    """
+    Runs a COMAK parameter sweep for one patient. All variants use the IK results of the patient
+    and one shared settling simulation, run in parallel and are collected into one table.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    variants (list): Property overrides per variant (see expand_grid).
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    list: Variant records, in the order of the variants.
+    """
+    setup_file = os.path.join(cohort.patient_inputs_directory(project_id, numeric_id), setup_generator.SETUP_FILES['COMAKTool'])
+    if not os.path.isfile(setup_file):
+        raise FileNotFoundError(f'Setup file not found (run setup_generator.py first): {setup_file}')
+    # The COMAKTool setup reads the filtered and resampled IK results
+    kinematics_preprocessing.preprocess_patient(project_id, numeric_id)
+
+    sweep_directory = cohort.patient_results_directory(project_id, numeric_id, SWEEP_DIRECTORY_NAME)
+    os.makedirs(sweep_directory, exist_ok=True)
+    settled = settle_secondary_coordinates(setup_file, sweep_directory)
+    coordinates_file = write_settled_kinematics(setup_file, settled, sweep_directory)
+
+    records = [None] * len(variants)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_variant, setup_file, coordinates_file, sweep_directory, overrides): i
+                   for i, overrides in enumerate(variants)}
+        for future in as_completed(futures):
+            record = future.result()
+            records[futures[future]] = record
+            print(f"[INFO] Variant {record['variant']} {record['status']} ({record['run_time']:.0f} s)")
+
+    summary_file = os.path.join(sweep_directory, SUMMARY_FILE)
+    write_summary(records, summary_file)
+    print(f'[INFO] Sweep summary saved as {summary_file}')
+    return records
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a COMAK parameter sweep for one patient.')
+    parser.add_argument('project', type=str, help='Project name (e.g., STRATO).')
+    parser.add_argument('id', type=str, help='Numeric patient ID (e.g., 001).')
+    parser.add_argument('--contact-energy-weight', type=float, nargs='+', help='Contact energy weights.')
+    parser.add_argument('--activation-exponent', type=float, nargs='+', help='Activation exponents.')
+    parser.add_argument('--non-muscle-actuator-weight', type=float, nargs='+', help='Non-muscle actuator weights.')
+    parser.add_argument('--muscle-weights', type=str, nargs='+', help='JSON files with muscle name -> weight, one per setting.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    grid = {}
+    for name in SWEEP_PROPERTIES:
+        if getattr(args, name):
+            grid[name] = getattr(args, name)
+    if args.muscle_weights:
+        grid['muscle_weights'] = []
+        for file_path in args.muscle_weights:
+            with open(file_path, 'r') as f:
+                grid['muscle_weights'].append(json.load(f))
+
+    try:
+        run_sweep(args.project, args.id, expand_grid(grid), max_workers=args.workers)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
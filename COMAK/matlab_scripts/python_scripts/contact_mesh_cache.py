@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import hashlib
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# Memory-mapped caches of the preprocessed Smith2018ContactMesh data (triangle geometry, material
+# properties, neighbors) for Python-side analyses. The compiled tools (COMAKTool, ForsimTool,
+# JointMechanicsTool) do not read these caches: they preprocess every mesh when the model is
+# initialized, whether a cache exists or not.
+
+# Sidecar layout: MAGIC, 8-byte little-endian header length, JSON header,
+# then every array starting on a CACHE_ALIGNMENT boundary so it can be
+# memory mapped directly.
+MAGIC = b'CMESHV1\n'
+CACHE_ALIGNMENT = 64
+CACHE_SUFFIX = '.meshcache'
+
+# Hashes and loaded caches of this process, shared by all models using the same mesh files
+# (hard links of the geometry store share the inode, so they are hashed once)
+_file_hashes = {}
+_loaded_caches = {}
+
+# Smith2018ContactMesh properties that change the preprocessed mesh data
+MESH_PROPERTIES = ['mesh_file', 'mesh_back_file', 'elastic_modulus', 'poissons_ratio', 'thickness',
+                   'use_variable_thickness', 'min_thickness', 'max_thickness', 'scale_factors']
+
+
+def read_contact_mesh_properties(model_file):
+    """
+    Reads the Smith2018ContactMesh properties from an .osim file without loading the model in OpenSim.
+
+    Parameters:
+    model_file (str): Path to the OpenSim model (.osim).
+
+    Returns:
+    dict: Mesh name -> dict of property name -> text value.
+    """
+    meshes = {}
+    for element in ET.parse(model_file).getroot().iter('Smith2018ContactMesh'):
+        meshes[element.get('name')] = {prop: (element.findtext(prop) or '').strip() for prop in MESH_PROPERTIES}
+    return meshes
+
+
+def resolve_mesh_file(model_file, mesh_file):
+    """
+    Resolves a mesh_file property the way OpenSim does for the workflow models (model folder, then
+    Geometry/, then the shared search path of the geometry store).
+
+    Parameters:
+    model_file (str): Path to the OpenSim model (.osim).
+    mesh_file (str): Value of the mesh_file or mesh_back_file property.
+
+    Returns:
+    str: Absolute path to the mesh file, or None if it cannot be found.
+    """
+    if not mesh_file:
+        return None
+    model_directory = os.path.dirname(os.path.abspath(model_file))
+    for candidate in [mesh_file, os.path.join(model_directory, mesh_file), os.path.join(model_directory, 'Geometry', mesh_file)]:
+        if os.path.isfile(candidate):
+            return os.path.abspath(candidate)
+    import geometry_store
+    return geometry_store.resolve(mesh_file)
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 hash of a file.
+
+    Parameters:
+    path (str): Path to the file.
+    chunk_size (int): Number of bytes read per chunk.
+
+    Returns:
+    str: Hexadecimal digest.
+    """
+    info = os.stat(path)
+    key = (info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def contact_mesh_signature(model_file, properties):
+    """
+    Computes the cache key of a contact mesh from its mesh files and properties.
+
+    Parameters:
+    model_file (str): Path to the OpenSim model (.osim).
+    properties (dict): Mesh properties as returned by read_contact_mesh_properties.
+
+    Returns:
+    tuple: (absolute mesh file path, signature hex digest).
+    """
+    mesh_path = resolve_mesh_file(model_file, properties['mesh_file'])
+    if mesh_path is None:
+        raise FileNotFoundError(f"Contact mesh file not found: {properties['mesh_file']}")
+
+    digest = hashlib.sha256()
+    digest.update(hash_file(mesh_path).encode())
+    if properties['use_variable_thickness'].lower() == 'true':
+        back_path = resolve_mesh_file(model_file, properties['mesh_back_file'])
+        if back_path is None:
+            raise FileNotFoundError(f"Contact mesh back file not found: {properties['mesh_back_file']}")
+        digest.update(hash_file(back_path).encode())
+    digest.update(json.dumps(properties, sort_keys=True).encode())
+    return mesh_path, digest.hexdigest()
+
+
+def sidecar_path(mesh_path, signature, cache_directory=None):
+    """
+    Returns the sidecar file path for a mesh file. The name includes the signature, so subjects
+    sharing a mesh with other scale factors or properties keep separate sidecars.
+
+    Parameters:
+    mesh_path (str): Absolute path to the mesh file.
+    signature (str): Signature hex digest of the mesh (see contact_mesh_signature).
+    cache_directory (str): Directory to store sidecars in. Defaults to the mesh folder.
+
+    Returns:
+    str: Path of the sidecar file.
+    """
+    file_name = f'{os.path.basename(mesh_path)}.{signature[:16]}{CACHE_SUFFIX}'
+    return os.path.join(os.path.dirname(mesh_path) if cache_directory is None else cache_directory, file_name)
+
+
+def write_sidecar(path, signature, arrays, metadata=None):
+    """
+    Writes arrays to a memory-mappable sidecar file. The file is written to a temporary
+    path first and moved into place, so concurrent workers never see a partial file.
+
+    Parameters:
+    path (str): Destination path.
+    signature (str): Cache key stored in the header.
+    arrays (dict): Name -> numpy array.
+    metadata (dict): Additional JSON-serializable values stored in the header.
+
+    Returns:
+    None
+    """
+    def align(n):
+        return (n + CACHE_ALIGNMENT - 1) // CACHE_ALIGNMENT * CACHE_ALIGNMENT
+
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = align(offset + array.nbytes)
+
+    header = json.dumps({'signature': signature, 'metadata': metadata or {}, 'arrays': entries}).encode()
+    data_start = align(len(MAGIC) + 8 + len(header))
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_sidecar(path, signature=None):
+    """
+    Memory maps the arrays of a sidecar file.
+
+    Parameters:
+    path (str): Sidecar path.
+    signature (str): Expected cache key. If given and different, None is returned.
+
+    Returns:
+    dict: Name -> read-only numpy memmap, plus 'metadata' with the header metadata. None if invalid.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        header_length = int.from_bytes(f.read(8), 'little')
+        header = json.loads(f.read(header_length))
+    if signature is not None and header['signature'] != signature:
+        return None
+
+    data_start = (len(MAGIC) + 8 + header_length + CACHE_ALIGNMENT - 1) // CACHE_ALIGNMENT * CACHE_ALIGNMENT
+    data = {'metadata': header['metadata']}
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if int(np.prod(shape)) == 0:
+            data[name] = np.empty(shape, dtype=entry['dtype'])
+        else:
+            data[name] = np.memmap(path, dtype=entry['dtype'], mode='r', offset=data_start + entry['offset'], shape=shape)
+    return data
+
+
+def compute_triangle_normals(face_vertices):
+    """
+    Computes the unit normals of triangles from their vertex locations (right-hand rule).
+
+    Parameters:
+    face_vertices (np.ndarray): [nTriangles x 3 x 3] vertex locations of every triangle.
+
+    Returns:
+    np.ndarray: [nTriangles x 3] unit normals.
+    """
+    p0, p1, p2 = face_vertices[:, 0], face_vertices[:, 1], face_vertices[:, 2]
+    cross = np.cross(p1 - p0, p2 - p0)
+    norm = np.linalg.norm(cross, axis=1)
+    return cross / np.where(norm > 0, norm, 1.0)[:, None]
+
+
+def compute_neighbor_triangles(faces):
+    """
+    Finds the triangles sharing at least one vertex with each triangle.
+
+    Parameters:
+    faces (np.ndarray): [nTriangles x 3] vertex indices.
+
+    Returns:
+    tuple: (offsets, indices) in compressed row form; the neighbors of triangle i are
+    indices[offsets[i]:offsets[i + 1]].
+    """
+    n_triangles = faces.shape[0]
+    vertex = faces.ravel()
+    triangle = np.repeat(np.arange(n_triangles), 3)
+    order = np.argsort(vertex, kind='stable')
+    vertex, triangle = vertex[order], triangle[order]
+
+    pairs = []
+    for group in np.split(triangle, np.flatnonzero(np.diff(vertex)) + 1):
+        a, b = np.meshgrid(group, group, indexing='ij')
+        pairs.append(np.stack([a.ravel(), b.ravel()], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+
+    offsets = np.zeros(n_triangles + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs[:, 0], minlength=n_triangles), out=offsets[1:])
+    return offsets, pairs[:, 1].astype(np.int32)
+
+
+def extract_contact_mesh_arrays(contact_mesh):
+    """
+    Extracts the preprocessed data from an initialized Smith2018ContactMesh through its getters.
+    The triangle neighbors (getNeighborTris returns a std::set the bindings do not wrap) are
+    computed from the faces.
+
+    Parameters:
+    contact_mesh (opensim.Smith2018ContactMesh): Mesh component of a finalized model.
+
+    Returns:
+    dict: Name -> numpy array.
+    """
+    n_faces = contact_mesh.getNumFaces()
+    vertex_locations = contact_mesh.getVertexLocations()
+    vertices = np.array([vertex_locations.get(i).to_numpy() for i in range(vertex_locations.size())])
+    mesh = contact_mesh.getPolygonalMesh()
+    faces = np.array([[mesh.getFaceVertex(i, j) for j in range(3)] for i in range(n_faces)], dtype=np.int32)
+    face_vertex_locations = contact_mesh.getFaceVertexLocations()
+    face_vertices = np.array([[face_vertex_locations.get(i, j).to_numpy() for j in range(3)] for i in range(n_faces)])
+    centers = contact_mesh.getTriangleCenters()
+    neighbor_offsets, neighbor_indices = compute_neighbor_triangles(faces)
+
+    return {
+        'vertices': vertices,
+        'faces': faces,
+        'triangle_centers': np.array([centers.get(i).to_numpy() for i in range(n_faces)]),
+        # getTriangleNormals (Vector_<UnitVec3>) is not wrapped by the bindings: the normals are
+        # computed from the mesh's own face vertex locations
+        'triangle_normals': compute_triangle_normals(face_vertices),
+        'triangle_areas': contact_mesh.getTriangleAreas().to_numpy().copy(),
+        'triangle_thickness': np.array([contact_mesh.getTriangleThickness(i) for i in range(n_faces)]),
+        'triangle_elastic_modulus': np.array([contact_mesh.getTriangleElasticModulus(i) for i in range(n_faces)]),
+        'triangle_poissons_ratio': np.array([contact_mesh.getTrianglePoissonsRatio(i) for i in range(n_faces)]),
+        'neighbor_offsets': neighbor_offsets,
+        'neighbor_indices': neighbor_indices,
+    }
+
+
+def build_contact_mesh_caches(model_file, cache_directory=None, force=False):
+    """
+    Initializes the model once and writes a sidecar for every contact mesh whose cache is missing or stale.
+
+    Parameters:
+    model_file (str): Path to the OpenSim model (.osim).
+    cache_directory (str): Directory to store sidecars in. Defaults to the mesh folder.
+    force (bool): Rebuild even if a valid sidecar exists.
+
+    Returns:
+    dict: Mesh name -> sidecar path.
+    """
+    properties = read_contact_mesh_properties(model_file)
+    targets = {}
+    for name, props in properties.items():
+        mesh_path, signature = contact_mesh_signature(model_file, props)
+        path = sidecar_path(mesh_path, signature, cache_directory)
+        if force or read_sidecar(path, signature) is None:
+            targets[name] = (path, signature)
+
+    if targets:
+        import opensim as osim
+        model = osim.Model(model_file)
+        model.initSystem()
+        for name, (path, signature) in targets.items():
+            contact_mesh = osim.Smith2018ContactMesh.safeDownCast(model.getContactGeometrySet().get(name))
+            write_sidecar(path, signature, extract_contact_mesh_arrays(contact_mesh), {'name': name})
+            print(f'[INFO] Contact mesh cache written: {path}')
+
+    return {name: sidecar_path(*contact_mesh_signature(model_file, props), cache_directory)
+            for name, props in properties.items()}
+
+
+def load_contact_mesh_cache(model_file, mesh_name, cache_directory=None, build=True):
+    """
+    Loads the memory-mapped preprocessed data of a contact mesh, building the sidecar if it is missing or stale.
+
+    Parameters:
+    model_file (str): Path to the OpenSim model (.osim).
+    mesh_name (str): Name of the Smith2018ContactMesh (e.g., 'tibia_cartilage').
+    cache_directory (str): Directory to store sidecars in. Defaults to the mesh folder.
+    build (bool): Build the sidecar if it is not valid. If False, None is returned instead.
+
+    Returns:
+    dict: Name -> read-only numpy array, or None.
+    """
+    properties = read_contact_mesh_properties(model_file)
+    if mesh_name not in properties:
+        raise KeyError(f'No Smith2018ContactMesh named {mesh_name} in {model_file}')
+    mesh_path, signature = contact_mesh_signature(model_file, properties[mesh_name])
+    if signature in _loaded_caches:
+        # Same mesh content and properties already loaded for another model
+        return _loaded_caches[signature]
+    path = sidecar_path(mesh_path, signature, cache_directory)
+
+    data = read_sidecar(path, signature)
+    if data is None and build:
+        build_contact_mesh_caches(model_file, cache_directory)
+        data = read_sidecar(path, signature)
+    if data is not None:
+        _loaded_caches[signature] = data
+    return data
+
+
+def get_neighbor_triangles(data, triangle):
+    """
+    Returns the triangles sharing a vertex with a triangle from a loaded cache.
+
+    Parameters:
+    data (dict): Loaded contact mesh cache.
+    triangle (int): Triangle index.
+
+    Returns:
+    np.ndarray: Neighbor triangle indices.
+    """
+    return data['neighbor_indices'][data['neighbor_offsets'][triangle]:data['neighbor_offsets'][triangle + 1]]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Precompute contact mesh caches for OpenSim models.')
+    parser.add_argument('model_files', type=str, nargs='+', help='OpenSim model files (.osim).')
+    parser.add_argument('--cache-directory', type=str, default=None, help='Directory for the sidecar files.')
+    parser.add_argument('--force', action='store_true', help='Rebuild existing caches.')
+    args = parser.parse_args()
+
+    for model_file in args.model_files:
+        try:
+            build_contact_mesh_caches(model_file, args.cache_directory, args.force)
+        except (FileNotFoundError, ET.ParseError) as e:
+            print(f'[ERROR] Could not cache contact meshes of {model_file}: {e}')
+            sys.exit(1)
@@ -0,0 +1,226 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from sto_io import read_sto, write_sto
+
+# Variant keys besides the tool properties
+VARIANT_INPUTS = ['actuator_inputs', 'prescribed_coordinates', 'unconstrained_coordinates', 'external_loads_file']
+
+_worker = {}
+
+
+def apply_overrides(table, overrides):
+    """
+    Returns a copy of an input table with replaced or added columns.
+
+    Parameters:
+    table (dict): Table as returned by read_sto.
+    overrides (dict): Column label -> constant or array over the table time.
+
+    Returns:
+    dict: Modified table.
+    """
+    table = dict(table, labels=list(table['labels']), data=table['data'].copy())
+    for label, values in overrides.items():
+        column = np.broadcast_to(np.asarray(values, dtype=float), table['time'].shape)
+        if label in table['labels']:
+            table['data'][:, table['labels'].index(label)] = column
+        else:
+            table['labels'].append(label)
+            table['data'] = np.column_stack([table['data'], column])
+    return table
+
+
+def write_input(table, inputs_directory):
+    """
+    Writes a variant input table once, named by its content, so variants with the same
+    inputs share one file.
+
+    Parameters:
+    table (dict): Table as returned by read_sto.
+    inputs_directory (str): Directory of the batch input files.
+
+    Returns:
+    str: Path of the file.
+    """
+    digest = hashlib.sha1(np.ascontiguousarray(table['data']).tobytes()
+                          + np.ascontiguousarray(table['time']).tobytes()
+                          + json.dumps([table['labels'], table['in_degrees']]).encode()).hexdigest()[:16]
+    file_path = os.path.join(inputs_directory, f'{digest}.sto')
+    if not os.path.isfile(file_path):
+        write_sto(file_path, table, name='forsim_input')
+    return file_path
+
+
+def _init_worker(setup_file, model_file):
+    # The model is parsed once per worker process; every variant runs on its own copy, as the
+    # ForsimTool adds the prescribed coordinates, actuators and external loads to its model
+    import opensim as osim
+
+    _worker['setup_file'] = setup_file
+    _worker['model'] = osim.Model(model_file)
+
+
+def run_variant(index, variant, output_columns):
+    """
+    Runs one ForsimTool variant in a worker process. The results are written to a temporary
+    directory, read back and removed.
+
+    Parameters:
+    index (int): Variant index.
+    variant (dict): Resolved variant (input file paths and tool properties).
+    output_columns (list): Substrings selecting the states columns to return. All if empty.
+
+    Returns:
+    tuple: (index, result dict with 'time', 'labels', 'data'), result is None if the run failed.
+    """
+    import opensim as osim
+
+    results_directory = tempfile.mkdtemp(prefix='forsim_batch_')
+    try:
+        forsim = osim.ForsimTool(_worker['setup_file'])
+        forsim.setModel(_worker['model'].clone())
+        forsim.set_results_directory(results_directory)
+        forsim.set_use_visualizer(False)
+        if 'actuator_input_file' in variant:
+            forsim.set_actuator_input_file(variant['actuator_input_file'])
+        if 'prescribed_coordinates_file' in variant:
+            forsim.set_prescribed_coordinates_file(variant['prescribed_coordinates_file'])
+        if 'external_loads_file' in variant:
+            forsim.set_external_loads_file(variant['external_loads_file'])
+        if 'unconstrained_coordinates' in variant:
+            forsim.updPropertyByName('unconstrained_coordinates').clear()
+            for path in variant['unconstrained_coordinates']:
+                forsim.append_unconstrained_coordinates(path)
+        for name, value in variant.get('properties', {}).items():
+            getattr(forsim, f'set_{name}')(value)
+
+        if not forsim.run():
+            raise RuntimeError('ForsimTool failed')
+        states_files = glob.glob(os.path.join(results_directory, '*states*.sto'))
+        if not states_files:
+            raise FileNotFoundError('ForsimTool did not write a states file')
+
+        states = read_sto(states_files[0])
+        columns = [i for i, label in enumerate(states['labels'])
+                   if not output_columns or any(pattern in label for pattern in output_columns)]
+        return index, {'time': states['time'], 'labels': [states['labels'][i] for i in columns], 'data': states['data'][:, columns]}
+    except Exception as e:
+        print(f'[ERROR] Variant {index} failed: {e}')
+        return index, None
+    finally:
+        shutil.rmtree(results_directory, ignore_errors=True)
+
+
+def run_batch(setup_file, variants, batch_directory, output_columns=('/value',), max_workers=None):
+    """
+    Runs many short ForsimTool simulations that differ in their inputs. The base inputs of the
+    setup file are parsed once; variants only override columns of them (or the unconstrained
+    coordinates, external loads or tool properties). Every worker loads the model once.
+
+    Parameters:
+    setup_file (str): ForsimTool setup file with the base inputs.
+    variants (list): One dict per variant with any of the keys
+        'name' (str),
+        'actuator_inputs' (dict: column label, e.g. 'vasmed_r_activation' -> constant or array),
+        'prescribed_coordinates' (dict: coordinate path -> constant or array),
+        'unconstrained_coordinates' (list of coordinate paths),
+        'external_loads_file' (str),
+        'properties' (dict: ForsimTool property -> value, e.g. {'stop_time': 1.5}).
+    batch_directory (str): Directory for the variant input files and the stacked results.
+    output_columns (tuple): Substrings selecting the states columns to keep ('/value' keeps the
+        coordinate values). Empty keeps all columns.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    dict: 'names', 'labels', 'time' (variants x frames) and 'data' (variants x frames x labels),
+    padded with NaN. Also saved as forsim_batch.npz in the batch directory.
+    """
+    import opensim as osim
+
+    base = osim.ForsimTool(setup_file)
+    setup_directory = os.path.dirname(os.path.abspath(setup_file))
+
+    def resolve(path):
+        return path if not path or os.path.isabs(path) else os.path.join(setup_directory, path)
+
+    base_tables = {}
+    for key, file_path in (('actuator_inputs', resolve(base.get_actuator_input_file())),
+                           ('prescribed_coordinates', resolve(base.get_prescribed_coordinates_file()))):
+        if any(variant.get(key) for variant in variants):
+            if not file_path or not os.path.isfile(file_path):
+                raise FileNotFoundError(f'Variants override {key} but the setup file has no such input: {file_path}')
+            base_tables[key] = read_sto(file_path)
+
+    inputs_directory = os.path.join(batch_directory, 'inputs')
+    os.makedirs(inputs_directory, exist_ok=True)
+    resolved = []
+    for variant in variants:
+        unknown = set(variant) - set(VARIANT_INPUTS) - {'name', 'properties'}
+        if unknown:
+            raise ValueError(f'Unknown variant keys: {sorted(unknown)}')
+        entry = {'properties': variant.get('properties', {})}
+        if variant.get('actuator_inputs'):
+            entry['actuator_input_file'] = write_input(apply_overrides(base_tables['actuator_inputs'], variant['actuator_inputs']), inputs_directory)
+        if variant.get('prescribed_coordinates'):
+            entry['prescribed_coordinates_file'] = write_input(apply_overrides(base_tables['prescribed_coordinates'], variant['prescribed_coordinates']), inputs_directory)
+        if 'unconstrained_coordinates' in variant:
+            entry['unconstrained_coordinates'] = list(variant['unconstrained_coordinates'])
+        if variant.get('external_loads_file'):
+            entry['external_loads_file'] = os.path.abspath(variant['external_loads_file'])
+        resolved.append(entry)
+
+    results = [None] * len(variants)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(os.path.abspath(setup_file), resolve(base.get_model_file()))) as executor:
+        futures = [executor.submit(run_variant, i, entry, list(output_columns)) for i, entry in enumerate(resolved)]
+        for done, future in enumerate(as_completed(futures), 1):
+            index, result = future.result()
+            results[index] = result
+            if done % 10 == 0 or done == len(variants):
+                print(f'[INFO] {done}/{len(variants)} variants simulated.')
+
+    # Stack the results of all variants (labels of the first successful run)
+    labels = next((result['labels'] for result in results if result), [])
+    frames = max((len(result['time']) for result in results if result), default=0)
+    time = np.full((len(variants), frames), np.nan)
+    data = np.full((len(variants), frames, len(labels)), np.nan)
+    for i, result in enumerate(results):
+        if result:
+            columns = [result['labels'].index(label) for label in labels]
+            time[i, :len(result['time'])] = result['time']
+            data[i, :len(result['time'])] = result['data'][:, columns]
+
+    names = [variant.get('name', f'variant_{i}') for i, variant in enumerate(variants)]
+    stacked = {'names': names, 'labels': labels, 'time': time, 'data': data}
+    np.savez_compressed(os.path.join(batch_directory, 'forsim_batch.npz'), names=np.array(names), labels=np.array(labels), time=time, data=data)
+    print(f"[INFO] Results of {sum(result is not None for result in results)}/{len(variants)} variants saved in {batch_directory}")
+    return stacked
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run a batch of ForsimTool variants.')
+    parser.add_argument('setup_file', type=str, help='ForsimTool setup file with the base inputs.')
+    parser.add_argument('variants_file', type=str, help='JSON file with the list of variants (see run_batch).')
+    parser.add_argument('batch_directory', type=str, help='Directory for the variant inputs and the stacked results.')
+    parser.add_argument('--columns', type=str, nargs='*', default=['/value'], help='Substrings of the states columns to keep (none keeps all).')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    with open(args.variants_file, 'r') as f:
+        variants = json.load(f)
+    try:
+        run_batch(args.setup_file, variants, args.batch_directory, tuple(args.columns), args.workers)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
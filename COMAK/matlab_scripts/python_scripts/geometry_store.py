@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import glob
+import shutil
+
+import cohort
+from contact_mesh_cache import hash_file
+
+STORE_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'models', 'geometry_store')
+OBJECTS_DIRECTORY_NAME = 'objects'
+# One entry per mesh file name, linked to its object: the shared geometry search path
+NAMES_DIRECTORY_NAME = 'names'
+INDEX_FILE = 'index.json'
+GEOMETRY_EXTENSIONS = ('.vtp', '.stl', '.obj')
+# Objects are read-only: a link is shared by every model with the mesh, so an in-place write
+# would change all of them (and the object would no longer match its digest)
+OBJECT_MODE = 0o444
+GENERIC_GEOMETRY_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'models', 'lenhart2015_generic', 'Geometry')
+
+
+def object_path(digest, extension, store_directory=STORE_DIRECTORY):
+    """Returns the path of a mesh object in the store (objects/<2 hex digits>/<digest><extension>)."""
+    return os.path.join(store_directory, OBJECTS_DIRECTORY_NAME, digest[:2], digest + extension)
+
+
+def names_directory(store_directory=STORE_DIRECTORY):
+    """Returns the shared geometry search path of the store."""
+    return os.path.join(store_directory, NAMES_DIRECTORY_NAME)
+
+
+def link(source, target):
+    """
+    Replaces target by a hard link to source (same inode, so one copy on disk and in the page
+    cache), or by a symbolic link where hard links are not possible (e.g., across file systems).
+    """
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        os.symlink(os.path.abspath(source), tmp_path)
+    os.replace(tmp_path, target)
+
+
+def load_index(store_directory=STORE_DIRECTORY):
+    """Returns the index of the store: mesh file name -> digest of the object in the search path."""
+    index_file = os.path.join(store_directory, INDEX_FILE)
+    if not os.path.isfile(index_file):
+        return {}
+    with open(index_file, 'r') as f:
+        return json.load(f)
+
+
+def save_index(index, store_directory=STORE_DIRECTORY):
+    os.makedirs(store_directory, exist_ok=True)
+    tmp_path = os.path.join(store_directory, f'{INDEX_FILE}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(store_directory, INDEX_FILE))
+
+
+def add_geometry_directory(geometry_directory, store_directory=STORE_DIRECTORY):
+    """
+    Moves the meshes of a Geometry folder into the store, keeping every unique mesh once, and
+    replaces the files in the folder by links to the stored objects. The mesh_file references of
+    the models stay valid. The first object stored under a file name is also linked into the
+    shared search path (names/); meshes with the same name but other content are reported.
+    Stored objects are made read-only, so a mesh that is personalized or rescaled must be
+    written to a new file (e.g., write and rename) instead of being modified in place.
+
+    Parameters:
+    geometry_directory (str): Geometry folder of a model.
+    store_directory (str): Store directory.
+
+    Returns:
+    dict: 'files' (number of meshes), 'stored' (new objects) and 'saved_bytes' (bytes deduplicated).
+    """
+    if not os.path.isdir(geometry_directory):
+        raise FileNotFoundError(f'Geometry folder not found: {geometry_directory}')
+    index = load_index(store_directory)
+    os.makedirs(names_directory(store_directory), exist_ok=True)
+    stats = {'files': 0, 'stored': 0, 'saved_bytes': 0}
+
+    for file_path in sorted(glob.glob(os.path.join(geometry_directory, '*'))):
+        name = os.path.basename(file_path)
+        if not name.lower().endswith(GEOMETRY_EXTENSIONS) or not os.path.isfile(file_path):
+            continue
+        stats['files'] += 1
+        digest = hash_file(file_path)
+        stored = object_path(digest, os.path.splitext(name)[1].lower(), store_directory)
+        if os.path.isfile(stored):
+            if not os.path.samefile(stored, file_path):
+                stats['saved_bytes'] += os.path.getsize(file_path)
+                link(stored, file_path)
+        else:
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            try:
+                os.link(file_path, stored)
+            except OSError:
+                shutil.copyfile(file_path, stored)
+                link(stored, file_path)
+            stats['stored'] += 1
+        if os.stat(stored).st_mode & 0o777 != OBJECT_MODE:
+            os.chmod(stored, OBJECT_MODE)
+
+        if name not in index:
+            index[name] = digest
+            link(stored, os.path.join(names_directory(store_directory), name))
+        elif index[name] != digest:
+            print(f'[INFO] {file_path} differs from the stored {name}; kept as a separate object')
+    save_index(index, store_directory)
+    return stats
+
+
+def deduplicate_cohort(data_directory=cohort.DATA_DIRECTORY, store_directory=STORE_DIRECTORY):
+    """
+    Adds the generic geometry and the Geometry folder of every patient model to the store.
+
+    Parameters:
+    data_directory (str): Directory containing the patient folders.
+    store_directory (str): Store directory.
+
+    Returns:
+    dict: Totals of add_geometry_directory over all folders.
+    """
+    directories = [GENERIC_GEOMETRY_DIRECTORY] if os.path.isdir(GENERIC_GEOMETRY_DIRECTORY) else []
+    directories += sorted(d for d in glob.glob(os.path.join(data_directory, '*', 'model', 'Geometry'))
+                          if os.path.isdir(d) and not os.path.islink(d))
+    totals = {'files': 0, 'stored': 0, 'saved_bytes': 0}
+    for directory in directories:
+        stats = add_geometry_directory(directory, store_directory)
+        totals = {key: totals[key] + stats[key] for key in totals}
+        print(f"[INFO] {directory}: {stats['files']} meshes, {stats['stored']} new, "
+              f"{stats['saved_bytes'] / 1e6:.1f} MB deduplicated")
+    print(f"[INFO] {len(directories)} Geometry folders, {totals['saved_bytes'] / 1e6:.1f} MB deduplicated in {store_directory}")
+    return totals
+
+
+def resolve(mesh_file, store_directory=STORE_DIRECTORY):
+    """
+    Resolves a mesh_file reference through the shared search path of the store.
+
+    Parameters:
+    mesh_file (str): Value of a mesh_file property.
+    store_directory (str): Store directory.
+
+    Returns:
+    str: Path of the mesh, or None if the store has no mesh of that name.
+    """
+    path = os.path.join(names_directory(store_directory), os.path.basename(mesh_file))
+    return path if os.path.isfile(path) else None
+
+
+def add_search_path(store_directory=STORE_DIRECTORY):
+    """
+    Adds the shared search path to the OpenSim geometry search paths, so models without their
+    own Geometry folder find their meshes in the store.
+
+    Parameters:
+    store_directory (str): Store directory.
+
+    Returns:
+    None
+    """
+    import opensim as osim
+
+    osim.ModelVisualizer.addDirToGeometrySearchPaths(names_directory(store_directory))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Deduplicate the model geometry of all patients into a content-addressed store.')
+    parser.add_argument('--store', type=str, default=STORE_DIRECTORY, help='Store directory (default: models/geometry_store).')
+    parser.add_argument('--geometry', type=str, nargs='*', default=None, help='Geometry folders to add (default: generic and all patients).')
+    args = parser.parse_args()
+
+    try:
+        if args.geometry:
+            for directory in args.geometry:
+                add_geometry_directory(directory, args.store)
+        else:
+            deduplicate_cohort(store_directory=args.store)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
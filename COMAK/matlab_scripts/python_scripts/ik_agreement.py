@@ -0,0 +1,238 @@
+import os
+import sys
+import csv
+import glob
+
+import numpy as np
+
+import cohort
+from sto_io import read_sto
+
+# Primary coordinate -> column of the BTS 1D_Angle_Cycles_*.emt file (mean curve over the cycles)
+COORDINATE_REFERENCES = {
+    'hip_flex_r': 'acmRHPFE.M',
+    'hip_add_r': 'acmRHPAA.M',
+    'hip_rot_r': 'acmRHPIE.M',
+    'knee_flex_r': 'acmRKFE.M',
+    'ankle_flex_r': 'acmRAFE.M',
+}
+
+CYCLE_POINTS = 101
+VALIDATION_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'mean_results', 'validation')
+AGREEMENT_FILE = 'ik_agreement.tsv'
+
+
+def read_angle_cycles(walking_directory):
+    """
+    Reads the mean angle curves of the BTS 1D_Angle_Cycles_*.emt file of a walking trial.
+
+    Parameters:
+    walking_directory (str): Directory containing the *Angle* file.
+
+    Returns:
+    dict: Column label (e.g., 'acmRKFE.M') -> curve over the samples of the cycle.
+    """
+    files = glob.glob(os.path.join(walking_directory, '*Angle*'))
+    if not files:
+        raise FileNotFoundError(f'No angle cycles file found in {walking_directory}')
+    with open(files[0], 'r') as f:
+        lines = f.read().splitlines()
+    header = next(i for i, line in enumerate(lines) if line.strip().startswith('Sample'))
+    labels = [label.strip() for label in lines[header].split('\t')]
+    rows = [line.split('\t') for line in lines[header + 1:] if line.strip()]
+    values = np.array([[float(value) if value.strip() else np.nan for value in row[:len(labels)]] for row in rows])
+    return {label: values[:, i] for i, label in enumerate(labels)}
+
+
+def resample_columns(values, num_points=CYCLE_POINTS):
+    """
+    Linearly resamples all columns of a (frames x columns) array to num_points frames evenly
+    spread over the cycle, with one shared set of interpolation weights.
+
+    Parameters:
+    values (np.ndarray): (frames,) or (frames x columns) values.
+    num_points (int): Number of points of the cycle.
+
+    Returns:
+    np.ndarray: (num_points,) or (num_points x columns) values.
+    """
+    positions = np.linspace(0, len(values) - 1, num_points)
+    lower = np.minimum(np.floor(positions).astype(int), len(values) - 2)
+    weight = positions - lower
+    if values.ndim > 1:
+        weight = weight[:, None]
+    return values[lower] * (1 - weight) + values[lower + 1] * weight
+
+
+def t_critical_95(dof):
+    """
+    Two-sided 95% critical value of the t distribution (Cornish-Fisher expansion, exact to
+    about 1e-4 for the frame counts of a gait cycle).
+    """
+    z = 1.959963984540054
+    dof = np.asarray(dof, dtype=float)
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def agreement_metrics(simulation, reference):
+    """
+    Computes the agreement between simulated and reference curves along the last axis.
+
+    Parameters:
+    simulation (np.ndarray): (..., points) simulated curves.
+    reference (np.ndarray): (..., points) reference curves.
+
+    Returns:
+    dict: Metric name -> array of shape (...): mae, max_error, rmse, pearson_r, r_squared,
+    bias (mean of simulation - reference), sd_difference, loa_lower and loa_upper (Bland-Altman).
+    """
+    difference = simulation - reference
+    sim_centered = simulation - simulation.mean(axis=-1, keepdims=True)
+    ref_centered = reference - reference.mean(axis=-1, keepdims=True)
+    pearson = (sim_centered * ref_centered).sum(axis=-1) / np.sqrt((sim_centered ** 2).sum(axis=-1) * (ref_centered ** 2).sum(axis=-1))
+    bias = difference.mean(axis=-1)
+    sd = difference.std(axis=-1, ddof=1)
+    return {
+        'mae': np.abs(difference).mean(axis=-1),
+        'max_error': np.abs(difference).max(axis=-1),
+        'rmse': np.sqrt((difference ** 2).mean(axis=-1)),
+        'pearson_r': pearson,
+        'r_squared': pearson ** 2,
+        'bias': bias,
+        'sd_difference': sd,
+        'loa_lower': bias - 1.96 * sd,
+        'loa_upper': bias + 1.96 * sd,
+    }
+
+
+def marker_error_metrics(errors):
+    """
+    Summarizes the IK marker errors of the frames (as plot_primary_coordinates_vs_mocap.m).
+
+    Parameters:
+    errors (dict): 'rms' and 'max' marker errors per frame in m.
+
+    Returns:
+    dict: Metric name -> value in cm (mean and 95% confidence half-width of both errors).
+    """
+    metrics = {}
+    for name in ('rms', 'max'):
+        values = np.asarray(errors[name]) * 100
+        metrics[f'marker_error_{name}_mean'] = values.mean()
+        metrics[f'marker_error_{name}_ci95'] = t_critical_95(len(values) - 1) * values.std(ddof=1) / np.sqrt(len(values))
+    return metrics
+
+
+def load_patient(patient):
+    """
+    Loads the simulated primary coordinates (resampled to the cycle), the reference curves and the
+    IK marker errors of a patient.
+
+    Parameters:
+    patient (dict): Patient as returned by cohort.find_patients.
+
+    Returns:
+    dict: 'simulation' and 'reference' (coordinates x CYCLE_POINTS) and 'marker_errors' ('rms', 'max'),
+    None for missing parts.
+    """
+    project_id, numeric_id, basename = patient['project_id'], patient['numeric_id'], patient['results_basename']
+    loaded = {'simulation': None, 'reference': None, 'marker_errors': None}
+
+    values_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak'), f'{basename}_values.sto')
+    if os.path.isfile(values_file):
+        values = read_sto(values_file)
+        columns = []
+        for coordinate in COORDINATE_REFERENCES:
+            matches = [i for i, label in enumerate(values['labels'])
+                       if label == coordinate or label.endswith((f'/{coordinate}', f'/{coordinate}/value'))]
+            columns.append(matches[0] if matches else None)
+        if None not in columns:
+            loaded['simulation'] = resample_columns(values['data'][:, columns]).T
+    else:
+        print(f'[ERROR] Simulation results not found for {project_id}_{numeric_id}: {values_file}')
+
+    try:
+        reference = read_angle_cycles(patient['walking_directory'])
+        loaded['reference'] = np.array([resample_columns(reference[column]) for column in COORDINATE_REFERENCES.values()])
+    except (FileNotFoundError, KeyError) as e:
+        print(f'[ERROR] Motion capture angles not available for {project_id}_{numeric_id}: {e}')
+
+    errors_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak_inverse_kinematics'),
+                               f'{basename}_ik_marker_errors.sto')
+    if os.path.isfile(errors_file):
+        errors = read_sto(errors_file)
+        loaded['marker_errors'] = {'rms': errors['data'][:, errors['labels'].index('marker_error_RMS')],
+                                   'max': errors['data'][:, errors['labels'].index('marker_error_max')]}
+    return loaded
+
+
+def compute_agreement(patients=None, output_file=None):
+    """
+    Computes the IK-vs-motion capture agreement of all primary coordinates for all patients in one
+    pass and writes one tidy table (project_id, numeric_id, coordinate, metric, value). The rows of
+    numeric_id 'mean' compare the cohort mean curves; marker error rows use coordinate 'markers'.
+
+    Parameters:
+    patients (list): Patients as returned by cohort.find_patients. Defaults to all patients.
+    output_file (str): Output table. Defaults to mean_results/validation/ik_agreement.tsv.
+
+    Returns:
+    list: Rows of the table as dicts.
+    """
+    patients = cohort.find_patients() if patients is None else patients
+    output_file = output_file or os.path.join(VALIDATION_DIRECTORY, AGREEMENT_FILE)
+    coordinates = list(COORDINATE_REFERENCES)
+
+    loaded = [(patient, load_patient(patient)) for patient in patients]
+    complete = [(patient, data) for patient, data in loaded if data['simulation'] is not None and data['reference'] is not None]
+
+    rows = []
+    if complete:
+        # (patients x coordinates x points) -> metrics of shape (patients x coordinates)
+        simulation = np.stack([data['simulation'] for _, data in complete])
+        reference = np.stack([data['reference'] for _, data in complete])
+        metrics = agreement_metrics(simulation, reference)
+        for p, (patient, _) in enumerate(complete):
+            for c, coordinate in enumerate(coordinates):
+                rows += [{'project_id': patient['project_id'], 'numeric_id': patient['numeric_id'], 'coordinate': coordinate,
+                          'metric': name, 'value': float(values[p, c])} for name, values in metrics.items()]
+        mean_metrics = agreement_metrics(simulation.mean(axis=0), reference.mean(axis=0))
+        for c, coordinate in enumerate(coordinates):
+            rows += [{'project_id': 'all', 'numeric_id': 'mean', 'coordinate': coordinate,
+                      'metric': name, 'value': float(values[c])} for name, values in mean_metrics.items()]
+
+    pooled = {'rms': [], 'max': []}
+    for patient, data in loaded:
+        if data['marker_errors'] is None:
+            continue
+        for name in pooled:
+            pooled[name].append(data['marker_errors'][name])
+        rows += [{'project_id': patient['project_id'], 'numeric_id': patient['numeric_id'], 'coordinate': 'markers',
+                  'metric': name, 'value': float(value)} for name, value in marker_error_metrics(data['marker_errors']).items()]
+    if pooled['rms']:
+        pooled = {name: np.concatenate(values) for name, values in pooled.items()}
+        rows += [{'project_id': 'all', 'numeric_id': 'mean', 'coordinate': 'markers',
+                  'metric': name, 'value': float(value)} for name, value in marker_error_metrics(pooled).items()]
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['project_id', 'numeric_id', 'coordinate', 'metric', 'value'], delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f'[INFO] Agreement of {len(complete)}/{len(patients)} patients saved to {output_file}')
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compute the IK-vs-motion capture agreement of all patients.')
+    parser.add_argument('--output', type=str, default=None, help='Output table (default: mean_results/validation/ik_agreement.tsv).')
+    args = parser.parse_args()
+
+    try:
+        compute_agreement(output_file=args.output)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,293 @@
+import os
+import sys
+import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import cohort
+import kinematics_preprocessing
+
+# IMU exports of a patient: data/<patient>/imu/ with the vendor files, the sensor mappings of the
+# vendor reader and the model calibrated to the sensors (written by the OpenSense IMUPlacer from
+# the model of the patient if missing)
+IMU_DIRECTORY_NAME = 'imu'
+CALIBRATED_MODEL_FILE = 'calibrated_model.osim'
+# Trials whose name contains one of these are used for the calibration (first frame), otherwise the walking trial
+CALIBRATION_TRIAL_KEYS = ('static', 'calib')
+# IMU whose heading is aligned with the model during the calibration
+BASE_IMU_LABEL = 'pelvis_imu'
+BASE_HEADING_AXIS = '-z'
+VENDORS = {
+    'xsens': {'settings_file': 'xsens_mappings.xml', 'pattern': '*.txt'},
+    'apdm': {'settings_file': 'apdm_mappings.xml', 'pattern': '*.csv'},
+}
+
+# Rotation from the sensor world frame (Z up) into the OpenSim ground frame (Y up)
+SENSOR_TO_OPENSIM_ROTATIONS = (-np.pi / 2, 0.0, 0.0)
+
+_worker = {}
+
+
+def session_trials(imu_directory, vendor):
+    """
+    Returns the trials of an IMU session: the trial prefixes of the Xsens files
+    (<prefix>_<sensor>.txt) or the APDM files (<trial>.csv).
+
+    Parameters:
+    imu_directory (str): IMU directory of the patient.
+    vendor (str): 'xsens' or 'apdm'.
+
+    Returns:
+    list: Sorted trial names.
+    """
+    files = glob.glob(os.path.join(imu_directory, VENDORS[vendor]['pattern']))
+    if vendor == 'xsens':
+        return sorted({os.path.basename(f).rsplit('_', 1)[0] for f in files if '_' in os.path.basename(f)})
+    return sorted(os.path.splitext(os.path.basename(f))[0] for f in files)
+
+
+def find_sessions(data_directory=cohort.DATA_DIRECTORY):
+    """
+    Collects the IMU sessions of every patient folder with an imu/ directory. The walking trial
+    (the trial with 'walk' in its name, or the only trial) is written under the results basename
+    of the marker path (walking_<id>), so the COMAKTool setup of the patient picks it up.
+
+    Parameters:
+    data_directory (str): Directory containing the HOLOA*/STRATO* patient folders.
+
+    Returns:
+    list: One dict per trial with name, project_id, numeric_id, vendor, settings_file,
+    imu_directory, model_file, uncalibrated_model_file, calibration_trial, trial and basename.
+    """
+    sessions = []
+    for name in sorted(os.listdir(data_directory)):
+        imu_directory = os.path.join(data_directory, name, IMU_DIRECTORY_NAME)
+        project_id = next((cohort.PROJECTS[prefix] for prefix in cohort.PROJECTS if name.startswith(prefix)), None)
+        if project_id is None or not os.path.isdir(imu_directory):
+            continue
+        vendor = next((v for v in VENDORS if os.path.isfile(os.path.join(imu_directory, VENDORS[v]['settings_file']))), None)
+        if vendor is None:
+            print(f'[ERROR] No IMU sensor mappings found in {imu_directory}')
+            continue
+
+        numeric_id = name[-3:]
+        trials = session_trials(imu_directory, vendor)
+        walking = [t for t in trials if 'walk' in t.lower()] or (trials if len(trials) == 1 else [])
+        calibration = [t for t in trials if any(key in t.lower() for key in CALIBRATION_TRIAL_KEYS)] or walking or trials
+        models = sorted(glob.glob(os.path.join(data_directory, name, 'model', '*.osim')))
+        for trial in trials:
+            sessions.append({
+                'name': name,
+                'project_id': project_id,
+                'numeric_id': numeric_id,
+                'vendor': vendor,
+                'settings_file': os.path.join(imu_directory, VENDORS[vendor]['settings_file']),
+                'imu_directory': imu_directory,
+                'model_file': os.path.join(imu_directory, CALIBRATED_MODEL_FILE),
+                'uncalibrated_model_file': models[0] if models else None,
+                'calibration_trial': calibration[0] if calibration else None,
+                'trial': trial,
+                'basename': f'walking_{numeric_id}' if walking and trial == walking[0] else trial,
+            })
+    return sessions
+
+
+def read_orientations(session):
+    """
+    Reads the sensor orientations of one trial with the OpenSim vendor reader.
+
+    Parameters:
+    session (dict): Trial as returned by find_sessions.
+
+    Returns:
+    opensim.TimeSeriesTableQuaternion: Orientations labeled by the IMU frames of the model.
+    """
+    import opensim as osim
+
+    if session['vendor'] == 'xsens':
+        settings = osim.XsensDataReaderSettings(session['settings_file'])
+        settings.set_trial_prefix(session['trial'])
+        tables = osim.XsensDataReader(settings).read(session['imu_directory'] + os.sep)
+    else:
+        settings = osim.APDMDataReaderSettings(session['settings_file'])
+        tables = osim.APDMDataReader(settings).read(os.path.join(session['imu_directory'], f"{session['trial']}.csv"))
+    return osim.IMUDataReader.getOrientationsTable(tables)
+
+
+def calibrate_model(session, rotations=SENSOR_TO_OPENSIM_ROTATIONS):
+    """
+    Calibrates the model of a patient to its sensors with the OpenSense IMUPlacer in a worker
+    process: the IMU frames are placed on the model from the first frame of the calibration trial
+    and the model is written to the calibrated model file of the session.
+
+    Parameters:
+    session (dict): A trial of the patient as returned by find_sessions.
+    rotations (tuple): Sensor to OpenSim rotations (rad, x y z body-fixed).
+
+    Returns:
+    tuple: (patient name, calibrated model file), the file is None if the calibration failed.
+    """
+    import opensim as osim
+
+    try:
+        if session['uncalibrated_model_file'] is None:
+            raise FileNotFoundError(f"No model to calibrate in {os.path.join(cohort.DATA_DIRECTORY, session['name'], 'model')}")
+        calibration = dict(session, trial=session['calibration_trial'])
+        imu_results = cohort.patient_results_directory(session['project_id'], session['numeric_id'], IMU_DIRECTORY_NAME)
+        os.makedirs(imu_results, exist_ok=True)
+        orientations_file = os.path.join(imu_results, f"{calibration['trial']}_orientations.sto")
+        osim.STOFileAdapterQuaternion.write(read_orientations(calibration), orientations_file)
+
+        placer = osim.IMUPlacer()
+        placer.set_model_file(session['uncalibrated_model_file'])
+        placer.set_orientation_file_for_calibration(orientations_file)
+        placer.set_sensor_to_opensim_rotations(osim.Vec3(*rotations))
+        placer.set_base_imu_label(BASE_IMU_LABEL)
+        placer.set_base_heading_axis(BASE_HEADING_AXIS)
+        placer.printToXML(os.path.join(imu_results, 'imu_placer_settings.xml'))
+        placer.run(False)
+        placer.getCalibratedModel().printToXML(session['model_file'])
+        return session['name'], session['model_file']
+    except Exception as e:
+        print(f"[ERROR] IMU calibration of {session['name']} failed: {e}")
+        return session['name'], None
+
+
+def _load_model(model_file):
+    # The calibrated model of a patient is parsed once per worker process
+    import opensim as osim
+
+    if model_file not in _worker:
+        model = osim.Model(model_file)
+        model.initSystem()
+        _worker[model_file] = model
+    return _worker[model_file]
+
+
+def run_imu_inverse_kinematics(session, time_range=None, rotations=SENSOR_TO_OPENSIM_ROTATIONS):
+    """
+    Runs the orientation tracking IK of one trial in a worker process: reads the vendor export,
+    writes the orientations to results/<patient>/imu/<trial>_orientations.sto and solves the
+    IMUInverseKinematicsTool on a copy of the cached calibrated model. The motion is written to
+    comak_inverse_kinematics/<basename>_ik.mot, the coordinates file of the COMAKTool. Only the
+    coordinates tracked by the sensors are solved; the secondary knee coordinates are predicted
+    by COMAK as for a marker IK without the COMAK IK stage.
+
+    Parameters:
+    session (dict): Trial as returned by find_sessions.
+    time_range (tuple): Time range of the trial. Defaults to the whole trial.
+    rotations (tuple): Sensor to OpenSim rotations (rad, x y z body-fixed).
+
+    Returns:
+    tuple: (trial name, output motion file), the file is None if the trial failed.
+    """
+    import opensim as osim
+
+    trial_name = f"{session['name']}/{session['trial']}"
+    try:
+        orientations = read_orientations(session)
+        time = orientations.getIndependentColumn()
+        if time_range is None:
+            time_range = (time[0], time[-1])
+
+        imu_results = cohort.patient_results_directory(session['project_id'], session['numeric_id'], IMU_DIRECTORY_NAME)
+        ik_results = cohort.patient_results_directory(session['project_id'], session['numeric_id'], 'comak_inverse_kinematics')
+        os.makedirs(imu_results, exist_ok=True)
+        os.makedirs(ik_results, exist_ok=True)
+        orientations_file = os.path.join(imu_results, f"{session['trial']}_orientations.sto")
+        osim.STOFileAdapterQuaternion.write(orientations, orientations_file)
+
+        tool = osim.IMUInverseKinematicsTool()
+        tool.setName(session['basename'])
+        tool.set_model_file(session['model_file'])
+        tool.set_orientations_file(orientations_file)
+        tool.set_sensor_to_opensim_rotations(osim.Vec3(*rotations))
+        tool.set_time_range(0, float(time_range[0]))
+        tool.set_time_range(1, float(time_range[1]))
+        tool.set_results_directory(ik_results)
+        tool.set_output_motion_file(f"{session['basename']}_ik.mot")
+        tool.set_report_errors(False)
+        tool.setModel(osim.Model(_load_model(session['model_file'])))
+        tool.printToXML(os.path.join(imu_results, f"{session['trial']}_imu_ik_settings.xml"))
+        tool.run(False)
+        motion_file = os.path.join(ik_results, f"{session['basename']}_ik.mot")
+        kinematics_preprocessing.preprocess_kinematics(motion_file)
+        return trial_name, motion_file
+    except Exception as e:
+        print(f'[ERROR] IMU inverse kinematics of {trial_name} failed: {e}')
+        return trial_name, None
+
+
+def ingest_cohort(sessions=None, overwrite=False, time_range=None, max_workers=None, rotations=SENSOR_TO_OPENSIM_ROTATIONS):
+    """
+    Runs the IMU ingestion of many trials in parallel, one trial per task. Patients without a
+    calibrated model are calibrated first (see calibrate_model); their trials are skipped if the
+    calibration fails.
+
+    Parameters:
+    sessions (list): Trials as returned by find_sessions. Defaults to all trials.
+    overwrite (bool): Process trials that already have an _ik.mot file.
+    time_range (tuple): Time range of the trials. Defaults to the whole trials.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+    rotations (tuple): Sensor to OpenSim rotations (rad).
+
+    Returns:
+    dict: Trial name -> output motion file (None if the trial failed).
+    """
+    sessions = find_sessions() if sessions is None else sessions
+    pending = []
+    for session in sessions:
+        motion_file = os.path.join(cohort.patient_results_directory(session['project_id'], session['numeric_id'], 'comak_inverse_kinematics'),
+                                   f"{session['basename']}_ik.mot")
+        if overwrite or not os.path.isfile(motion_file):
+            pending.append(session)
+        else:
+            print(f"[INFO] {session['name']}/{session['trial']} exists, skipped: {motion_file}")
+
+    results = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            # Patients without a calibrated model are calibrated first, once per patient
+            uncalibrated = {s['name']: s for s in pending if not os.path.isfile(s['model_file'])}
+            failed = set()
+            for future in as_completed([executor.submit(calibrate_model, session, rotations) for session in uncalibrated.values()]):
+                name, model_file = future.result()
+                if model_file:
+                    print(f'[INFO] Model of {name} calibrated to the IMUs: {model_file}')
+                else:
+                    failed.add(name)
+            for session in [s for s in pending if s['name'] in failed]:
+                results[f"{session['name']}/{session['trial']}"] = None
+            pending = [s for s in pending if s['name'] not in failed]
+
+            futures = [executor.submit(run_imu_inverse_kinematics, session, time_range, rotations) for session in pending]
+            for future in as_completed(futures):
+                name, motion_file = future.result()
+                results[name] = motion_file
+                if motion_file:
+                    print(f'[INFO] IMU inverse kinematics of {name} saved to {motion_file}')
+    print(f'[INFO] {sum(1 for f in results.values() if f)}/{len(results)} IMU trials processed.')
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the inverse kinematics of the IMU sessions of all patients in parallel.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patient folders to process (default: all).')
+    parser.add_argument('--overwrite', action='store_true', help='Process trials that already have an _ik.mot file.')
+    parser.add_argument('--time-range', type=float, nargs=2, default=None, help='Time range of the trials.')
+    parser.add_argument('--rotations', type=float, nargs=3, default=list(SENSOR_TO_OPENSIM_ROTATIONS),
+                        help='Sensor to OpenSim rotations in rad (default: -pi/2 0 0).')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    try:
+        sessions = find_sessions()
+        if args.patients:
+            sessions = [s for s in sessions if s['name'] in args.patients]
+        ingest_cohort(sessions, args.overwrite, args.time_range, args.workers, tuple(args.rotations))
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import shutil
+
+import numpy as np
+
+import cohort
+from cohort_index import CohortIndex
+from sto_io import read_sto
+from plot_renderer import MUSCLES, RESERVES, KINEMATICS, actuator_axis, find_column
+
+REPORT_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'reports', 'interactive')
+ASSETS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_assets')
+CYCLE_POINTS = 101
+SIGNIFICANT_DIGITS = 4
+
+# Scalar tibiofemoral contact channels of joint_mechanics_h5.CHANNELS shown in the report -> (title, y label)
+JOINT_MECHANICS = {
+    'contact_area': ('Contact Area', 'Area [mm^2]'),
+    'contact_area_medial': ('Medial Contact Area', 'Area [mm^2]'),
+    'contact_area_lateral': ('Lateral Contact Area', 'Area [mm^2]'),
+    'mean_pressure': ('Mean Pressure', 'Pressure [MPa]'),
+    'mean_pressure_medial': ('Medial Mean Pressure', 'Pressure [MPa]'),
+    'mean_pressure_lateral': ('Lateral Mean Pressure', 'Pressure [MPa]'),
+    'max_pressure': ('Max Pressure', 'Pressure [MPa]'),
+    'max_pressure_medial': ('Medial Max Pressure', 'Pressure [MPa]'),
+    'max_pressure_lateral': ('Lateral Max Pressure', 'Pressure [MPa]'),
+}
+
+# Animations of a patient (relative to its graphics directory), only loaded when requested. {suffix}
+# is the render tier suffix of paraview_visualization.animation_basename: the report tier has none.
+ANIMATIONS = {
+    'side': 'paraview/side_animation_{patient}{suffix}.gif',
+    'top': 'paraview/top_animation_{patient}{suffix}.gif',
+    'joint_mechanics': 'paraview/{patient}_animated_joint_mechanics{suffix}.gif',
+}
+# Render tiers tried by the report page, from the lightest to the report tier (paraview_renderer.RENDER_TIERS)
+ANIMATION_TIERS = ('preview', 'report')
+REPORT_TIER = 'report'
+
+
+def animation_candidates():
+    """
+    Returns the files of every animation in the order the report page tries them: the lightest
+    rendered tier is shown.
+
+    Returns:
+    dict: Animation name -> list of paths with a {patient} placeholder.
+    """
+    suffixes = ['' if tier == REPORT_TIER else f'_{tier}' for tier in ANIMATION_TIERS]
+    return {name: [path.replace('{suffix}', suffix) for suffix in suffixes] for name, path in ANIMATIONS.items()}
+
+
+def compact(values):
+    """Rounds curves to SIGNIFICANT_DIGITS digits and replaces NaN with None for the JSON data."""
+    rounded = np.vectorize(lambda v: float(f'{v:.{SIGNIFICANT_DIGITS}g}'), otypes=[float])(np.asarray(values, dtype=float))
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+
+def to_cycle(time, values):
+    """Resamples (frames,) or (frames x columns) values to CYCLE_POINTS points of the cycle."""
+    cycle = (time - time[0]) / (time[-1] - time[0])
+    points = np.linspace(0, 1, CYCLE_POINTS)
+    if values.ndim == 1:
+        return np.interp(points, cycle, values)
+    return np.column_stack([np.interp(points, cycle, column) for column in values.T])
+
+
+def extract_patient(project_id, numeric_id, outputs=None):
+    """
+    Extracts the curves of the report of a patient from the results, resampled to the cycle.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    outputs (dict): Output kind -> file from the cohort index. Defaults to the standard file names.
+
+    Returns:
+    dict: 'activations' (actuator -> curve), 'kinematics' (coordinate -> curve, translations in mm)
+    and 'joint_mechanics' (channel -> curve). Missing results give empty dicts.
+    """
+    comak_directory = cohort.patient_results_directory(project_id, numeric_id, 'comak')
+    outputs = outputs or {}
+    data = {'activations': {}, 'kinematics': {}, 'joint_mechanics': {}}
+
+    activation_file = outputs.get('activation', os.path.join(comak_directory, f'walking_{numeric_id}_activation.sto'))
+    if os.path.isfile(activation_file):
+        table = read_sto(activation_file)
+        for label in {**MUSCLES, **RESERVES}:
+            column = find_column(table['labels'], label)
+            if column is not None:
+                data['activations'][label] = to_cycle(table['time'], table['data'][:, column])
+    else:
+        print(f'[ERROR] Activation results not found for {project_id}_{numeric_id}: {activation_file}')
+
+    values_file = outputs.get('values', os.path.join(comak_directory, f'walking_{numeric_id}_values.sto'))
+    if os.path.isfile(values_file):
+        table = read_sto(values_file)
+        for coordinates in KINEMATICS.values():
+            for coordinate, _, ylabel in coordinates:
+                column = find_column(table['labels'], coordinate)
+                if column is not None:
+                    values = table['data'][:, column] * (1000 if 'Translation' in ylabel else 1)
+                    data['kinematics'][coordinate] = to_cycle(table['time'], values)
+    else:
+        print(f'[ERROR] Simulation results not found for {project_id}_{numeric_id}: {values_file}')
+
+    try:
+        from joint_mechanics_h5 import JointMechanicsH5, results_file
+
+        with JointMechanicsH5(outputs.get('joint_mechanics_h5', results_file(project_id, numeric_id))) as jm:
+            time = jm.time()
+            for channel in JOINT_MECHANICS:
+                data['joint_mechanics'][channel] = to_cycle(time, np.asarray(jm.channel(channel), dtype=float).ravel())
+    except (ImportError, FileNotFoundError, KeyError) as e:
+        print(f'[INFO] No joint mechanics curves for {project_id}_{numeric_id}: {e}')
+    return data
+
+
+def mean_curves(patients_data):
+    """
+    Computes the cohort mean and the 95% confidence half-width of every curve.
+
+    Parameters:
+    patients_data (list): Curves of the patients as returned by extract_patient.
+
+    Returns:
+    dict: Same sections as extract_patient with {'mean': curve, 'ci': curve} per entry.
+    """
+    result = {}
+    for section in ('activations', 'kinematics', 'joint_mechanics'):
+        result[section] = {}
+        names = sorted({name for data in patients_data for name in data[section]})
+        for name in names:
+            curves = np.array([data[section][name] for data in patients_data if name in data[section]])
+            ci = 1.96 * curves.std(axis=0, ddof=1) / np.sqrt(len(curves)) if len(curves) > 1 else np.zeros(CYCLE_POINTS)
+            result[section][name] = {'mean': curves.mean(axis=0), 'ci': ci}
+    return result
+
+
+def write_data_script(file_path, key, data):
+    """
+    Writes the compact data of one page as a script that registers it in window.COMAK_DATA, so the
+    report also loads the data from file:// without a server. Unchanged files are not rewritten.
+
+    Parameters:
+    file_path (str): Output .js file.
+    key (str): Key in COMAK_DATA.
+    data (dict): JSON-serializable data.
+
+    Returns:
+    bool: True if the file was written.
+    """
+    content = (f'window.COMAK_DATA = window.COMAK_DATA || {{}};\n'
+               f'window.COMAK_DATA[{json.dumps(key)}] = {json.dumps(data, separators=(",", ":"))};\n')
+    if os.path.isfile(file_path):
+        with open(file_path, 'r') as f:
+            if f.read() == content:
+                return False
+    with open(file_path, 'w') as f:
+        f.write(content)
+    return True
+
+
+def layout():
+    """Returns the plot layout shared by all pages (titles, labels and limits of the curves)."""
+    actuators = {}
+    for label, title in {**MUSCLES, **RESERVES}.items():
+        ylabel, ylim = actuator_axis(label)
+        actuators[label] = {'title': title, 'ylabel': ylabel, 'ylim': list(ylim) if ylim else None,
+                            'group': 'muscles' if label in MUSCLES else 'reserves'}
+    kinematics = {name: [{'coordinate': coordinate, 'title': f'{title} ({coordinate})', 'ylabel': ylabel}
+                         for coordinate, title, ylabel in coordinates] for name, coordinates in KINEMATICS.items()}
+    joint_mechanics = {channel: {'title': title, 'ylabel': ylabel} for channel, (title, ylabel) in JOINT_MECHANICS.items()}
+    return {'actuators': actuators, 'kinematics': kinematics, 'joint_mechanics': joint_mechanics, 'animations': animation_candidates()}
+
+
+def build_report(patients=None, output_directory=REPORT_DIRECTORY):
+    """
+    Builds the interactive report: one static page, the bundled plotting script and one compact data
+    script per patient (and the cohort mean). The page draws the curves client-side and only loads
+    the data of the selected patient; the GIF animations are only loaded on request.
+
+    Parameters:
+    patients (list): Patients as returned by CohortIndex.patients. Defaults to all indexed patients.
+    output_directory (str): Report directory. Defaults to reports/interactive.
+
+    Returns:
+    str: Path of the report page.
+    """
+    # Patients and output files come from the cohort index (built once if it is empty)
+    with CohortIndex() as index:
+        if patients is None:
+            patients = index.patients()
+            if not patients:
+                index.refresh()
+                patients = index.patients()
+        outputs = {f"{p['project_id']}_{p['numeric_id']}":
+                   {kind: index.output(p['project_id'], p['numeric_id'], kind) for kind in ('activation', 'values', 'joint_mechanics_h5')}
+                   for p in patients}
+    data_directory = os.path.join(output_directory, 'data')
+    os.makedirs(data_directory, exist_ok=True)
+    for asset in os.listdir(ASSETS_DIRECTORY):
+        shutil.copyfile(os.path.join(ASSETS_DIRECTORY, asset), os.path.join(output_directory, asset))
+
+    names, patients_data, written = [], [], 0
+    for patient in patients:
+        name = f"{patient['project_id']}_{patient['numeric_id']}"
+        files = {kind: output['path'] for kind, output in outputs[name].items() if output}
+        data = extract_patient(patient['project_id'], patient['numeric_id'], files)
+        if not any(data.values()):
+            continue
+        names.append(name)
+        patients_data.append(data)
+        page_data = {section: {key: compact(values) for key, values in curves.items()} for section, curves in data.items()}
+        written += write_data_script(os.path.join(data_directory, f'{name}.js'), name, page_data)
+
+    if patients_data:
+        means = mean_curves(patients_data)
+        page_data = {section: {key: {'mean': compact(c['mean']), 'ci': compact(c['ci'])} for key, c in curves.items()}
+                     for section, curves in means.items()}
+        written += write_data_script(os.path.join(data_directory, 'mean.js'), 'mean', page_data)
+
+    written += write_data_script(os.path.join(data_directory, 'index.js'), 'index',
+                                 dict(layout(), patients=names, n_patients=len(names)))
+    print(f'[INFO] Interactive report of {len(names)} patients in {output_directory} ({written} data files updated)')
+    return os.path.join(output_directory, 'index.html')
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the interactive report with client-side plots.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patients as <project>_<id> (default: all).')
+    parser.add_argument('--output', type=str, default=REPORT_DIRECTORY, help='Report directory (default: reports/interactive).')
+    args = parser.parse_args()
+
+    try:
+        patients = None
+        if args.patients:
+            with CohortIndex() as index:
+                patients = [p for p in index.patients() if p['name'] in args.patients]
+        build_report(patients, args.output)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
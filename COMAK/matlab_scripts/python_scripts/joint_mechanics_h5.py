@@ -0,0 +1,196 @@
+import os
+import re
+
+import h5py
+import numpy as np
+
+import cohort
+
+# Regions of the regional outputs of a Smith2018ArticularContactForce: the mesh triangles whose
+# center lies in the half space [+x, -x, +y, -y, +z, -z] of the mesh frame. In the tibia cartilage
+# frame +z points medially, so region 5 is the medial and region 6 the lateral compartment.
+REGIONS = ('+x', '-x', '+y', '-y', '+z', '-z')
+MEDIAL, LATERAL = 5, 6
+
+# Channel name -> (Smith2018ArticularContactForce output, region: 0 total, else 1-based index in REGIONS).
+# Read from the tibia cartilage of tf_contact. Keep in sync with joint_mechanics_channels.m.
+CHANNELS = {
+    'contact_area': ('total_contact_area', 0),
+    'contact_area_medial': ('regional_contact_area', MEDIAL),
+    'contact_area_lateral': ('regional_contact_area', LATERAL),
+    'mean_pressure': ('total_mean_pressure', 0),
+    'mean_pressure_medial': ('regional_mean_pressure', MEDIAL),
+    'mean_pressure_lateral': ('regional_mean_pressure', LATERAL),
+    'max_pressure': ('total_max_pressure', 0),
+    'max_pressure_medial': ('regional_max_pressure', MEDIAL),
+    'max_pressure_lateral': ('regional_max_pressure', LATERAL),
+    'center_of_pressure': ('total_center_of_pressure', 0),
+    'center_of_pressure_medial': ('regional_center_of_pressure', MEDIAL),
+    'center_of_pressure_lateral': ('regional_center_of_pressure', LATERAL),
+    'contact_force': ('total_contact_force', 0),
+    'contact_force_medial': ('regional_contact_force', MEDIAL),
+    'contact_force_lateral': ('regional_contact_force', LATERAL),
+    'contact_moment': ('total_contact_moment', 0),
+    'contact_moment_medial': ('regional_contact_moment', MEDIAL),
+    'contact_moment_lateral': ('regional_contact_moment', LATERAL),
+}
+CHANNEL_CONTACT = 'tf_contact'
+CHANNEL_MESH = 'tibia'
+
+# Top-level group of the contact outputs written by the JointMechanicsTool (ligament and muscle
+# outputs are not written, see states_outputs.py)
+COMPONENT_GROUPS = {
+    'contacts': 'Smith2018ArticularContactForce',
+}
+
+
+def results_file(project_id, numeric_id, basename=None):
+    """
+    Returns the path of the JointMechanicsTool .h5 file of a patient.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    basename (str): Results basename. Defaults to 'walking_<numeric_id>'.
+
+    Returns:
+    str: Path of the .h5 file.
+    """
+    basename = basename or f'walking_{numeric_id}'
+    return os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'joint_mechanics'), f'{basename}.h5')
+
+
+class JointMechanicsH5:
+    """
+    Lazy reader of a JointMechanicsTool .h5 file. Only the dataset paths are indexed when the file
+    is opened; data is read per dataset and only for the requested rows.
+
+    Usage:
+        with JointMechanicsH5(results_file('STRATO', '001')) as jm:
+            pressure = jm.channel('max_pressure_medial')
+            area = jm.read(jm.find('tf_contact', 'total_contact_area', 'tibia'), rows=slice(0, 50))
+    """
+
+    def __init__(self, file_path):
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f'Joint mechanics HDF5 file not found: {file_path}')
+        self.file_path = file_path
+        self.file = h5py.File(file_path, 'r')
+        self.datasets = []
+        self.file.visititems(lambda name, item: self.datasets.append('/' + name) if isinstance(item, h5py.Dataset) else None)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def components(self, group):
+        """
+        Returns the names of the components of a group.
+
+        Parameters:
+        group (str): 'contacts' or an HDF5 group name.
+
+        Returns:
+        list: Component names.
+        """
+        name = COMPONENT_GROUPS.get(group, group)
+        prefix = next((path for path in self.file if path.lower() == name.lower()), None)
+        return list(self.file[prefix].keys()) if prefix else []
+
+    def find(self, component, output, mesh=None):
+        """
+        Returns the path of the dataset of a component output. Exactly one dataset must match.
+
+        Parameters:
+        component (str): Component name (e.g., 'tf_contact').
+        output (str): Output name (e.g., 'total_mean_pressure').
+        mesh (str): Part of the contact mesh name (e.g., 'tibia'). Optional.
+
+        Returns:
+        str: Dataset path.
+        """
+        pattern = re.compile(rf'(^|/|_){re.escape(output)}$')
+        matches = [path for path in self.datasets if f'/{component}/' in path and pattern.search(path)]
+        if mesh is not None:
+            matches = [path for path in matches if mesh in path[path.index(f'/{component}/'):]]
+        if len(matches) != 1:
+            raise KeyError(f'{len(matches)} datasets for {component}/{output} in {self.file_path}: {matches}')
+        return matches[0]
+
+    def read(self, path, rows=slice(None)):
+        """
+        Reads (a slice of) one dataset.
+
+        Parameters:
+        path (str): Dataset path.
+        rows (slice): Frames to read.
+
+        Returns:
+        np.ndarray: Data with frames along the first axis.
+        """
+        return self.file[path][rows]
+
+    def time(self, rows=slice(None)):
+        """Returns the time column."""
+        path = next(path for path in self.datasets if path.rsplit('/', 1)[-1] == 'time')
+        return self.read(path, rows).ravel()
+
+    def channel(self, name, rows=slice(None)):
+        """
+        Reads one channel of the tibiofemoral contact (see CHANNELS).
+
+        Parameters:
+        name (str): Channel name (e.g., 'max_pressure_medial').
+        rows (slice): Frames to read.
+
+        Returns:
+        np.ndarray: (frames,) for scalar channels, (frames, 3) for vector channels.
+        """
+        output, region = CHANNELS[name]
+        data = self.read(self.find(CHANNEL_CONTACT, output, CHANNEL_MESH), rows)
+        if region == 0:
+            return data
+        # Regional outputs are written as (frames, regions) or, for Vec3 outputs, (frames, regions, 3)
+        if data.ndim not in (2, 3) or data.shape[1] != len(REGIONS) or (data.ndim == 3 and data.shape[2] != 3):
+            raise ValueError(f'Unexpected layout {data.shape} of {output} in {self.file_path}')
+        return data[:, region - 1]
+
+    def channels(self, names=None, rows=slice(None)):
+        """
+        Reads several channels.
+
+        Parameters:
+        names (list): Channel names. Defaults to all CHANNELS.
+        rows (slice): Frames to read.
+
+        Returns:
+        dict: 'time' and channel name -> data.
+        """
+        data = {'time': self.time(rows)}
+        for name in names or CHANNELS:
+            data[name] = self.channel(name, rows)
+        return data
+
+
+def resample_to_cycle(time, values, num_points=101):
+    """
+    Resamples a channel to percent of the gait cycle.
+
+    Parameters:
+    time (np.ndarray): Time of the frames.
+    values (np.ndarray): (frames,) or (frames, n) values.
+    num_points (int): Number of points of the cycle.
+
+    Returns:
+    np.ndarray: Resampled values.
+    """
+    cycle = (time - time[0]) / (time[-1] - time[0])
+    points = np.linspace(0, 1, num_points)
+    if values.ndim == 1:
+        return np.interp(points, cycle, values)
+    return np.column_stack([np.interp(points, cycle, column) for column in values.T])
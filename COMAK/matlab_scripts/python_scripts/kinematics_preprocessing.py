@@ -0,0 +1,142 @@
+import os
+import sys
+
+import numpy as np
+
+import cohort
+from sto_io import read_sto, write_sto
+
+# Cut-off frequency of the input kinematics (the lowpass_filter_frequency run_comak.m sets)
+LOWPASS_FREQUENCY = 6.0
+# Order of the Butterworth filter applied forward and backward (zero phase, as filtfilt)
+LOWPASS_ORDER = 2
+PROCESSED_SUFFIX = '_ik_processed.mot'
+
+
+def processed_file(motion_file):
+    """Returns the path of the preprocessed table of an _ik.mot file."""
+    if motion_file.endswith('_ik.mot'):
+        return motion_file[:-len('_ik.mot')] + PROCESSED_SUFFIX
+    return os.path.splitext(motion_file)[0] + '_processed.mot'
+
+
+def resample(time, data, step=None):
+    """
+    Resamples all columns onto a uniform time grid with one linear interpolation.
+
+    Parameters:
+    time (np.ndarray): Time of the frames (increasing).
+    data (np.ndarray): Values (frames x columns).
+    step (float): Time step of the grid. Defaults to the median frame interval.
+
+    Returns:
+    tuple: (time (grid,), data (grid x columns))
+    """
+    if len(time) < 2:
+        raise ValueError('At least two frames are needed to resample')
+    step = float(np.median(np.diff(time))) if step is None or step <= 0 else step
+    grid = time[0] + step * np.arange(int(np.floor((time[-1] - time[0]) / step + 1e-9)) + 1)
+    index = np.clip(np.searchsorted(time, grid, side='right') - 1, 0, len(time) - 2)
+    weight = ((grid - time[index]) / (time[index + 1] - time[index]))[:, None]
+    return grid, data[index] * (1 - weight) + data[index + 1] * weight
+
+
+def lowpass_filter(data, sample_rate, cutoff=LOWPASS_FREQUENCY, order=LOWPASS_ORDER):
+    """
+    Zero-phase Butterworth low-pass filter of all columns at once: the columns are padded with
+    their odd reflection at both ends (as filtfilt) and multiplied in the frequency domain with
+    the squared magnitude response of the filter, which equals a forward-backward pass.
+
+    Parameters:
+    data (np.ndarray): Uniformly sampled values (frames x columns).
+    sample_rate (float): Sampling frequency in Hz.
+    cutoff (float): Cut-off frequency in Hz.
+    order (int): Order of the Butterworth filter.
+
+    Returns:
+    np.ndarray: Filtered values.
+    """
+    if cutoff >= sample_rate / 2:
+        raise ValueError(f'Cut-off frequency {cutoff} Hz must be below the Nyquist frequency ({sample_rate / 2} Hz)')
+    frames = data.shape[0]
+    pad = min(frames - 1, int(np.ceil(3 * sample_rate / cutoff)))
+    padded = np.concatenate([2 * data[:1] - data[pad:0:-1], data, 2 * data[-1:] - data[-2:-pad - 2:-1]])
+    frequencies = np.fft.rfftfreq(padded.shape[0], 1.0 / sample_rate)
+    gain = 1.0 / (1.0 + (frequencies / cutoff) ** (2 * order))
+    filtered = np.fft.irfft(np.fft.rfft(padded, axis=0) * gain[:, None], n=padded.shape[0], axis=0)
+    return filtered[pad:pad + frames]
+
+
+def preprocess_kinematics(motion_file, output_file=None, cutoff=LOWPASS_FREQUENCY, step=None, overwrite=False):
+    """
+    Filters and resamples all coordinate columns of an IK motion once and writes the table the
+    tools read with their own filtering disabled (COMAKTool lowpass_filter_frequency -1, see
+    setup_generator.py). The table is only rewritten if the motion is newer.
+
+    Parameters:
+    motion_file (str): IK motion (_ik.mot).
+    output_file (str): Preprocessed table. Defaults to <basename>_ik_processed.mot.
+    cutoff (float): Cut-off frequency in Hz (no filtering if <= 0).
+    step (float): Time step of the table. Defaults to the frame interval of the motion.
+    overwrite (bool): Rewrite an up-to-date table.
+
+    Returns:
+    str: Path of the preprocessed table.
+    """
+    if not os.path.isfile(motion_file):
+        raise FileNotFoundError(f'IK motion not found: {motion_file}')
+    output_file = processed_file(motion_file) if output_file is None else output_file
+    if not overwrite and os.path.isfile(output_file) and os.path.getmtime(output_file) >= os.path.getmtime(motion_file):
+        return output_file
+
+    table = read_sto(motion_file)
+    time, data = resample(table['time'], table['data'], step)
+    if cutoff > 0:
+        data = lowpass_filter(data, 1.0 / (time[1] - time[0]), cutoff)
+    write_sto(output_file, dict(table, time=time, data=data), name=os.path.splitext(os.path.basename(output_file))[0])
+    print(f'[INFO] {len(table["labels"])} coordinates filtered at {cutoff:g} Hz and resampled to {len(time)} frames: {output_file}')
+    return output_file
+
+
+def preprocess_patient(project_id, numeric_id, cutoff=LOWPASS_FREQUENCY, step=None, overwrite=False):
+    """
+    Preprocesses the IK motion of a patient's walking trial (the coordinates file of its COMAKTool setup).
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    cutoff (float): Cut-off frequency in Hz.
+    step (float): Time step of the table.
+    overwrite (bool): Rewrite an up-to-date table.
+
+    Returns:
+    str: Path of the preprocessed table.
+    """
+    motion_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak_inverse_kinematics'),
+                               f'walking_{numeric_id}_ik.mot')
+    return preprocess_kinematics(motion_file, cutoff=cutoff, step=step, overwrite=overwrite)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Filter and resample the IK motions of all patients for COMAK.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patient folders to process (default: all).')
+    parser.add_argument('--motion-files', type=str, nargs='*', default=None, help='IK motions to process instead of the patients (e.g., called by run_comak.m).')
+    parser.add_argument('--cutoff', type=float, default=LOWPASS_FREQUENCY, help='Cut-off frequency in Hz (default: 6).')
+    parser.add_argument('--step', type=float, default=None, help='Time step of the tables (default: frame interval of the motion).')
+    parser.add_argument('--overwrite', action='store_true', help='Rewrite up-to-date tables.')
+    args = parser.parse_args()
+
+    try:
+        if args.motion_files:
+            for motion_file in args.motion_files:
+                preprocess_kinematics(motion_file, cutoff=args.cutoff, step=args.step, overwrite=args.overwrite)
+            sys.exit(0)
+        for patient in cohort.find_patients():
+            if args.patients and patient['name'] not in args.patients:
+                continue
+            preprocess_patient(patient['project_id'], patient['numeric_id'], args.cutoff, args.step, args.overwrite)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,231 @@
+import os
+import re
+import sys
+import gzip
+import time
+import queue
+import threading
+import collections
+from contextlib import contextmanager
+
+import cohort
+
+LOG_DIRECTORY_NAME = 'logs'
+RING_BUFFER_SIZE = 20000
+# Default OpenSim log file, opened in the working directory the process started in
+FILE_SINK = 'opensim.log'
+# File sink of the Logger as far as this module knows (the Logger cannot be queried): OpenSim's
+# default sink, or None while a patient log replaced it
+_file_sink = os.path.abspath(FILE_SINK)
+
+# Messages per second and burst size allowed per message source. The source of a message is its
+# text with numbers removed, so the lines of one solver loop (e.g. the IPOPT iterations) share a limit.
+RATE_LIMIT = 20.0
+RATE_BURST = 200
+
+_NUMBERS = re.compile(r'[-+]?\d[\d.eE+-]*')
+
+
+def message_source(message):
+    """Returns the rate limiting key of a message (its first 60 characters without numbers)."""
+    return _NUMBERS.sub('#', message.strip()[:60])
+
+
+class RateLimiter:
+    """Token bucket per message source."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.suppressed = collections.Counter()
+
+    def allow(self, source, now):
+        tokens, last = self.buckets.get(source, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        allowed = tokens >= 1
+        self.buckets[source] = (tokens - 1 if allowed else tokens, now)
+        if not allowed:
+            self.suppressed[source] += 1
+        return allowed
+
+    def pop_suppressed(self):
+        suppressed, self.suppressed = self.suppressed, collections.Counter()
+        return suppressed
+
+
+class AsyncLogWriter:
+    """
+    Receives log messages without blocking the caller: every message is kept in a ring buffer (the
+    trace), messages passing the rate limit are queued and written to a gzip file by a background
+    thread. Suppressed messages are summarized in the file once per second.
+    """
+
+    def __init__(self, log_file, rate=RATE_LIMIT, burst=RATE_BURST, buffer_size=RING_BUFFER_SIZE):
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self.log_file = log_file
+        self.trace = collections.deque(maxlen=buffer_size)
+        self.limiter = RateLimiter(rate, burst)
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def write(self, message):
+        now = time.time()
+        with self.lock:
+            self.trace.append((now, message))
+            if self.limiter.allow(message_source(message), now):
+                self.queue.put((now, message))
+
+    def _write(self):
+        last_summary = time.time()
+        with gzip.open(self.log_file, 'at', compresslevel=6) as f:
+            while True:
+                try:
+                    item = self.queue.get(timeout=1.0)
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    f.write(f'{time.strftime("%H:%M:%S", time.localtime(item[0]))} {item[1].rstrip()}\n')
+                if time.time() - last_summary >= 1.0:
+                    last_summary = time.time()
+                    with self.lock:
+                        suppressed = self.limiter.pop_suppressed()
+                    for source, count in suppressed.items():
+                        f.write(f'[rate limit] {count} messages suppressed: {source}\n')
+            with self.lock:
+                suppressed = self.limiter.pop_suppressed()
+            for source, count in suppressed.items():
+                f.write(f'[rate limit] {count} messages suppressed: {source}\n')
+
+    def dump_trace(self, trace_file):
+        """
+        Writes all buffered messages (including the rate-limited ones) to a plain text file.
+
+        Parameters:
+        trace_file (str): Output file.
+
+        Returns:
+        str: Path of the file.
+        """
+        with self.lock:
+            trace = list(self.trace)
+        with open(trace_file, 'w') as f:
+            for timestamp, message in trace:
+                f.write(f'{time.strftime("%H:%M:%S", time.localtime(timestamp))} {message.rstrip()}\n')
+        return trace_file
+
+    def close(self):
+        """Writes the queued messages and closes the file."""
+        self.queue.put(None)
+        self.thread.join()
+
+
+def create_sink(writer):
+    """
+    Creates an OpenSim log sink forwarding the messages of the Logger to a writer.
+
+    Parameters:
+    writer (AsyncLogWriter): Receiver of the messages.
+
+    Returns:
+    opensim.LogSink: Sink to register with opensim.Logger.addSink.
+    """
+    import opensim as osim
+
+    class BufferedLogSink(osim.LogSink):
+        def sinkImpl(self, message):
+            writer.write(message)
+
+        def flushImpl(self):
+            pass
+
+    return BufferedLogSink()
+
+
+@contextmanager
+def patient_log(project_id, numeric_id, stage, level='Debug', rate=RATE_LIMIT, burst=RATE_BURST):
+    """
+    Routes the OpenSim log of a tool run to results/<project>_<id>/logs/<stage>.log.gz instead of
+    opensim.log. Messages are written asynchronously and rate-limited per source; if the block
+    raises, the full buffered trace is written to logs/<stage>_trace.log. The global Logger is
+    restored afterwards: the previous level, and the file sink only if one was active before
+    (not within another patient log).
+
+    Usage:
+        with patient_log('STRATO', '001', 'comak'):
+            tool.run()
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    stage (str): Name of the log files (e.g., 'comak').
+    level (str): OpenSim log level (as Logger.setLevelString in the MATLAB scripts).
+    rate (float): Messages per second per source written to the log file.
+    burst (int): Messages per source written before the rate limit applies.
+
+    Yields:
+    AsyncLogWriter: Writer of the run.
+    """
+    import opensim as osim
+    global _file_sink
+
+    log_directory = os.path.join(cohort.patient_results_directory(project_id, numeric_id), LOG_DIRECTORY_NAME)
+    writer = AsyncLogWriter(os.path.join(log_directory, f'{stage}.log.gz'), rate, burst)
+    sink = create_sink(writer)
+    previous_level = osim.Logger.getLevelString()
+    previous_file_sink = _file_sink
+    if previous_file_sink is not None:
+        osim.Logger.removeFileSink()
+        _file_sink = None
+    osim.Logger.addSink(sink)
+    osim.Logger.setLevelString(level)
+    try:
+        yield writer
+    except Exception:
+        trace_file = writer.dump_trace(os.path.join(log_directory, f'{stage}_trace.log'))
+        print(f'[ERROR] {project_id}_{numeric_id} {stage} failed, full log trace in {trace_file}')
+        raise
+    finally:
+        osim.Logger.removeSink(sink)
+        osim.Logger.setLevelString(previous_level)
+        if previous_file_sink is not None:
+            osim.Logger.addFileSink(previous_file_sink)
+            _file_sink = previous_file_sink
+        writer.close()
+
+
+def read_log(log_file):
+    """
+    Returns the text of a compressed patient log.
+
+    Parameters:
+    log_file (str): Path of a .log.gz file.
+
+    Returns:
+    str: Log text.
+    """
+    if not os.path.isfile(log_file):
+        raise FileNotFoundError(f'Log file not found: {log_file}')
+    with gzip.open(log_file, 'rt') as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Print the compressed OpenSim log of a patient.')
+    parser.add_argument('project_id', type=str, help='Project identifier (e.g., STRATO).')
+    parser.add_argument('numeric_id', type=str, help='Numeric identifier of the patient (e.g., 001).')
+    parser.add_argument('stage', type=str, help='Log name (e.g., comak).')
+    args = parser.parse_args()
+
+    try:
+        print(read_log(os.path.join(cohort.patient_results_directory(args.project_id, args.numeric_id),
+                                    LOG_DIRECTORY_NAME, f'{args.stage}.log.gz')), end='')
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
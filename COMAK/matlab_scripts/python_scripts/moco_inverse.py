@@ -0,0 +1,244 @@
+import os
+import sys
+
+import numpy as np
+
+import cohort
+import setup_generator
+import kinematics_preprocessing
+from sto_io import read_sto, write_sto
+
+DEFAULT_THREADS = os.cpu_count() or 1
+
+
+def resolve(path, directory):
+    """Returns a path of a setup file relative to the setup directory as an absolute path."""
+    return path if not path or os.path.isabs(path) else os.path.normpath(os.path.join(directory, path))
+
+
+def build_inverse(comak, setup_directory):
+    """
+    Builds a MocoInverse problem from the settings of a COMAKTool: model, reserve actuators,
+    external loads, IK kinematics (lowpass filtered as in COMAK), time range and time step.
+
+    Parameters:
+    comak (opensim.COMAKTool): Tool read from the patient's comak_settings.xml.
+    setup_directory (str): Directory of the setup file (for relative paths).
+
+    Returns:
+    opensim.MocoInverse: Configured problem.
+    """
+    import opensim as osim
+
+    model = osim.Model(resolve(comak.get_model_file(), setup_directory))
+    force_set_file = resolve(comak.get_force_set_file(), setup_directory)
+    if force_set_file and not comak.get_replace_force_set():
+        force_set = osim.ForceSet(force_set_file)
+        for i in range(force_set.getSize()):
+            model.addForce(force_set.get(i).clone())
+
+    model_processor = osim.ModelProcessor(model)
+    model_processor.append(osim.ModOpAddExternalLoads(resolve(comak.get_external_loads_file(), setup_directory)))
+    model_processor.append(osim.ModOpIgnoreTendonCompliance())
+    model_processor.append(osim.ModOpReplaceMusclesWithDeGrooteFregly2016())
+    model_processor.append(osim.ModOpIgnorePassiveFiberForcesDGF())
+    model_processor.append(osim.ModOpScaleActiveFiberForceCurveWidthDGF(1.5))
+
+    coordinates_file = resolve(comak.get_coordinates_file(), setup_directory)
+    if not os.path.isfile(coordinates_file):
+        raise FileNotFoundError(f'IK kinematics not found (run the COMAK IK first): {coordinates_file}')
+    kinematics = osim.TableProcessor(coordinates_file)
+    if comak.get_lowpass_filter_frequency() > 0:
+        kinematics.append(osim.TabOpLowPassFilter(comak.get_lowpass_filter_frequency()))
+    kinematics.append(osim.TabOpUseAbsoluteStateNames())
+
+    inverse = osim.MocoInverse()
+    inverse.setName(comak.get_results_prefix())
+    inverse.setModel(model_processor)
+    inverse.setKinematics(kinematics)
+    inverse.set_kinematics_allow_extra_columns(True)
+    inverse.set_mesh_interval(comak.get_time_step())
+
+    table = osim.TimeSeriesTable(coordinates_file)
+    time = table.getIndependentColumn()
+    inverse.set_initial_time(comak.get_start_time() if comak.get_start_time() >= 0 else time[0])
+    inverse.set_final_time(comak.get_stop_time() if comak.get_stop_time() >= 0 else time[-1])
+    return inverse
+
+
+def coordinate_trajectories(inverse, time):
+    """
+    Returns the prescribed coordinate values and speeds (filtered IK kinematics in rad/m) at the
+    solution time points.
+
+    Parameters:
+    inverse (opensim.MocoInverse): Problem as returned by build_inverse.
+    time (np.ndarray): Solution time points.
+
+    Returns:
+    tuple: (coordinate paths, rotational flags, values (frames x coordinates), speeds (frames x coordinates))
+    """
+    import opensim as osim
+
+    model = inverse.getModel().process()
+    model.initSystem()
+    # The IK table is in degrees: process() would keep the rotations in degrees
+    table = inverse.getKinematics().processAndConvertToRadians(model)
+    table_time = np.array(table.getIndependentColumn())
+    labels = list(table.getColumnLabels())
+
+    paths, rotational, values = [], [], []
+    for coordinate in model.getCoordinateSet():
+        path = coordinate.getAbsolutePathString()
+        if f'{path}/value' not in labels:
+            continue
+        column = table.getDependentColumn(f'{path}/value').to_numpy()
+        paths.append(path)
+        rotational.append(coordinate.getMotionType() == osim.Coordinate.Rotational)
+        values.append(np.interp(time, table_time, column))
+    values = np.column_stack(values)
+    speeds = np.gradient(values, time, axis=0)
+    return paths, rotational, values, speeds
+
+
+def write_results(solution, inverse, results_directory, prefix):
+    """
+    Writes a MocoInverse solution in the COMAKTool output layout read by the JointMechanicsTool and
+    the plotting scripts: <prefix>_activation.sto (muscle activations and reserve controls by
+    actuator name), <prefix>_states.sto (coordinate values and speeds and muscle activations) and
+    <prefix>_values.sto (coordinate values, rotations in degrees).
+
+    Parameters:
+    solution (opensim.MocoSolution): Solution of the problem.
+    inverse (opensim.MocoInverse): Problem as returned by build_inverse.
+    results_directory (str): COMAK results directory of the patient.
+    prefix (str): Results prefix (e.g., 'walking_001').
+
+    Returns:
+    list: Paths of the written files.
+    """
+    time = np.asarray(solution.getTimeMat()).ravel()
+    state_names = list(solution.getStateNames())
+    control_names = list(solution.getControlNames())
+    states = np.asarray(solution.getStatesTrajectoryMat())
+    controls = np.asarray(solution.getControlsTrajectoryMat())
+
+    activation_columns = [i for i, name in enumerate(state_names) if name.endswith('/activation')]
+    activation_labels = [state_names[i].split('/')[-2] for i in activation_columns]
+    reserve_columns = [i for i, name in enumerate(control_names) if name.split('/')[-1] not in activation_labels]
+    activations = {
+        'time': time,
+        'labels': activation_labels + [control_names[i].split('/')[-1] for i in reserve_columns],
+        'data': np.column_stack([states[:, activation_columns], controls[:, reserve_columns]]),
+        'in_degrees': False,
+    }
+
+    paths, rotational, values, speeds = coordinate_trajectories(inverse, time)
+    states_table = {
+        'time': time,
+        'labels': [f'{p}/value' for p in paths] + [f'{p}/speed' for p in paths] + [state_names[i] for i in activation_columns],
+        'data': np.column_stack([values, speeds, states[:, activation_columns]]),
+        'in_degrees': False,
+    }
+    values_table = {
+        'time': time,
+        'labels': [f'{p}/value' for p in paths],
+        'data': np.where(rotational, np.degrees(values), values),
+        'in_degrees': True,
+    }
+
+    os.makedirs(results_directory, exist_ok=True)
+    files = []
+    for suffix, table in (('activation', activations), ('states', states_table), ('values', values_table)):
+        file_path = os.path.join(results_directory, f'{prefix}_{suffix}.sto')
+        write_sto(file_path, table, name=f'{prefix}_{suffix}')
+        files.append(file_path)
+    return files
+
+
+def check_values(values_file, coordinates_file, tolerance=1e-3):
+    """
+    Checks that the coordinate values written to <prefix>_values.sto round-trip the IK kinematics
+    (same units, no double conversion).
+
+    Parameters:
+    values_file (str): <prefix>_values.sto written by write_results.
+    coordinates_file (str): IK kinematics of the problem (coordinates file of the COMAKTool).
+    tolerance (float): Maximum absolute difference (deg or m).
+
+    Returns:
+    float: Maximum absolute difference.
+    """
+    values = read_sto(values_file)
+    kinematics = read_sto(coordinates_file)
+    if values['in_degrees'] != kinematics['in_degrees']:
+        raise ValueError(f'{values_file} and {coordinates_file} differ in units (inDegrees)')
+    names = [label.split('/')[-1] for label in kinematics['labels']]
+    error = 0.0
+    for i, label in enumerate(values['labels']):
+        name = label.split('/')[-2] if label.endswith('/value') else label
+        if name not in names:
+            continue
+        expected = np.interp(values['time'], kinematics['time'], kinematics['data'][:, names.index(name)])
+        error = max(error, float(np.max(np.abs(values['data'][:, i] - expected))))
+    if error > tolerance:
+        raise ValueError(f'{values_file} differs from the IK kinematics by {error:.4g} (tolerance {tolerance:g})')
+    return error
+
+
+def run_moco_inverse(project_id, numeric_id, threads=DEFAULT_THREADS):
+    """
+    Runs the muscle-redundancy stage of a patient with MocoInverse instead of COMAKTool. All
+    coordinates (including the secondary knee coordinates of the COMAK IK) are prescribed, so
+    the secondary kinematics are not predicted. The settings are read from the patient's COMAK
+    setup file (see setup_generator.py) and the results replace the COMAKTool outputs.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    threads (int): Threads of the parallel CasADi function evaluation.
+
+    Returns:
+    list: Paths of the written files.
+    """
+    import opensim as osim
+
+    setup_file = os.path.join(cohort.patient_inputs_directory(project_id, numeric_id),
+                              setup_generator.SETUP_FILES['COMAKTool'])
+    if not os.path.isfile(setup_file):
+        raise FileNotFoundError(f'Setup file not found (run setup_generator.py first): {setup_file}')
+    setup_directory = os.path.dirname(setup_file)
+    comak = osim.COMAKTool(setup_file)
+    kinematics_preprocessing.preprocess_patient(project_id, numeric_id)
+
+    inverse = build_inverse(comak, setup_directory)
+    study = inverse.initialize()
+    solver = osim.MocoCasADiSolver.safeDownCast(study.updSolver())
+    solver.set_parallel(int(threads))
+
+    print(f'[INFO] Solving MocoInverse of {project_id}_{numeric_id} with {threads} threads')
+    solution = study.solve()
+    if not solution.success():
+        solution.unseal()
+        raise RuntimeError(f'MocoInverse failed for {project_id}_{numeric_id}: {solution.getStatus()}')
+
+    files = write_results(solution, inverse, resolve(comak.get_results_directory(), setup_directory), comak.get_results_prefix())
+    check_values(files[2], resolve(comak.get_coordinates_file(), setup_directory))
+    print(f'[INFO] MocoInverse results of {project_id}_{numeric_id} saved to {os.path.dirname(files[0])}')
+    return files
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the muscle-redundancy stage of a patient with MocoInverse.')
+    parser.add_argument('project_id', type=str, help='Project identifier (e.g., STRATO).')
+    parser.add_argument('numeric_id', type=str, help='Numeric identifier of the patient (e.g., 001).')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='Threads of the CasADi function evaluation.')
+    args = parser.parse_args()
+
+    try:
+        run_moco_inverse(args.project_id, args.numeric_id, args.threads)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,252 @@
+import os
+import re
+import glob
+import tempfile
+import xml.etree.ElementTree as ET
+
+from paraview.simple import *
+
+TEMPLATE_DIRECTORY = r'../data/paraview_template_files'
+TEMPLATE_FILES = {
+    'side': 'paraview_state_file_side_template.pvsm',
+    'top': 'paraview_state_file_top_template.pvsm',
+}
+CAMERA_PROPERTIES = ['CameraPosition', 'CameraFocalPoint', 'CameraViewUp', 'CameraViewAngle', 'CameraParallelScale']
+
+# Render tiers from highest to lowest quality. Frames are rendered at the final size;
+# frame_step keeps every n-th time step (the animation keeps its duration).
+RENDER_TIERS = {
+    'archive': {'view_size': (1280, 720), 'frame_step': 1},
+    'report': {'view_size': (960, 540), 'frame_step': 1},
+    'preview': {'view_size': (640, 360), 'frame_step': 3},
+}
+DEFAULT_TIER = 'report'
+FRAME_RATE = 25
+
+# '{BASENAME}_<series>_<frame>.vtp' (reader names end with '*') -> series
+SERIES_PATTERN = re.compile(r'^\{BASENAME\}_(.+)_(\d+)\.vtp\*?$')
+
+
+def frame_number(file_path):
+    """
+    Returns the frame number of a JointMechanicsTool .vtp file (the trailing _<n>).
+
+    Parameters:
+    file_path (str): Path to the .vtp file.
+
+    Returns:
+    int: Frame number.
+    """
+    return int(os.path.splitext(file_path)[0].rsplit('_', 1)[1])
+
+
+def tier_time_steps(time_steps, tier):
+    """
+    Returns the time steps rendered for a tier.
+
+    Parameters:
+    time_steps (list): All time step values of the animation.
+    tier (str): One of RENDER_TIERS.
+
+    Returns:
+    list: Every frame_step-th time step.
+    """
+    return list(time_steps)[::RENDER_TIERS[tier]['frame_step']]
+
+
+def higher_tiers(tier):
+    """
+    Returns the tiers of higher quality than a tier, closest first.
+
+    Parameters:
+    tier (str): One of RENDER_TIERS.
+
+    Returns:
+    list: Tier names.
+    """
+    names = list(RENDER_TIERS)
+    return names[:names.index(tier)][::-1]
+
+
+def series_name(name, basename):
+    """
+    Returns the file series of a reader name or file name (e.g., 'mesh_tibia_bone_dynamic_ground_ground').
+
+    Parameters:
+    name (str): Reader registration name or .vtp file name.
+    basename (str): Results basename the name was created with (e.g., 'walking_001').
+
+    Returns:
+    str: Series name, or None if the name does not belong to a series.
+    """
+    name = os.path.basename(name).replace(basename, '{BASENAME}', 1)
+    match = SERIES_PATTERN.match(name)
+    return match.group(1) if match else None
+
+
+def read_view_preset(template_file):
+    """
+    Reads the camera and the representation visibilities of a ParaView state template,
+    so a view can be applied to an already loaded pipeline.
+
+    Parameters:
+    template_file (str): Path to the .pvsm template.
+
+    Returns:
+    dict: 'camera' (property -> values) and 'visibility' (source registration name -> bool).
+    """
+    root = ET.parse(template_file).getroot()
+
+    source_names = {}
+    for collection in root.iter('ProxyCollection'):
+        if collection.get('name') == 'sources':
+            source_names.update({item.get('id'): item.get('name') for item in collection.findall('Item')})
+
+    def values(proxy, name):
+        for prop in proxy.findall('Property'):
+            if prop.get('name') == name:
+                return [element.get('value') for element in prop.findall('Element')]
+        return []
+
+    preset = {'camera': {}, 'visibility': {}}
+    for proxy in root.iter('Proxy'):
+        if proxy.get('group') == 'views' and proxy.get('type') == 'RenderView':
+            preset['camera'] = {name: [float(v) for v in values(proxy, name)] for name in CAMERA_PROPERTIES}
+        elif proxy.get('group') == 'representations' and proxy.get('type') == 'GeometryRepresentation':
+            inputs = [p.get('value') for prop in proxy.findall('Property') if prop.get('name') == 'Input' for p in prop.findall('Proxy')]
+            visibility = values(proxy, 'Visibility')
+            if inputs and visibility and inputs[0] in source_names:
+                preset['visibility'][source_names[inputs[0]]] = visibility[0] == '1'
+    return preset
+
+
+class ParaviewRenderer:
+    """
+    Renders the JointMechanicsTool .vtp series of many patients from one loaded ParaView pipeline.
+
+    The side template is loaded once per process. For every new patient only the file series of
+    the XMLPolyDataReader sources are repointed; the side and top views are two camera and
+    visibility presets (read from the templates) applied to the same render view.
+    """
+
+    def __init__(self, template_directory=TEMPLATE_DIRECTORY, base_view='side'):
+        self.template_directory = template_directory
+        self.base_view = base_view
+        self.presets = {view: read_view_preset(os.path.join(template_directory, file)) for view, file in TEMPLATE_FILES.items()}
+        self.loaded_basename = None
+        self.render_view = None
+
+    def _load_state(self, data_directory, basename):
+        with open(os.path.join(self.template_directory, TEMPLATE_FILES[self.base_view]), 'r') as f:
+            content = f.read()
+        content = content.replace('{DIRECTORY}', data_directory).replace('{BASENAME}', basename)
+
+        with tempfile.NamedTemporaryFile('w', suffix='.pvsm', delete=False) as f:
+            f.write(content)
+            state_file = f.name
+        try:
+            LoadState(state_file)
+        finally:
+            os.remove(state_file)
+
+        self.loaded_basename = basename
+        self.render_view = GetActiveView()
+
+    def _readers(self):
+        """Returns (registration name, proxy) of every XMLPolyDataReader in the pipeline."""
+        return [(name, proxy) for (name, _), proxy in GetSources().items() if proxy.GetXMLName() == 'XMLPolyDataReader']
+
+    def load_patient(self, data_directory, basename):
+        """
+        Points the pipeline to the .vtp series of a patient, loading the state on first use.
+
+        Parameters:
+        data_directory (str): JointMechanicsTool results directory of the patient.
+        basename (str): Results basename (e.g., 'walking_001').
+
+        Returns:
+        list: Time step values of the animation.
+        """
+        if self.render_view is None:
+            self._load_state(data_directory, basename)
+        else:
+            for name, reader in self._readers():
+                series = series_name(name, self.loaded_basename)
+                files = sorted(glob.glob(os.path.join(data_directory, f'{basename}_{series}_*.vtp')), key=frame_number)
+                if not files:
+                    raise FileNotFoundError(f'No .vtp files found for {basename}_{series} in {data_directory}')
+                reader.FileName = files
+                reader.UpdatePipelineInformation()
+
+        animation = GetAnimationScene()
+        animation.UpdateAnimationUsingDataTimeSteps()
+        animation.PlayMode = 'Sequence'
+        return list(animation.TimeKeeper.TimestepValues)
+
+    def apply_view(self, view):
+        """
+        Applies the camera and representation visibilities of a view preset.
+
+        Parameters:
+        view (str): 'side' or 'top'.
+
+        Returns:
+        None
+        """
+        preset = self.presets[view]
+        for (name, _), source in GetSources().items():
+            template_name = name.replace(self.loaded_basename, '{BASENAME}', 1)
+            if template_name in preset['visibility']:
+                GetRepresentation(source, self.render_view).Visibility = int(preset['visibility'][template_name])
+        for prop, value in preset['camera'].items():
+            if value:
+                setattr(self.render_view, prop, value if len(value) > 1 else value[0])
+
+    def render_frames(self, view, output_directory, time_steps, view_size=(1280, 720), progress=None):
+        """
+        Renders one PNG per time step for a view. Frames are numbered consecutively so that
+        decimated time steps still form an ffmpeg image sequence.
+
+        Parameters:
+        view (str): 'side' or 'top'.
+        output_directory (str): Directory for the frame_XXXX.png files.
+        time_steps (list): Time step values to render (see tier_time_steps).
+        view_size (tuple): Resolution in pixels.
+        progress (callable): Called with (frames done, total frames) after every frame. Optional.
+
+        Returns:
+        list: Paths of the rendered frames.
+        """
+        os.makedirs(output_directory, exist_ok=True)
+        self.apply_view(view)
+        self.render_view.ViewSize = list(view_size)
+
+        frames = []
+        for i, time_step in enumerate(time_steps):
+            self.render_view.ViewTime = time_step
+            self.render_view.ResetCamera()
+            file_path = os.path.join(output_directory, f'frame_{i:04d}.png')
+            SaveScreenshot(file_path, self.render_view, ImageResolution=list(view_size))
+            frames.append(file_path)
+            if progress is not None:
+                progress(i + 1, len(time_steps))
+        return frames
+
+
+_renderer = None
+
+
+def get_renderer(template_directory=TEMPLATE_DIRECTORY):
+    """
+    Returns the renderer of this process, creating it on first use.
+
+    Parameters:
+    template_directory (str): Directory holding the .pvsm templates.
+
+    Returns:
+    ParaviewRenderer: The shared renderer.
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = ParaviewRenderer(template_directory)
+    return _renderer
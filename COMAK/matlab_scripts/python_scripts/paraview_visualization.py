@@ -8,6 +8,7 @@ import glob
 from paraview.simple import *
 import sys
 import mp4_to_gif
+import paraview_renderer
 
 def install_ffmpeg():
     print("Downloading ffmpeg...")
@@ -48,146 +49,143 @@ def find_ffmpeg():
             raise FileNotFoundError("ffmpeg installation failed.")
     return ffmpeg_path
 
-def run_paraview_analysis(id, project):
+def animation_basename(visual, project, id, tier):
+    """
+    Returns the file name (without extension) of an animation. The report tier keeps the
+    names referenced by the HTML reports.
+    """
+    basename = f'{visual}_animation_{project}_{id}'
+    return basename if tier == paraview_renderer.DEFAULT_TIER else f'{basename}_{tier}'
+
+def find_source_video(paraview_directory, data_directory, visual, project, id, tier):
+    """
+    Returns the video of the closest higher tier that is newer than the JointMechanicsTool
+    results, or None if the tier has to be rendered.
+    """
+    vtp_files = glob.glob(os.path.join(data_directory, '*.vtp'))
+    if not vtp_files:
+        return None
+    newest_result = max(os.path.getmtime(file_path) for file_path in vtp_files)
+    for higher_tier in paraview_renderer.higher_tiers(tier):
+        video = os.path.join(paraview_directory, animation_basename(visual, project, id, higher_tier) + '.mp4')
+        if os.path.isfile(video) and os.path.getmtime(video) >= newest_result:
+            return video
+    return None
+
+def encode_frames(screenshots_directory, output_video, frame_rate):
+    # Convert PNG frames to video using ffmpeg via subprocess
+    cmd = [
+        'ffmpeg',
+        '-framerate', str(frame_rate),
+        '-i', os.path.join(screenshots_directory, 'frame_%04d.png'),
+        '-c:v', 'libx264',
+        '-pix_fmt', 'yuv420p',
+        '-loglevel', 'error',  # suppress ffmpeg output
+        '-y',  # Overwrite output file if it exists
+        output_video
+    ]
+    subprocess.run(cmd)
+
+def derive_video(source_video, output_video, tier):
+    # Decimate and downscale the video of a higher tier instead of rendering again
+    settings = paraview_renderer.RENDER_TIERS[tier]
+    width, height = settings['view_size']
+    cmd = [
+        'ffmpeg',
+        '-i', source_video,
+        '-vf', f"fps={paraview_renderer.FRAME_RATE}/{settings['frame_step']},scale={width}:{height}:flags=lanczos",
+        '-c:v', 'libx264',
+        '-pix_fmt', 'yuv420p',
+        '-loglevel', 'error',
+        '-y',
+        output_video
+    ]
+    subprocess.run(cmd)
+
+def run_paraview_analysis(id, project, tier=paraview_renderer.DEFAULT_TIER, progress=None):
     ffmpeg_path = find_ffmpeg()
     print(f"Using ffmpeg at: {ffmpeg_path}")
 
+    if tier not in paraview_renderer.RENDER_TIERS:
+        raise ValueError(f"Unknown render tier '{tier}', expected one of {list(paraview_renderer.RENDER_TIERS)}")
+    settings = paraview_renderer.RENDER_TIERS[tier]
+    frame_rate = f"{paraview_renderer.FRAME_RATE}/{settings['frame_step']}"
+
     paraview_directory = rf'../results/{project}_{id}/graphics/paraview'
     data_directory = rf'../results/{project}_{id}/joint_mechanics'
-    template_directory = r'../data/paraview_template_files'
-
-    # Create a directory to store all screenshots
-    screenshots_directories = [os.path.join(paraview_directory, 'screenshots/side'), os.path.join(paraview_directory, 'screenshots/top')]
-    for screenshots_directory in screenshots_directories:
-        if not os.path.exists(screenshots_directory):
-            os.makedirs(screenshots_directory)
 
     # Ensure paraview_directory exists
     if not os.path.exists(paraview_directory):
         os.makedirs(paraview_directory)
 
-    ########## Create paraview setup files (1 from the side and 1 from the top) for data of choice ##########
+    ########## Write patient state files (for opening the views in the ParaView GUI) ##########
 
-    def replace_placeholders_in_file(input_file, output_file, placeholders):
-        with open(input_file, 'r') as f:
+    for visual, template_file in paraview_renderer.TEMPLATE_FILES.items():
+        with open(os.path.join(paraview_renderer.TEMPLATE_DIRECTORY, template_file), 'r') as f:
             content = f.read()
-
-        for placeholder, value in placeholders.items():
-            content = content.replace(f"{{{placeholder}}}", value)
-
-        with open(output_file, 'w') as f:
+        content = content.replace('{DIRECTORY}', data_directory).replace('{BASENAME}', 'walking_' + id)
+        with open(paraview_directory + f'/paraview_state_file_{visual}.pvsm', 'w') as f:
             f.write(content)
 
-    # Paths
-    input_state_files = [template_directory + r'/paraview_state_file_side_template.pvsm', template_directory + r'/paraview_state_file_top_template.pvsm']
-    output_state_files = [paraview_directory + r'/paraview_state_file_side.pvsm', paraview_directory + r'/paraview_state_file_top.pvsm']
-
-    # Define placeholders and their replacements
-    placeholders = {
-        'DIRECTORY': data_directory,
-        'BASENAME': 'walking_' + id
-    }
-
-    replace_placeholders_in_file(input_state_files[0], output_state_files[0], placeholders)
-    replace_placeholders_in_file(input_state_files[1], output_state_files[1], placeholders)
-
     ########## Animation from the side and from top ##########
 
-    # Specify your state file and output video file
-    state_files = output_state_files
-    output_directory = paraview_directory
-    output_video_file = [paraview_directory + f'/side_animation_{project}_{id}.mp4', paraview_directory + f'/top_animation_{project}_{id}.mp4']
+    visuals = ['side', 'top']
+    renderer = None
+    time_steps = None
 
-    for i, state_file in enumerate(state_files):
+    for visual in visuals:
+        output_video = os.path.join(paraview_directory, animation_basename(visual, project, id, tier) + '.mp4')
 
-        # Load the state file
-        LoadState(state_file)
+        # Reuse an up-to-date higher tier if there is one
+        source_video = find_source_video(paraview_directory, data_directory, visual, project, id, tier)
+        if source_video is not None:
+            print(f"Deriving {tier} animation from {source_video}")
+            derive_video(source_video, output_video, tier)
+            if progress is not None:
+                progress(visual, 1, 1)
+            continue
 
-        # Get the active view and render view settings
-        render_view = GetActiveView()
-        render_view.ViewSize = [1280, 720]  # Adjust the resolution as needed
+        # The template state is loaded once per process; later patients only swap the .vtp file series
+        if renderer is None:
+            renderer = paraview_renderer.get_renderer()
+            time_steps = paraview_renderer.tier_time_steps(renderer.load_patient(os.path.abspath(data_directory), 'walking_' + id), tier)
 
-        # Set up the animation parameters
-        animation = GetAnimationScene()
-        animation.PlayMode = 'Sequence'  # Ensure all frames are captured
-        animation.AnimationTime = 0  # Start from the beginning
+        screenshots_directory = os.path.join(paraview_directory, 'screenshots', tier, visual)
 
-        # Calculate total number of frames
-        total_frames = len(animation.TimeKeeper.TimestepValues)
+        # Remove frames of a previous run so ffmpeg only picks up the current ones
+        for file_path in glob.glob(os.path.join(screenshots_directory, 'frame_*.png')):
+            os.remove(file_path)
 
         # Progress bar for screenshot creation
-        with tqdm(total=total_frames, desc=f'Creating screenshots for {state_file}', unit='frames') as pbar:
-
-            # Define a function to save each frame as an image based on time step
-            def save_frame(time_step, output_dir):
-                render_view.ViewTime = time_step
-                file_path = os.path.join(output_dir, f"frame_{int(time_step):04d}.png")
-
-                # Reset camera to default position and focal point
-                render_view.ResetCamera()
-
-                SaveScreenshot(file_path, render_view, ImageResolution=render_view.ViewSize)
-
-                # Update progress bar
+        with tqdm(total=len(time_steps), desc=f'Creating screenshots for {visual} view ({tier})', unit='frames') as pbar:
+            def update(done, total):
                 pbar.update(1)
+                if progress is not None:
+                    progress(visual, done, total)
 
-            # Save each frame based on time steps
-            for time_step in animation.TimeKeeper.TimestepValues:
-                save_frame(time_step, output_directory)
-
-        # Path to input images
-        input_images = os.path.join(output_directory, 'frame_%04d.png')
-
-        # Output video file
-        output_video = output_video_file[i]
-
-        # Convert PNG frames to video using ffmpeg via subprocess
-        cmd = [
-            'ffmpeg',
-            '-framerate', '25',
-            '-i', input_images,
-            '-c:v', 'libx264',
-            '-pix_fmt', 'yuv420p',
-            '-loglevel', 'error',  # suppress ffmpeg output
-            output_video
-        ]
+            renderer.render_frames(visual, screenshots_directory, time_steps, view_size=settings['view_size'], progress=update)
 
         print(f"Converting frames to video: {output_video}")
-
-        # Execute ffmpeg command with subprocess and suppress output
-        subprocess.run(cmd)
-
+        encode_frames(screenshots_directory, output_video, frame_rate)
         print(f"Animation saved as {output_video}")
 
-        # Delete all PNG frames from the output directory and move them to the screenshot folder
-        for file_name in os.listdir(output_directory):
-            if file_name.endswith('.png'):
-                file_path = os.path.join(output_directory, file_name)
-                destination_path = os.path.join(screenshots_directories[i], file_name)
-                try:
-                    shutil.move(file_path, destination_path)
-                except OSError as e:
-                    print(f"Error moving {file_path}: {e.strerror}")
-
     ########## Convert MP4 to GIF ##########
 
-    # Use the module
-    visuals = ['side', 'top']  
-
-    for i, visual in enumerate(visuals):
-        input_video = output_video_file[i]   
-        output_gif = paraview_directory + f'/{visual}_animation_{project}_{id}.gif'
-        palette_path = paraview_directory + f'/{visual}_animation_{project}_{id}_palette.png'     
-
-        mp4_to_gif.mp4_to_gif(input_video, output_gif, palette_path, scale='960:-1', fps=25)
+    # The videos already have the final size, the GIF only keeps it
+    width = settings['view_size'][0]
+    for visual in visuals:
+        basename = os.path.join(paraview_directory, animation_basename(visual, project, id, tier))
+        mp4_to_gif.mp4_to_gif(basename + '.mp4', basename + '.gif', basename + '_palette.png', scale=f'{width}:-1', fps=frame_rate)
 
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description='Run Paraview Analysis.')
-    parser.add_argument('id', type=str, help='ID for the analysis.')
+    parser.add_argument('id', type=str, nargs='+', help='ID(s) for the analysis. Several IDs are rendered with one loaded ParaView state.')
     parser.add_argument('project', type=str, help='Project name for the analysis.')
+    parser.add_argument('--tier', type=str, default=paraview_renderer.DEFAULT_TIER, choices=list(paraview_renderer.RENDER_TIERS), help='Render tier (resolution and frame decimation).')
     args = parser.parse_args()
 
-    run_paraview_analysis(args.id, args.project)
+    for id in args.id:
+        run_paraview_analysis(id, args.project, args.tier)
@@ -0,0 +1,320 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import cohort
+from cohort_index import CohortIndex
+from sto_io import read_sto
+
+# Muscles and reserve actuators of plot_activations.m -> display name
+MUSCLES = {
+    'addbrev_r': 'Adductor Brevis', 'addlong_r': 'Adductor Longus', 'addmagProx_r': 'Adductor Magnus Proximal',
+    'addmagMid_r': 'Adductor Magnus Middle', 'addmagDist_r': 'Adductor Magnus Distal', 'addmagIsch_r': 'Adductor Magnus Ischial',
+    'bflh_r': 'Biceps Femoris Long Head', 'bfsh_r': 'Biceps Femoris Short Head', 'edl_r': 'Extensor Digitorum Longus',
+    'ehl_r': 'Extensor Hallucis Longus', 'fdl_r': 'Flexor Digitorum Longus', 'fhl_r': 'Flexor Hallucis Longus',
+    'gaslat_r': 'Gastrocnemius Lateral', 'gasmed_r': 'Gastrocnemius Medial', 'gem_r': 'Gemellus',
+    'glmax1_r': 'Gluteus Maximus 1', 'glmax2_r': 'Gluteus Maximus 2', 'glmax3_r': 'Gluteus Maximus 3',
+    'glmed1_r': 'Gluteus Medius 1', 'glmed2_r': 'Gluteus Medius 2', 'glmed3_r': 'Gluteus Medius 3',
+    'glmin1_r': 'Gluteus Minimus 1', 'glmin2_r': 'Gluteus Minimus 2', 'glmin3_r': 'Gluteus Minimus 3',
+    'grac_r': 'Gracilis', 'iliacus_r': 'Iliacus', 'pect_r': 'Pectineus', 'perbrev_r': 'Peroneus Brevis',
+    'perlong_r': 'Peroneus Longus', 'pertert_r': 'Peroneus Tertius', 'piri_r': 'Piriformis', 'psoas_r': 'Psoas',
+    'quadfem_r': 'Quadratus Femoris', 'recfem_r': 'Rectus Femoris', 'sart_r': 'Sartorius',
+    'semimem_r': 'Semimembranosus', 'semiten_r': 'Semitendinosus', 'soleus_r': 'Soleus',
+    'tfl_r': 'Tensor Fasciae Latae', 'tibant_r': 'Tibialis Anterior', 'tibpost_r': 'Tibialis Posterior',
+    'vasint_r': 'Vastus Intermedius', 'vaslat_r': 'Vastus Lateralis', 'vasmed_r': 'Vastus Medialis',
+}
+RESERVES = {
+    'hip_flex_r_reserve': 'Hip Flexor Reserve Actuator', 'hip_add_r_reserve': 'Hip Adductor Reserve Actuator',
+    'hip_rot_r_reserve': 'Hip Rotator Reserve Actuator', 'pf_flex_r_reserve': 'Patellofemoral Flexor Reserve Actuator',
+    'pf_rot_r_reserve': 'Patellofemoral Rotator Reserve Actuator', 'pf_tilt_r_reserve': 'Patellofemoral Tilt Reserve Actuator',
+    'pf_tx_r_reserve': 'Patellofemoral Translation X Reserve Actuator', 'pf_ty_r_reserve': 'Patellofemoral Translation Y Reserve Actuator',
+    'pf_tz_r_reserve': 'Patellofemoral Translation Z Reserve Actuator', 'knee_flex_r_reserve': 'Knee Flexor Reserve Actuator',
+    'knee_add_r_reserve': 'Knee Adductor Reserve Actuator', 'knee_rot_r_reserve': 'Knee Rotator Reserve Actuator',
+    'knee_tx_r_reserve': 'Knee Translation X Reserve Actuator', 'knee_ty_r_reserve': 'Knee Translation Y Reserve Actuator',
+    'knee_tz_r_reserve': 'Knee Translation Z Reserve Actuator', 'ankle_flex_r_reserve': 'Ankle Flexor Reserve Actuator',
+}
+
+# Kinematics figures of plot_kinematics.m: file name -> (coordinate, title, y label)
+KINEMATICS = {
+    'tibiofemoral_rotations': [('knee_flex_r', 'Flexion', 'Angle [deg]'), ('knee_add_r', 'Adduction', 'Angle [deg]'),
+                               ('knee_rot_r', 'Internal Rotation', 'Angle [deg]')],
+    'tibiofemoral_translations': [('knee_tx_r', 'Anterior Translation', 'Translation [mm]'), ('knee_ty_r', 'Superior Translation', 'Translation [mm]'),
+                                  ('knee_tz_r', 'Lateral Translation', 'Translation [mm]')],
+    'patellofemoral_rotations': [('pf_flex_r', 'Flexion', 'Angle [deg]'), ('pf_rot_r', 'Rotation', 'Angle [deg]'),
+                                 ('pf_tilt_r', 'Tilt', 'Angle [deg]')],
+    'patellofemoral_translations': [('pf_tx_r', 'Anterior Translation', 'Translation [mm]'), ('pf_ty_r', 'Superior Translation', 'Translation [mm]'),
+                                    ('pf_tz_r', 'Lateral Translation', 'Translation [mm]')],
+}
+
+PLOT_TYPES = ['activations', 'kinematics', 'mean_activations']
+CYCLE_POINTS = 100
+MEAN_RESULTS_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'mean_results')
+
+# Figure templates of this process, built once and reused for every PNG
+_templates = {}
+
+
+class AreaTemplate:
+    """
+    Figure of one activation curve (filled area, optionally a mean line with a confidence band).
+    The axes, labels and grid are built once; render only swaps the data and texts.
+    """
+
+    def __init__(self):
+        self.figure, self.axes = plt.subplots(figsize=(5.6, 4.2), dpi=100)
+        self.axes.set_xlabel('Gait Cycle (%)', fontsize=10)
+        self.axes.grid(True, alpha=0.3)
+        self.axes.tick_params(labelsize=10)
+        for side in ('top', 'right'):
+            self.axes.spines[side].set_visible(False)
+        self.title = self.axes.set_title('', fontsize=12)
+        self.line, = self.axes.plot([], [], color='b', linewidth=1.5)
+        self.area = None
+
+    def render(self, x, y, title, ylabel, ylim, file_path, band=None):
+        if self.area is not None:
+            self.area.remove()
+        if band is None:
+            self.area = self.axes.fill_between(x, 0, y, color='k', alpha=0.5, linewidth=0)
+            self.line.set_data([], [])
+        else:
+            self.area = self.axes.fill_between(x, y - band, y + band, color='b', alpha=0.2, linewidth=0)
+            self.line.set_data(x, y)
+        self.title.set_text(title)
+        self.axes.set_ylabel(ylabel, fontsize=10)
+        self.axes.set_xlim(x[0], x[-1])
+        if ylim is None:
+            self.axes.relim()
+            self.axes.autoscale(axis='y')
+        else:
+            self.axes.set_ylim(*ylim)
+        self.figure.savefig(file_path)
+
+
+class KinematicsTemplate:
+    """Figure of three stacked coordinate curves; render only swaps the line data and texts."""
+
+    def __init__(self):
+        self.figure, self.axes = plt.subplots(3, 1, figsize=(12, 8), dpi=100, sharex=True)
+        self.lines = []
+        for axes in self.axes:
+            axes.grid(True, alpha=0.3)
+            self.lines.append(axes.plot([], [], linewidth=2)[0])
+        self.axes[-1].set_xlabel('Gait Cycle [%]')
+
+    def render(self, x, curves, file_path):
+        for axes, line, (values, title, ylabel) in zip(self.axes, self.lines, curves):
+            line.set_data(x, values)
+            axes.set_title(title)
+            axes.set_ylabel(ylabel)
+            axes.relim()
+            axes.autoscale_view()
+        self.figure.savefig(file_path)
+
+
+def template(name):
+    """Returns the figure template of a plot type, built once per process."""
+    if name not in _templates:
+        _templates[name] = AreaTemplate() if name == 'area' else KinematicsTemplate()
+    return _templates[name]
+
+
+def actuator_axis(label):
+    """Returns the y label and limits of a muscle or reserve actuator (as plot_activations.m)."""
+    if label in MUSCLES:
+        return 'Activation', (0, 1)
+    return ('Force (N)' if any(t in label for t in ('tx', 'ty', 'tz')) else 'Torque (Nm)'), None
+
+
+def find_column(labels, name):
+    # First column containing the name, as contains() in the MATLAB scripts
+    return next((i for i, label in enumerate(labels) if name in label), None)
+
+
+def render_activations(project_id, numeric_id):
+    """
+    Renders one PNG per muscle and reserve actuator of a patient into
+    graphics/muscle_activations and graphics/reserve_actuators.
+
+    Returns:
+    int: Number of PNG files written.
+    """
+    graphics = cohort.patient_results_directory(project_id, numeric_id, 'graphics')
+    activation_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak'), f'walking_{numeric_id}_activation.sto')
+    if not os.path.isfile(activation_file):
+        raise FileNotFoundError(f'Activation results not found: {activation_file}')
+    table = read_sto(activation_file)
+    time = (table['time'] - table['time'][0]) / (table['time'][-1] - table['time'][0]) * 100
+
+    figure = template('area')
+    written = 0
+    for label, title in {**MUSCLES, **RESERVES}.items():
+        column = find_column(table['labels'], label)
+        if column is None:
+            continue
+        output_directory = os.path.join(graphics, 'muscle_activations' if label in MUSCLES else 'reserve_actuators')
+        os.makedirs(output_directory, exist_ok=True)
+        ylabel, ylim = actuator_axis(label)
+        figure.render(time, table['data'][:, column], title, ylabel, ylim, os.path.join(output_directory, f'{label}.png'))
+        written += 1
+    return written
+
+
+def render_kinematics(project_id, numeric_id):
+    """
+    Renders the tibiofemoral and patellofemoral kinematics figures of a patient into graphics/kinematics.
+    Figures with a coordinate missing from the results are skipped.
+
+    Returns:
+    int: Number of PNG files written.
+    """
+    values_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak'), f'walking_{numeric_id}_values.sto')
+    if not os.path.isfile(values_file):
+        raise FileNotFoundError(f'Simulation results not found: {values_file}')
+    table = read_sto(values_file)
+    time = (table['time'] - table['time'][0]) / (table['time'][-1] - table['time'][0]) * 100
+    output_directory = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'graphics'), 'kinematics')
+    os.makedirs(output_directory, exist_ok=True)
+
+    figure = template('kinematics')
+    written = 0
+    for name, coordinates in KINEMATICS.items():
+        columns = [find_column(table['labels'], coordinate) for coordinate, _, _ in coordinates]
+        if None in columns:
+            continue
+        curves = []
+        for column, (coordinate, title, ylabel) in zip(columns, coordinates):
+            values = table['data'][:, column]
+            if 'Translation' in ylabel:
+                values = values * 1000
+            curves.append((values, f'{title} ({coordinate})', ylabel))
+        figure.render(time, curves, os.path.join(output_directory, f'{name}.png'))
+        written += 1
+    return written
+
+
+def render_mean_activations(labels, curves):
+    """
+    Renders the cohort mean activation (with 95% confidence band) of a chunk of actuators into
+    mean_results/muscle_activations and mean_results/reserve_actuators.
+
+    Parameters:
+    labels (list): Actuator names.
+    curves (np.ndarray): (patients x actuators x CYCLE_POINTS) curves.
+
+    Returns:
+    int: Number of PNG files written.
+    """
+    time = np.linspace(0, 100, CYCLE_POINTS)
+    mean = np.nanmean(curves, axis=0)
+    ci = 1.96 * np.nanstd(curves, axis=0, ddof=1) / np.sqrt(np.sum(~np.isnan(curves), axis=0))
+
+    figure = template('area')
+    for i, label in enumerate(labels):
+        output_directory = os.path.join(MEAN_RESULTS_DIRECTORY, 'muscle_activations' if label in MUSCLES else 'reserve_actuators')
+        os.makedirs(output_directory, exist_ok=True)
+        ylabel, ylim = actuator_axis(label)
+        figure.render(time, mean[i], MUSCLES.get(label, RESERVES.get(label)), ylabel, ylim,
+                      os.path.join(output_directory, f'{label}.png'), band=ci[i])
+    return len(labels)
+
+
+def load_activation_curves(patients):
+    """
+    Loads the activations of all patients resampled to the cycle.
+
+    Returns:
+    tuple: (actuator names, (patients x actuators x CYCLE_POINTS) curves with NaN for missing data)
+    """
+    labels = list(MUSCLES) + list(RESERVES)
+    curves = np.full((len(patients), len(labels), CYCLE_POINTS), np.nan)
+    points = np.linspace(0, 1, CYCLE_POINTS)
+    for p, patient in enumerate(patients):
+        activation_file = os.path.join(cohort.patient_results_directory(patient['project_id'], patient['numeric_id'], 'comak'),
+                                       f"walking_{patient['numeric_id']}_activation.sto")
+        if not os.path.isfile(activation_file):
+            print(f"[ERROR] Activation results not found for {patient['project_id']}_{patient['numeric_id']}")
+            continue
+        table = read_sto(activation_file)
+        cycle = np.linspace(0, 1, len(table['time']))
+        for a, label in enumerate(labels):
+            column = find_column(table['labels'], label)
+            if column is not None:
+                curves[p, a] = np.interp(points, cycle, table['data'][:, column])
+    return labels, curves
+
+
+def _render_job(plot_type, args):
+    # Runs in a worker process: the figure templates persist between the jobs of the worker
+    if plot_type == 'activations':
+        return render_activations(*args)
+    if plot_type == 'kinematics':
+        return render_kinematics(*args)
+    return render_mean_activations(*args)
+
+
+def render_all(patients=None, plot_types=PLOT_TYPES, max_workers=None):
+    """
+    Renders the plot sets of many patients (and the cohort means) in parallel worker processes.
+
+    Parameters:
+    patients (list): Patients as returned by CohortIndex.patients. Defaults to all indexed patients.
+    plot_types (list): Subset of PLOT_TYPES.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    int: Number of PNG files written.
+    """
+    unknown = set(plot_types) - set(PLOT_TYPES)
+    if unknown:
+        raise ValueError(f'Unknown plot types: {sorted(unknown)}. Available: {PLOT_TYPES}')
+    if patients is None:
+        with CohortIndex() as index:
+            patients = index.patients()
+
+    jobs = [(plot_type, (patient['project_id'], patient['numeric_id']))
+            for patient in patients for plot_type in plot_types if plot_type != 'mean_activations']
+    if 'mean_activations' in plot_types and patients:
+        labels, curves = load_activation_curves(patients)
+        available = [i for i in range(len(labels)) if not np.all(np.isnan(curves[:, i]))]
+        chunks = np.array_split(np.array(available, dtype=int), max(1, min(len(available), max_workers or os.cpu_count() or 1)))
+        jobs += [('mean_activations', ([labels[i] for i in chunk], curves[:, chunk])) for chunk in chunks if len(chunk)]
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_render_job, plot_type, args): (plot_type, args) for plot_type, args in jobs}
+        for future in as_completed(futures):
+            plot_type, args = futures[future]
+            try:
+                written += future.result()
+            except FileNotFoundError as e:
+                print(f'[ERROR] {plot_type}: {e}')
+    print(f'[INFO] {written} figures rendered for {len(patients)} patients.')
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Render the plot sets of all patients in parallel.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patients as <project>_<id> (default: all).')
+    parser.add_argument('--types', type=str, nargs='*', default=PLOT_TYPES, help=f'Plot types ({", ".join(PLOT_TYPES)}).')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    try:
+        # Patients come from the cohort index: the MATLAB workflow moves processed patient folders
+        # out of the data directory
+        with CohortIndex() as index:
+            patients = index.patients()
+        if args.patients:
+            patients = [p for p in patients if p['name'] in args.patients]
+        render_all(patients, args.types, args.workers)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,333 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import cohort
+
+# Uncertain properties: component class, property, relative half range of the uniform
+# perturbation factor. Every component of the class gets its own sample dimension.
+DEFAULT_PARAMETERS = [
+    {'class': 'Blankevoort1991Ligament', 'property': 'linear_stiffness', 'range': 0.3},
+    {'class': 'Blankevoort1991Ligament', 'property': 'slack_length', 'range': 0.02},
+    {'class': 'Smith2018ContactMesh', 'property': 'elastic_modulus', 'range': 0.3},
+    {'class': 'Smith2018ContactMesh', 'property': 'poissons_ratio', 'range': 0.1},
+    {'class': 'Smith2018ContactMesh', 'property': 'thickness', 'range': 0.2},
+]
+
+# Per-frame contact values recorded for every Smith2018ArticularContactForce (target mesh)
+CONTACT_CURVES = ['contact_force', 'max_pressure', 'mean_pressure', 'contact_area']
+CURVE_POINTS = 101
+
+ENSEMBLE_DIRECTORY_NAME = 'property_ensemble'
+
+_worker = {}
+
+
+def latin_hypercube(num_samples, num_dimensions, seed=None):
+    """
+    Draws a Latin hypercube sample on the unit cube: every dimension is split into num_samples
+    strata and every stratum is hit exactly once.
+
+    Parameters:
+    num_samples (int): Number of samples.
+    num_dimensions (int): Number of dimensions.
+    seed (int): Random seed. Optional.
+
+    Returns:
+    np.ndarray: Samples of shape (num_samples, num_dimensions) in [0, 1).
+    """
+    rng = np.random.default_rng(seed)
+    strata = np.argsort(rng.random((num_dimensions, num_samples)), axis=1).T
+    return (strata + rng.random((num_samples, num_dimensions))) / num_samples
+
+
+def list_components(model, class_name):
+    """
+    Returns the absolute paths of all components of a class in a model.
+
+    Parameters:
+    model (opensim.Model): Model.
+    class_name (str): Concrete class name (e.g., 'Blankevoort1991Ligament').
+
+    Returns:
+    list: Component paths.
+    """
+    return [component.getAbsolutePathString() for component in model.getComponentsList()
+            if component.getConcreteClassName() == class_name]
+
+
+def build_dimensions(model, parameters=DEFAULT_PARAMETERS):
+    """
+    Expands the uncertain parameters into one sample dimension per component and property.
+
+    Parameters:
+    model (opensim.Model): Model.
+    parameters (list): Parameter definitions (see DEFAULT_PARAMETERS).
+
+    Returns:
+    list: One dict per dimension with class, component path, property, nominal value and range.
+    """
+    import opensim as osim
+
+    dimensions = []
+    for parameter in parameters:
+        for path in list_components(model, parameter['class']):
+            component = getattr(osim, parameter['class']).safeDownCast(model.getComponent(path))
+            nominal = getattr(component, f"get_{parameter['property']}")()
+            dimensions.append({'class': parameter['class'], 'component': path, 'property': parameter['property'],
+                               'nominal': float(nominal), 'range': parameter['range']})
+    return dimensions
+
+
+def sample_factors(dimensions, num_samples, seed=None):
+    """
+    Samples the perturbation factors of all dimensions (uniform in 1 +/- range, Latin hypercube).
+
+    Parameters:
+    dimensions (list): Dimensions as returned by build_dimensions.
+    num_samples (int): Number of samples.
+    seed (int): Random seed. Optional.
+
+    Returns:
+    np.ndarray: Factors of shape (num_samples, dimensions).
+    """
+    ranges = np.array([dimension['range'] for dimension in dimensions])
+    return 1 + (2 * latin_hypercube(num_samples, len(dimensions), seed) - 1) * ranges
+
+
+def build_variant(model, dimensions, factors):
+    """
+    Returns an in-memory copy of a model with perturbed properties.
+
+    Parameters:
+    model (opensim.Model): Nominal model.
+    dimensions (list): Dimensions as returned by build_dimensions.
+    factors (np.ndarray): Perturbation factor of every dimension.
+
+    Returns:
+    opensim.Model: Initialized variant.
+    """
+    import opensim as osim
+
+    variant = model.clone()
+    for dimension, factor in zip(dimensions, factors):
+        component = getattr(osim, dimension['class']).safeDownCast(variant.updComponent(dimension['component']))
+        getattr(component, f"set_{dimension['property']}")(dimension['nominal'] * float(factor))
+    variant.initSystem()
+    return variant
+
+
+def evaluate_states(model, states_table):
+    """
+    Poses a model at every frame of a states table (as JointMechanicsTool does) and records the
+    contact values and ligament strains in memory.
+
+    Parameters:
+    model (opensim.Model): Initialized model.
+    states_table (opensim.TimeSeriesTable): States to evaluate.
+
+    Returns:
+    tuple: (contact names, contact curves of shape (contacts, CONTACT_CURVES, CURVE_POINTS),
+    ligament names, peak ligament strains).
+    """
+    import opensim as osim
+
+    contacts = [osim.Smith2018ArticularContactForce.safeDownCast(model.getComponent(path))
+                for path in list_components(model, 'Smith2018ArticularContactForce')]
+    ligaments = [osim.Blankevoort1991Ligament.safeDownCast(model.getComponent(path))
+                 for path in list_components(model, 'Blankevoort1991Ligament')]
+
+    trajectory = osim.StatesTrajectory.createFromStatesTable(model, states_table, True, True)
+    num_frames = trajectory.getSize()
+    values = np.zeros((len(contacts), len(CONTACT_CURVES), num_frames))
+    strains = np.zeros((len(ligaments), num_frames))
+    for frame in range(num_frames):
+        state = trajectory.get(frame)
+        model.realizeReport(state)
+        for i, contact in enumerate(contacts):
+            force = contact.getTargetTotalContactForce(state)
+            values[i, :, frame] = [np.linalg.norm([force.get(0), force.get(1), force.get(2)]),
+                                   contact.getTargetTotalMaxPressure(state),
+                                   contact.getTargetTotalMeanPressure(state),
+                                   contact.getTargetTotalContactArea(state)]
+        for i, ligament in enumerate(ligaments):
+            strains[i, frame] = ligament.getStrain(state)
+
+    # Resample to percent of the cycle
+    cycle = np.linspace(0, 1, num_frames)
+    points = np.linspace(0, 1, CURVE_POINTS)
+    curves = np.apply_along_axis(lambda curve: np.interp(points, cycle, curve), 2, values)
+    return ([contact.getName() for contact in contacts], curves,
+            [ligament.getName() for ligament in ligaments], strains.max(axis=1))
+
+
+def _init_worker(model_file, states_file, dimensions, forsim_setup_file):
+    # The nominal model and the states are parsed once per worker process
+    import opensim as osim
+
+    _worker['model'] = osim.Model(model_file)
+    _worker['model'].initSystem()
+    _worker['states'] = osim.TimeSeriesTable(states_file)
+    _worker['dimensions'] = dimensions
+    _worker['forsim_setup_file'] = forsim_setup_file
+
+
+def run_sample(index, factors):
+    """
+    Builds and evaluates one model variant in a worker process. With a ForsimTool setup file the
+    variant is simulated first (in a temporary directory that is removed afterwards), otherwise
+    the COMAK states are evaluated directly.
+
+    Parameters:
+    index (int): Sample index.
+    factors (np.ndarray): Perturbation factors of the sample.
+
+    Returns:
+    tuple: (index, evaluate_states result), or (index, None) if the sample failed.
+    """
+    import opensim as osim
+
+    try:
+        variant = build_variant(_worker['model'], _worker['dimensions'], factors)
+        if _worker['forsim_setup_file'] is None:
+            return index, evaluate_states(variant, _worker['states'])
+
+        results_directory = tempfile.mkdtemp(prefix='forsim_sample_')
+        try:
+            forsim = osim.ForsimTool(_worker['forsim_setup_file'])
+            forsim.setModel(variant)
+            forsim.set_results_directory(results_directory)
+            forsim.set_use_visualizer(False)
+            if not forsim.run():
+                raise RuntimeError('ForsimTool failed')
+            states_files = glob.glob(os.path.join(results_directory, '*states*.sto'))
+            if not states_files:
+                raise FileNotFoundError('ForsimTool did not write a states file')
+            return index, evaluate_states(variant, osim.TimeSeriesTable(states_files[0]))
+        finally:
+            shutil.rmtree(results_directory, ignore_errors=True)
+    except Exception as e:
+        print(f'[ERROR] Sample {index} failed: {e}')
+        return index, None
+
+
+def run_ensemble(project_id, numeric_id, num_samples, parameters=DEFAULT_PARAMETERS, forsim_setup_file=None,
+                 seed=None, max_workers=None):
+    """
+    Runs a Monte Carlo ensemble over the ligament and contact mesh properties of a patient model.
+    Results are streamed into two compact arrays in the ensemble directory:
+    curves.npy (samples, contacts, CONTACT_CURVES, CURVE_POINTS) and ligament_strain.npy
+    (samples, ligaments), both NaN for failed samples, next to factors.npy and ensemble.json.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    num_samples (int): Number of samples.
+    parameters (list): Uncertain parameters (see DEFAULT_PARAMETERS).
+    forsim_setup_file (str): ForsimTool setup file. If None, the COMAK states are evaluated.
+    seed (int): Random seed. Optional.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+    str: Ensemble directory.
+    """
+    import opensim as osim
+
+    patient = next((p for p in cohort.find_patients() if p['project_id'] == project_id and p['numeric_id'] == numeric_id), None)
+    if patient is None:
+        raise ValueError(f'Patient {project_id}_{numeric_id} not found in {cohort.DATA_DIRECTORY}')
+    states_file = os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak'), f"{patient['results_basename']}_states.sto")
+    if not os.path.isfile(states_file):
+        raise FileNotFoundError(f'COMAK states not found (run COMAK first): {states_file}')
+
+    model = osim.Model(patient['model_file'])
+    model.initSystem()
+    dimensions = build_dimensions(model, parameters)
+    factors = sample_factors(dimensions, num_samples, seed)
+    contact_names = [model.getComponent(path).getName() for path in list_components(model, 'Smith2018ArticularContactForce')]
+    ligament_names = [model.getComponent(path).getName() for path in list_components(model, 'Blankevoort1991Ligament')]
+
+    ensemble_directory = cohort.patient_results_directory(project_id, numeric_id, ENSEMBLE_DIRECTORY_NAME)
+    os.makedirs(ensemble_directory, exist_ok=True)
+    np.save(os.path.join(ensemble_directory, 'factors.npy'), factors)
+    with open(os.path.join(ensemble_directory, 'ensemble.json'), 'w') as f:
+        json.dump({'model_file': patient['model_file'], 'states_file': states_file, 'forsim_setup_file': forsim_setup_file,
+                   'seed': seed, 'dimensions': dimensions, 'contacts': contact_names, 'contact_curves': CONTACT_CURVES,
+                   'ligaments': ligament_names}, f, indent=2)
+
+    curves = np.lib.format.open_memmap(os.path.join(ensemble_directory, 'curves.npy'), mode='w+', dtype=np.float32,
+                                       shape=(num_samples, len(contact_names), len(CONTACT_CURVES), CURVE_POINTS))
+    strains = np.lib.format.open_memmap(os.path.join(ensemble_directory, 'ligament_strain.npy'), mode='w+', dtype=np.float32,
+                                        shape=(num_samples, len(ligament_names)))
+    curves[:] = np.nan
+    strains[:] = np.nan
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(patient['model_file'], states_file, dimensions, forsim_setup_file)) as executor:
+        futures = [executor.submit(run_sample, i, factors[i]) for i in range(num_samples)]
+        for done, future in enumerate(as_completed(futures), 1):
+            index, result = future.result()
+            if result is None:
+                failed += 1
+            else:
+                curves[index] = result[1]
+                strains[index] = result[3]
+            if done % 10 == 0 or done == num_samples:
+                curves.flush()
+                strains.flush()
+                print(f'[INFO] {done}/{num_samples} samples evaluated ({failed} failed).')
+
+    del curves, strains
+    print(f'[INFO] Ensemble saved in {ensemble_directory}')
+    return ensemble_directory
+
+
+def confidence_bands(ensemble_directory, level=0.95):
+    """
+    Returns the median and the confidence band of every contact curve of an ensemble.
+
+    Parameters:
+    ensemble_directory (str): Directory written by run_ensemble.
+    level (float): Coverage of the band.
+
+    Returns:
+    dict: (contact, curve) -> (lower, median, upper) arrays of CURVE_POINTS values.
+    """
+    with open(os.path.join(ensemble_directory, 'ensemble.json'), 'r') as f:
+        info = json.load(f)
+    curves = np.load(os.path.join(ensemble_directory, 'curves.npy'), mmap_mode='r')
+    quantiles = np.nanquantile(curves, [(1 - level) / 2, 0.5, (1 + level) / 2], axis=0)
+    return {(contact, curve): tuple(quantiles[:, i, j]) for i, contact in enumerate(info['contacts'])
+            for j, curve in enumerate(info['contact_curves'])}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Monte Carlo ensemble over ligament and cartilage properties.')
+    parser.add_argument('project', type=str, help='Project name (e.g., STRATO).')
+    parser.add_argument('id', type=str, help='Numeric patient ID (e.g., 001).')
+    parser.add_argument('--samples', type=int, default=200, help='Number of samples.')
+    parser.add_argument('--parameters', type=str, default=None, help='JSON file with the uncertain parameters (see DEFAULT_PARAMETERS).')
+    parser.add_argument('--forsim-setup', type=str, default=None, help='ForsimTool setup file. If omitted, the COMAK states are evaluated.')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    parameters = DEFAULT_PARAMETERS
+    if args.parameters:
+        with open(args.parameters, 'r') as f:
+            parameters = json.load(f)
+
+    try:
+        run_ensemble(args.project, args.id, args.samples, parameters, args.forsim_setup, args.seed, args.workers)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,113 @@
+// Minimal offline line plots for the interactive COMAK report (no external libraries).
+// COMAKPlot.line(canvas, x, series, options) draws curves over the gait cycle:
+//   series:  [{values: [...], band: [...] (optional half-width), color: '#...', label: '...'}]
+//   options: {title: '...', ylabel: '...', ylim: [min, max] (optional)}
+var COMAKPlot = (function() {
+  var MARGIN = {left: 60, right: 15, top: 30, bottom: 45};
+
+  function range(series, ylim) {
+    if (ylim) { return ylim; }
+    var min = Infinity, max = -Infinity;
+    series.forEach(function(s) {
+      s.values.forEach(function(v, i) {
+        if (v === null) { return; }
+        var w = s.band ? s.band[i] || 0 : 0;
+        min = Math.min(min, v - w);
+        max = Math.max(max, v + w);
+      });
+    });
+    if (!isFinite(min)) { return [0, 1]; }
+    if (min === max) { min -= 1; max += 1; }
+    var pad = 0.05 * (max - min);
+    return [min - pad, max + pad];
+  }
+
+  function ticks(min, max, count) {
+    var step = Math.pow(10, Math.floor(Math.log10((max - min) / count)));
+    [1, 2, 5, 10].some(function(m) { if ((max - min) / (step * m) <= count) { step *= m; return true; } return false; });
+    var values = [];
+    for (var t = Math.ceil(min / step) * step; t <= max + 1e-9; t += step) { values.push(+t.toPrecision(6)); }
+    return values;
+  }
+
+  function line(canvas, x, series, options) {
+    var ctx = canvas.getContext('2d');
+    var width = canvas.width, height = canvas.height;
+    var plotWidth = width - MARGIN.left - MARGIN.right, plotHeight = height - MARGIN.top - MARGIN.bottom;
+    var xlim = [x[0], x[x.length - 1]], ylim = range(series, options.ylim);
+    function px(v) { return MARGIN.left + (v - xlim[0]) / (xlim[1] - xlim[0]) * plotWidth; }
+    function py(v) { return MARGIN.top + (1 - (v - ylim[0]) / (ylim[1] - ylim[0])) * plotHeight; }
+
+    ctx.clearRect(0, 0, width, height);
+    ctx.font = '11px Arial';
+    ctx.strokeStyle = '#ddd';
+    ctx.fillStyle = '#333';
+    ctx.textAlign = 'center';
+    ticks(xlim[0], xlim[1], 10).forEach(function(t) {
+      ctx.beginPath(); ctx.moveTo(px(t), MARGIN.top); ctx.lineTo(px(t), MARGIN.top + plotHeight); ctx.stroke();
+      ctx.fillText(t, px(t), MARGIN.top + plotHeight + 15);
+    });
+    ctx.textAlign = 'right';
+    ticks(ylim[0], ylim[1], 6).forEach(function(t) {
+      ctx.beginPath(); ctx.moveTo(MARGIN.left, py(t)); ctx.lineTo(MARGIN.left + plotWidth, py(t)); ctx.stroke();
+      ctx.fillText(t, MARGIN.left - 5, py(t) + 4);
+    });
+    ctx.strokeStyle = '#333';
+    ctx.strokeRect(MARGIN.left, MARGIN.top, plotWidth, plotHeight);
+
+    ctx.save();
+    ctx.beginPath(); ctx.rect(MARGIN.left, MARGIN.top, plotWidth, plotHeight); ctx.clip();
+    series.forEach(function(s) {
+      var color = s.color || '#0000ff';
+      if (s.band) {
+        ctx.beginPath();
+        x.forEach(function(v, i) { ctx.lineTo(px(v), py(s.values[i] + s.band[i])); });
+        for (var i = x.length - 1; i >= 0; i--) { ctx.lineTo(px(x[i]), py(s.values[i] - s.band[i])); }
+        ctx.globalAlpha = 0.25; ctx.fillStyle = color; ctx.fill(); ctx.globalAlpha = 1;
+      }
+      ctx.beginPath();
+      x.forEach(function(v, i) {
+        if (s.values[i] !== null) { ctx.lineTo(px(v), py(s.values[i])); }
+      });
+      ctx.lineWidth = 1.5; ctx.strokeStyle = color; ctx.stroke();
+    });
+    ctx.restore();
+
+    ctx.fillStyle = '#000';
+    ctx.textAlign = 'center';
+    ctx.font = '13px Arial';
+    ctx.fillText(options.title || '', MARGIN.left + plotWidth / 2, 18);
+    ctx.font = '11px Arial';
+    ctx.fillText('Gait Cycle (%)', MARGIN.left + plotWidth / 2, height - 8);
+    ctx.save();
+    ctx.translate(14, MARGIN.top + plotHeight / 2); ctx.rotate(-Math.PI / 2);
+    ctx.fillText(options.ylabel || '', 0, 0);
+    ctx.restore();
+
+    var legend = series.filter(function(s) { return s.label; });
+    ctx.textAlign = 'left';
+    legend.forEach(function(s, i) {
+      ctx.fillStyle = s.color || '#0000ff';
+      ctx.fillRect(MARGIN.left + 8, MARGIN.top + 8 + 14 * i, 10, 3);
+      ctx.fillStyle = '#000';
+      ctx.fillText(s.label, MARGIN.left + 22, MARGIN.top + 13 + 14 * i);
+    });
+  }
+
+  // Loads a data script (window.COMAK_DATA[key]) once, also from file:// pages
+  var loading = {};
+  function load(key, src, callback) {
+    window.COMAK_DATA = window.COMAK_DATA || {};
+    if (window.COMAK_DATA[key]) { callback(window.COMAK_DATA[key]); return; }
+    if (!loading[key]) {
+      loading[key] = [];
+      var script = document.createElement('script');
+      script.src = src;
+      script.onload = function() { loading[key].forEach(function(cb) { cb(window.COMAK_DATA[key]); }); delete loading[key]; };
+      document.head.appendChild(script);
+    }
+    loading[key].push(callback);
+  }
+
+  return {line: line, load: load};
+})();
@@ -0,0 +1,218 @@
+import os
+import sys
+import glob
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cohort
+
+GENERIC_DIRECTORY = os.path.join(cohort.COMAK_DIRECTORY, 'models', 'lenhart2015_generic')
+GENERIC_MODEL_FILE = os.path.join(GENERIC_DIRECTORY, 'ModelScaled_API.osim')
+SCALE_SETUP_FILE = os.path.join(GENERIC_DIRECTORY, 'ManualScaleSetup.xml')
+MARKER_SET_FILE = os.path.join(GENERIC_DIRECTORY, 'MarkerSet.xml')
+GEOMETRY_DIRECTORY = os.path.join(GENERIC_DIRECTORY, 'Geometry')
+
+_worker = {}
+
+
+def find_subjects(data_directory=cohort.DATA_DIRECTORY):
+    """
+    Collects the scaling inputs of every patient folder with a standing trial. Unlike
+    cohort.find_patients, the patient does not need a model yet. Subjects without a body
+    weight (.emt/.mdx file) are skipped with an error message.
+
+    Parameters:
+    data_directory (str): Directory containing the HOLOA*/STRATO* patient folders.
+
+    Returns:
+    list: One dict per subject with project_id, numeric_id, patient_directory, standing_file,
+    body_weight and model_file (the output model).
+    """
+    subjects = []
+    for name in sorted(os.listdir(data_directory)):
+        patient_directory = os.path.join(data_directory, name)
+        project_id = next((cohort.PROJECTS[prefix] for prefix in cohort.PROJECTS if name.startswith(prefix)), None)
+        if project_id is None or not os.path.isdir(patient_directory):
+            continue
+        standing_files = glob.glob(os.path.join(patient_directory, 'standing', 'Standing_*.trc'))
+        if not standing_files:
+            print(f'[ERROR] No standing trial found for {name}')
+            continue
+
+        numeric_id = name[-3:]
+        try:
+            if project_id == 'HOLOA':
+                body_weight = cohort.extract_bodyweight_from_mdx(patient_directory)
+            else:
+                body_weight = cohort.extract_bodyweight_from_emt(patient_directory)
+        except (FileNotFoundError, ValueError) as e:
+            print(f'[ERROR] Skipping subject {name}: {e}')
+            continue
+        subjects.append({
+            'name': name,
+            'project_id': project_id,
+            'numeric_id': numeric_id,
+            'patient_directory': patient_directory,
+            'standing_file': standing_files[0],
+            'body_weight': body_weight,
+            'model_file': os.path.join(patient_directory, 'model', f'model_{project_id}_{numeric_id}.osim'),
+        })
+    return subjects
+
+
+def _init_worker(generic_model_file, marker_set_file, setup_file):
+    # The generic model, its marker set and the scale setup are parsed once per worker process
+    import opensim as osim
+
+    model = osim.Model(generic_model_file)
+    model.updateMarkerSet(osim.MarkerSet(marker_set_file))
+    model.initSystem()
+    _worker['model'] = model
+    _worker['tool'] = osim.ScaleTool(setup_file)
+    _worker['generic_model_file'] = generic_model_file
+    _worker['marker_set_file'] = marker_set_file
+
+
+def link_geometry(model_directory, geometry_directory=GEOMETRY_DIRECTORY):
+    """
+    Makes the generic geometry available next to a scaled model (symbolic link, copy where links
+    are not supported). An existing Geometry folder is kept.
+
+    Parameters:
+    model_directory (str): Directory of the scaled model.
+    geometry_directory (str): Generic Geometry folder.
+
+    Returns:
+    str: Path of the Geometry folder of the model.
+    """
+    target = os.path.join(model_directory, 'Geometry')
+    if not os.path.exists(target):
+        try:
+            os.symlink(geometry_directory, target, target_is_directory=True)
+        except OSError:
+            shutil.copytree(geometry_directory, target)
+    return target
+
+
+def scale_subject(subject, time_range=None):
+    """
+    Scales the cached generic model to one subject in a worker process: ModelScaler with the
+    subject mass, then MarkerPlacer on the standing trial. Writes the model, the scale factors
+    and the filled-in Scale_Setup.xml to the patient's model directory.
+
+    Parameters:
+    subject (dict): Subject as returned by find_subjects.
+    time_range (tuple): Time range of the standing trial to average. Defaults to the whole trial.
+
+    Returns:
+    tuple: (subject name, output model file), the file is None if scaling failed.
+    """
+    import opensim as osim
+
+    try:
+        model_directory = os.path.dirname(subject['model_file'])
+        os.makedirs(model_directory, exist_ok=True)
+        if time_range is None:
+            markers = osim.MarkerData(subject['standing_file'])
+            time_range = (markers.getStartFrameTime(), markers.getLastFrameTime())
+        times = osim.ArrayDouble()
+        for value in time_range:
+            times.append(float(value))
+
+        tool = _worker['tool'].clone()
+        tool.setName(f"{subject['project_id']}_{subject['numeric_id']}")
+        tool.setSubjectMass(subject['body_weight'])
+        tool.getGenericModelMaker().setModelFileName(_worker['generic_model_file'])
+        tool.getGenericModelMaker().setMarkerSetFileName(_worker['marker_set_file'])
+
+        scaler = tool.getModelScaler()
+        scaler.setMarkerFileName(subject['standing_file'])
+        scaler.setTimeRange(times)
+        scaler.setOutputModelFileName('')
+        scaler.setOutputScaleFileName(os.path.join(model_directory, 'scale_factors.xml'))
+        placer = tool.getMarkerPlacer()
+        placer.setStaticPoseFileName(subject['standing_file'])
+        placer.setTimeRange(times)
+        placer.setOutputModelFileName(subject['model_file'])
+        placer.setOutputMotionFileName(os.path.join(model_directory, 'static_pose.mot'))
+
+        # Copy of the cached generic model instead of parsing it again (as ScaleTool.run would)
+        model = osim.Model(_worker['model'])
+        model.initSystem()
+        if scaler.getApply() and not scaler.processModel(model, model_directory, subject['body_weight']):
+            raise RuntimeError('ModelScaler failed')
+        model.initSystem()
+        if placer.getApply():
+            if not placer.processModel(model, model_directory):
+                raise RuntimeError('MarkerPlacer failed')
+        else:
+            model.printToXML(subject['model_file'])
+
+        tool.printToXML(os.path.join(model_directory, 'Scale_Setup.xml'))
+        link_geometry(model_directory)
+        return subject['name'], subject['model_file']
+    except Exception as e:
+        print(f"[ERROR] Scaling {subject['name']} failed: {e}")
+        return subject['name'], None
+
+
+def scale_cohort(subjects=None, overwrite=False, time_range=None, max_workers=None,
+                 generic_model_file=GENERIC_MODEL_FILE, marker_set_file=MARKER_SET_FILE, setup_file=SCALE_SETUP_FILE):
+    """
+    Scales the generic Lenhart model to many subjects in parallel. Every worker parses and
+    initializes the generic model and its marker set once and scales copies of it.
+
+    Parameters:
+    subjects (list): Subjects as returned by find_subjects. Defaults to all subjects.
+    overwrite (bool): Scale subjects that already have a model.
+    time_range (tuple): Time range of the standing trials. Defaults to the whole trials.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+    generic_model_file (str): Generic model.
+    marker_set_file (str): Marker set of the generic model.
+    setup_file (str): ScaleTool setup with the scaling measurements or factors.
+
+    Returns:
+    dict: Subject name -> output model file (None if scaling failed).
+    """
+    for file_path in (generic_model_file, marker_set_file, setup_file):
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError(f'File not found: {file_path}')
+    subjects = find_subjects() if subjects is None else subjects
+    pending = [s for s in subjects if overwrite or not os.path.isfile(s['model_file'])]
+    for subject in subjects:
+        if subject not in pending:
+            print(f"[INFO] Model of {subject['name']} exists, skipped: {subject['model_file']}")
+
+    results = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(generic_model_file, marker_set_file, setup_file)) as executor:
+            futures = [executor.submit(scale_subject, subject, time_range) for subject in pending]
+            for future in as_completed(futures):
+                name, model_file = future.result()
+                results[name] = model_file
+                if model_file:
+                    print(f'[INFO] Scaled model of {name} saved to {model_file}')
+    print(f'[INFO] {sum(1 for f in results.values() if f)}/{len(pending)} subjects scaled.')
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Scale the generic Lenhart model to all subjects in parallel.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patient folders to scale (default: all).')
+    parser.add_argument('--overwrite', action='store_true', help='Scale subjects that already have a model.')
+    parser.add_argument('--time-range', type=float, nargs=2, default=None, help='Time range of the standing trials.')
+    parser.add_argument('--setup', type=str, default=SCALE_SETUP_FILE, help='ScaleTool setup file (default: ManualScaleSetup.xml).')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    args = parser.parse_args()
+
+    try:
+        subjects = find_subjects()
+        if args.patients:
+            subjects = [s for s in subjects if s['name'] in args.patients]
+        scale_cohort(subjects, args.overwrite, args.time_range, args.workers, setup_file=args.setup)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,445 @@
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import cohort
+import kinematics_preprocessing
+
+TEMPLATE_DIRECTORY = os.path.join(cohort.INPUTS_DIRECTORY, 'templates')
+EXTERNAL_LOADS_TEMPLATE = os.path.join(cohort.DATA_DIRECTORY, 'template_ext_loads.xml')
+RESERVE_ACTUATORS_FILE = os.path.join(cohort.DATA_DIRECTORY, 'lenhart2015_reserve_actuators.xml')
+
+# Setup file names written to inputs/<project>_<id>/ (same names as the MATLAB run_* functions)
+SETUP_FILES = {
+    'COMAKInverseKinematicsTool': 'comak_inverse_kinematics_settings.xml',
+    'COMAKTool': 'comak_settings.xml',
+    'JointMechanicsTool': 'joint_mechanics_settings.xml',
+}
+
+SECONDARY_COORDINATES = [
+    ('knee_add_r', '/jointset/knee_r/knee_add_r', 0.01),
+    ('knee_rot_r', '/jointset/knee_r/knee_rot_r', 0.01),
+    ('knee_tx_r', '/jointset/knee_r/knee_tx_r', 0.05),
+    ('knee_ty_r', '/jointset/knee_r/knee_ty_r', 0.05),
+    ('knee_tz_r', '/jointset/knee_r/knee_tz_r', 0.05),
+    ('pf_flex_r', '/jointset/pf_r/pf_flex_r', 0.01),
+    ('pf_rot_r', '/jointset/pf_r/pf_rot_r', 0.01),
+    ('pf_tilt_r', '/jointset/pf_r/pf_tilt_r', 0.01),
+    ('pf_tx_r', '/jointset/pf_r/pf_tx_r', 0.005),
+    ('pf_ty_r', '/jointset/pf_r/pf_ty_r', 0.005),
+    ('pf_tz_r', '/jointset/pf_r/pf_tz_r', 0.005),
+]
+
+PRIMARY_COORDINATES = [
+    '/jointset/hip_r/hip_flex_r', '/jointset/hip_r/hip_add_r', '/jointset/hip_r/hip_rot_r',
+    '/jointset/knee_r/knee_flex_r', '/jointset/ankle_r/ankle_flex_r',
+]
+
+PRESCRIBED_COORDINATES = [
+    '/jointset/gnd_pelvis/pelvis_tx', '/jointset/gnd_pelvis/pelvis_ty', '/jointset/gnd_pelvis/pelvis_tz',
+    '/jointset/gnd_pelvis/pelvis_tilt', '/jointset/gnd_pelvis/pelvis_list', '/jointset/gnd_pelvis/pelvis_rot',
+    '/jointset/subtalar_r/subt_angle_r', '/jointset/mtp_r/mtp_angle_r',
+    '/jointset/hip_l/hip_flex_l', '/jointset/hip_l/hip_add_l', '/jointset/hip_l/hip_rot_l',
+    '/jointset/pf_l/pf_l_r3', '/jointset/pf_l/pf_l_tx', '/jointset/pf_l/pf_l_ty',
+    '/jointset/knee_l/knee_flex_l', '/jointset/ankle_l/ankle_flex_l',
+    '/jointset/subtalar_l/subt_angle_l', '/jointset/mtp_l/mtp_angle_l',
+    '/jointset/pelvis_torso/lumbar_ext', '/jointset/pelvis_torso/lumbar_latbend', '/jointset/pelvis_torso/lumbar_rot',
+    '/jointset/torso_neckhead/neck_ext', '/jointset/torso_neckhead/neck_latbend', '/jointset/torso_neckhead/neck_rot',
+    '/jointset/acromial_r/arm_add_r', '/jointset/acromial_r/arm_flex_r', '/jointset/acromial_r/arm_rot_r',
+    '/jointset/elbow_r/elbow_flex_r', '/jointset/radioulnar_r/pro_sup_r', '/jointset/radius_hand_r/wrist_flex_r',
+    '/jointset/acromial_l/arm_add_l', '/jointset/acromial_l/arm_flex_l', '/jointset/acromial_l/arm_rot_l',
+    '/jointset/elbow_l/elbow_flex_l', '/jointset/radioulnar_l/pro_sup_l', '/jointset/radius_hand_l/wrist_flex_l',
+]
+
+IK_MARKER_WEIGHTS = [
+    ('r.should', 1), ('l.should', 1), ('c7', 1), ('r.asis', 15), ('l.asis', 15), ('sacrum', 15),
+    ('r.bar1', 5), ('r.knee1', 20), ('r.bar2', 5), ('r.mall', 20), ('r.heel', 20), ('r.met', 20),
+    ('l.bar1', 5), ('l.knee1', 20), ('l.bar2', 5), ('l.mall', 20), ('l.heel', 20), ('l.met', 20),
+]
+
+
+def build_comak_ik_template():
+    """
+    Builds the COMAKInverseKinematicsTool with the settings of run_ik.m (patient-independent part).
+
+    Returns:
+    opensim.COMAKInverseKinematicsTool: Configured tool.
+    """
+    import opensim as osim
+
+    comak_ik = osim.COMAKInverseKinematicsTool()
+    comak_ik.set_perform_secondary_constraint_sim(True)
+    for i, (_, coordinate, _) in enumerate(SECONDARY_COORDINATES):
+        comak_ik.set_secondary_coordinates(i, coordinate)
+    comak_ik.set_secondary_coupled_coordinate('/jointset/knee_r/knee_flex_r')
+    comak_ik.set_secondary_constraint_sim_settle_threshold(1e-4)
+    comak_ik.set_secondary_constraint_sim_sweep_time(3.0)
+    comak_ik.set_secondary_coupled_coordinate_start_value(0)
+    comak_ik.set_secondary_coupled_coordinate_stop_value(100)
+    comak_ik.set_secondary_constraint_sim_integrator_accuracy(1e-2)
+    comak_ik.set_secondary_constraint_sim_internal_step_limit(10000)
+    comak_ik.set_constraint_function_num_interpolation_points(20)
+    comak_ik.set_print_secondary_constraint_sim_results(True)
+    comak_ik.set_perform_inverse_kinematics(True)
+    comak_ik.set_report_errors(True)
+    comak_ik.set_report_marker_locations(False)
+    comak_ik.set_ik_constraint_weight(100)
+    comak_ik.set_ik_accuracy(1e-5)
+    comak_ik.set_use_visualizer(False)
+    comak_ik.set_verbose(10)
+
+    ik_task_set = osim.IKTaskSet()
+    ik_task = osim.IKMarkerTask()
+    for marker, weight in IK_MARKER_WEIGHTS:
+        ik_task.setName(marker)
+        ik_task.setWeight(weight)
+        ik_task_set.cloneAndAppend(ik_task)
+    comak_ik.set_IKTaskSet(ik_task_set)
+    return comak_ik
+
+
+def build_comak_template():
+    """
+    Builds the COMAKTool with the default settings of run_comak.m (patient-independent part).
+
+    Returns:
+    opensim.COMAKTool: Configured tool.
+    """
+    import opensim as osim
+
+    comak = osim.COMAKTool()
+    comak.set_replace_force_set(False)
+    comak.set_force_set_file(RESERVE_ACTUATORS_FILE)
+    comak.set_time_step(0.01)
+    # The IK motion is filtered once by kinematics_preprocessing.py (6 Hz) before the tool runs
+    comak.set_lowpass_filter_frequency(-1)
+    comak.set_print_processed_input_kinematics(False)
+    for i, coordinate in enumerate(PRESCRIBED_COORDINATES):
+        comak.set_prescribed_coordinates(i, coordinate)
+    for i, coordinate in enumerate(PRIMARY_COORDINATES):
+        comak.set_primary_coordinates(i, coordinate)
+
+    secondary_coord_set = osim.COMAKSecondaryCoordinateSet()
+    secondary_coord = osim.COMAKSecondaryCoordinate()
+    for name, coordinate, max_change in SECONDARY_COORDINATES:
+        secondary_coord.setName(name)
+        secondary_coord.set_max_change(max_change)
+        secondary_coord.set_coordinate(coordinate)
+        secondary_coord_set.cloneAndAppend(secondary_coord)
+    comak.set_COMAKSecondaryCoordinateSet(secondary_coord_set)
+
+    comak.set_settle_secondary_coordinates_at_start(True)
+    comak.set_settle_threshold(1e-3)
+    comak.set_settle_accuracy(1e-2)
+    comak.set_settle_internal_step_limit(10000)
+    comak.set_print_settle_sim_results(True)
+    comak.set_settle_sim_results_prefix('walking_settle_sim')
+    comak.set_max_iterations(25)
+    comak.set_udot_tolerance(1)
+    comak.set_udot_worse_case_tolerance(50)
+    comak.set_unit_udot_epsilon(1e-6)
+    comak.set_optimization_scale_delta_coord(1)
+    comak.set_ipopt_diagnostics_level(3)
+    comak.set_ipopt_max_iterations(500)
+    comak.set_ipopt_convergence_tolerance(1e-4)
+    comak.set_ipopt_constraint_tolerance(1e-4)
+    comak.set_ipopt_limited_memory_history(200)
+    comak.set_ipopt_nlp_scaling_max_gradient(10000)
+    comak.set_ipopt_nlp_scaling_min_value(1e-8)
+    comak.set_ipopt_obj_scaling_factor(1)
+    comak.set_activation_exponent(2)
+    comak.set_contact_energy_weight(100)
+    comak.set_non_muscle_actuator_weight(1000)
+    comak.set_model_assembly_accuracy(1e-12)
+    comak.set_use_visualizer(False)
+    comak.set_verbose(2)
+    return comak
+
+
+def build_joint_mechanics_template(print_vtp=True):
+    """
+    Builds the JointMechanicsTool with the settings of run_joint_mechanics.m (patient-independent part).
+
+    Parameters:
+    print_vtp (bool): Write .vtp files (e.g., for ParaView visualization).
+
+    Returns:
+    opensim.JointMechanicsTool: Configured tool.
+    """
+    import opensim as osim
+
+    jnt_mech = osim.JointMechanicsTool()
+    jnt_mech.set_use_muscle_physiology(False)
+    jnt_mech.set_start_time(0)
+    jnt_mech.set_stop_time(-1)
+    jnt_mech.set_resample_step_size(-1)
+    jnt_mech.set_normalize_to_cycle(True)
+    jnt_mech.set_lowpass_filter_frequency(-1)
+    jnt_mech.set_print_processed_kinematics(False)
+    jnt_mech.set_contacts(0, 'all')
+    jnt_mech.set_contact_outputs(0, 'all')
+    jnt_mech.set_contact_mesh_properties(0, 'none')
+    # Ligament and muscle outputs are computed on demand from the COMAK states (states_outputs.py)
+    jnt_mech.set_ligaments(0, 'none')
+    jnt_mech.set_ligament_outputs(0, 'none')
+    jnt_mech.set_muscles(0, 'none')
+    jnt_mech.set_muscle_outputs(0, 'none')
+    jnt_mech.set_attached_geometry_bodies(0, 'all')
+    jnt_mech.set_output_orientation_frame('ground')
+    jnt_mech.set_output_position_frame('ground')
+    jnt_mech.set_write_vtp_files(print_vtp)
+    jnt_mech.set_vtp_file_format('binary')
+    jnt_mech.set_write_h5_file(True)
+    jnt_mech.set_h5_kinematics_data(True)
+    jnt_mech.set_h5_states_data(True)
+    jnt_mech.set_write_transforms_file(False)
+    jnt_mech.set_output_transforms_file_type('sto')
+    jnt_mech.set_use_visualizer(False)
+    jnt_mech.set_verbose(0)
+
+    analysis_set = osim.AnalysisSet()
+    frc_reporter = osim.ForceReporter()
+    frc_reporter.setName('ForceReporter')
+    analysis_set.cloneAndAppend(frc_reporter)
+    jnt_mech.set_AnalysisSet(analysis_set)
+    return jnt_mech
+
+
+def normalized_xml(path):
+    """
+    Parses an XML file into a whitespace-insensitive string for comparison.
+
+    Parameters:
+    path (str): Path to the XML file.
+
+    Returns:
+    str: Canonical XML string.
+    """
+    root = ET.parse(path).getroot()
+    for element in root.iter():
+        element.text = element.text.strip() if element.text else None
+        element.tail = None
+    return ET.tostring(root, encoding='unicode')
+
+
+def validate_template(tool_class, path):
+    """
+    Checks that OpenSim reads a template back into an identical tool.
+
+    Parameters:
+    tool_class (type): OpenSim tool class (e.g., opensim.COMAKTool).
+    path (str): Path to the printed template.
+
+    Returns:
+    None
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        reprinted = os.path.join(directory, os.path.basename(path))
+        tool_class(path).printToXML(reprinted)
+        if normalized_xml(reprinted) != normalized_xml(path):
+            raise ValueError(f'Template {path} does not round-trip through {tool_class.__name__}')
+
+
+def write_templates(template_directory=TEMPLATE_DIRECTORY, print_vtp=True):
+    """
+    Builds, prints and validates one template per tool.
+
+    Parameters:
+    template_directory (str): Directory to write the templates to.
+    print_vtp (bool): Write .vtp files in the JointMechanicsTool.
+
+    Returns:
+    dict: Tool class name -> template path.
+    """
+    import opensim as osim
+
+    os.makedirs(template_directory, exist_ok=True)
+    tools = {
+        'COMAKInverseKinematicsTool': (osim.COMAKInverseKinematicsTool, build_comak_ik_template()),
+        'COMAKTool': (osim.COMAKTool, build_comak_template()),
+        'JointMechanicsTool': (osim.JointMechanicsTool, build_joint_mechanics_template(print_vtp)),
+    }
+    templates = {}
+    for name, (tool_class, tool) in tools.items():
+        path = os.path.join(template_directory, SETUP_FILES[name])
+        tool.printToXML(path)
+        validate_template(tool_class, path)
+        templates[name] = path
+        print(f'[INFO] Template validated: {path}')
+    return templates
+
+
+def patient_settings(patient):
+    """
+    Returns the patient-specific property values of every tool (the part run_ik.m, run_comak.m
+    and run_joint_mechanics.m set per patient).
+
+    Parameters:
+    patient (dict): Patient entry as returned by cohort.find_patients.
+
+    Returns:
+    dict: Tool class name -> {property: value}.
+    """
+    project_id, numeric_id, basename = patient['project_id'], patient['numeric_id'], patient['results_basename']
+    ik_dir = cohort.patient_results_directory(project_id, numeric_id, 'comak_inverse_kinematics')
+    comak_dir = cohort.patient_results_directory(project_id, numeric_id, 'comak')
+    jnt_mech_dir = cohort.patient_results_directory(project_id, numeric_id, 'joint_mechanics')
+
+    return {
+        'COMAKInverseKinematicsTool': {
+            'model_file': patient['model_file'],
+            'results_directory': ik_dir,
+            'results_prefix': basename,
+            'secondary_constraint_function_file': os.path.join(ik_dir, 'secondary_coordinate_constraint_functions.xml'),
+            'constrained_model_file': os.path.join(ik_dir, 'ik_constrained_model.osim'),
+            'marker_file': patient['motion_file'],
+            'output_motion_file': f'{basename}_ik.mot',
+            'time_range': f"{patient['time_start']:.15g} {patient['time_stop']:.15g}",
+        },
+        'COMAKTool': {
+            'model_file': patient['model_file'],
+            'coordinates_file': os.path.join(ik_dir, f'{basename}{kinematics_preprocessing.PROCESSED_SUFFIX}'),
+            'external_loads_file': os.path.join(patient['walking_directory'], 'external_loads.xml'),
+            'results_directory': comak_dir,
+            'results_prefix': basename,
+            'start_time': f"{patient['time_start']:.15g}",
+            'stop_time': f"{patient['time_stop']:.15g}",
+            'settle_sim_results_directory': comak_dir,
+        },
+        'JointMechanicsTool': {
+            'model_file': patient['model_file'],
+            'input_states_file': os.path.join(comak_dir, f'{basename}_states.sto'),
+            'results_directory': jnt_mech_dir,
+            'results_file_basename': basename,
+            'start_time': f"{patient['time_start']:.15g}",
+            'stop_time': f"{patient['time_stop']:.15g}",
+        },
+    }
+
+
+def fill_template(template_text, tool_name, settings):
+    """
+    Sets property values of a tool in the text of a printed template.
+
+    Parameters:
+    template_text (str): XML text of the template.
+    tool_name (str): Tool element tag (e.g., 'COMAKTool').
+    settings (dict): Property name -> value.
+
+    Returns:
+    str: XML text with the properties set.
+    """
+    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+    root = ET.fromstring(template_text, parser=parser)
+    tool = root if root.tag == tool_name else root.find(tool_name)
+    for prop, value in settings.items():
+        element = tool.find(prop)
+        if element is None:
+            raise KeyError(f'{tool_name} template has no property {prop}')
+        element.text = str(value)
+    return '<?xml version="1.0" encoding="UTF-8" ?>\n' + ET.tostring(root, encoding='unicode') + '\n'
+
+
+def write_if_changed(path, text):
+    """
+    Writes a text file only if its content differs from the existing file.
+
+    Parameters:
+    path (str): Destination path.
+    text (str): File content.
+
+    Returns:
+    bool: True if the file was written.
+    """
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return False
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+
+def write_patient_setups(patient, templates, external_loads_template):
+    """
+    Writes the external loads file and the three tool setup files of one patient.
+
+    Parameters:
+    patient (dict): Patient entry as returned by cohort.find_patients.
+    templates (dict): Tool class name -> template XML text.
+    external_loads_template (str): XML text of template_ext_loads.xml.
+
+    Returns:
+    dict: Written file path -> True if it changed.
+    """
+    project_id, numeric_id = patient['project_id'], patient['numeric_id']
+    for stage in cohort.RESULT_STAGES:
+        os.makedirs(cohort.patient_results_directory(project_id, numeric_id, stage), exist_ok=True)
+    inputs_dir = cohort.patient_inputs_directory(project_id, numeric_id)
+    os.makedirs(inputs_dir, exist_ok=True)
+
+    status = {}
+    ext_loads_file = os.path.join(patient['walking_directory'], 'external_loads.xml')
+    ext_loads = fill_template(external_loads_template, 'ExternalLoads', {'datafile': os.path.basename(patient['grf_file'])})
+    status[ext_loads_file] = write_if_changed(ext_loads_file, ext_loads)
+
+    for tool_name, settings in patient_settings(patient).items():
+        path = os.path.join(inputs_dir, SETUP_FILES[tool_name])
+        status[path] = write_if_changed(path, fill_template(templates[tool_name], tool_name, settings))
+    return status
+
+
+def generate_cohort_setups(data_directory=cohort.DATA_DIRECTORY, template_directory=TEMPLATE_DIRECTORY,
+                           max_workers=None, rebuild_templates=False):
+    """
+    Writes the setup files of every patient in the data directory in one pass. Templates are
+    built once with OpenSim; the per-patient files are filled in parallel from the template text,
+    and files whose content did not change are left untouched.
+
+    Parameters:
+    data_directory (str): Directory containing the patient folders.
+    template_directory (str): Directory holding the tool templates.
+    max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+    rebuild_templates (bool): Rebuild the templates even if they exist.
+
+    Returns:
+    dict: Patient folder name -> {file path: changed}.
+    """
+    template_paths = {name: os.path.join(template_directory, file) for name, file in SETUP_FILES.items()}
+    if rebuild_templates or not all(os.path.isfile(path) for path in template_paths.values()):
+        template_paths = write_templates(template_directory)
+
+    templates = {}
+    for name, path in template_paths.items():
+        with open(path, 'r') as f:
+            templates[name] = f.read()
+    with open(EXTERNAL_LOADS_TEMPLATE, 'r') as f:
+        external_loads_template = f.read()
+
+    patients = cohort.find_patients(data_directory)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(write_patient_setups, patients,
+                               [templates] * len(patients), [external_loads_template] * len(patients))
+        status = {patient['name']: result for patient, result in zip(patients, results)}
+
+    changed = sum(any(result.values()) for result in status.values())
+    print(f'[INFO] Setup files generated for {len(status)} patients ({changed} changed).')
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate COMAK setup files for all patients.')
+    parser.add_argument('data_directory', type=str, nargs='?', default=cohort.DATA_DIRECTORY, help='Directory containing the patient folders.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes.')
+    parser.add_argument('--rebuild-templates', action='store_true', help='Rebuild and revalidate the tool templates.')
+    args = parser.parse_args()
+
+    try:
+        generate_cohort_setups(args.data_directory, max_workers=args.workers, rebuild_templates=args.rebuild_templates)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import hashlib
+
+import numpy as np
+
+import cohort
+import states_stream
+
+CACHE_DIRECTORY_NAME = 'outputs'
+INDEX_FILE = 'index.json'
+
+# Model.realize<Stage> methods in order; outputs depending on earlier stages are realized to Time
+REALIZE_STAGES = ['Time', 'Position', 'Velocity', 'Dynamics', 'Acceleration', 'Report']
+
+# Named groups of components for the CLI and reports
+COMPONENT_GROUPS = {
+    'MCL': ('Blankevoort1991Ligament', 'MCL'),
+    'LCL': ('Blankevoort1991Ligament', 'LCL'),
+    'ACL': ('Blankevoort1991Ligament', 'ACL'),
+    'PCL': ('Blankevoort1991Ligament', 'PCL'),
+    'ligaments': ('Blankevoort1991Ligament', ''),
+    'muscles': ('Muscle', ''),
+}
+
+
+def states_file(project_id, numeric_id, basename=None):
+    """
+    Returns the path of the COMAK states file of a patient.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    basename (str): Results basename. Defaults to 'walking_<numeric_id>'.
+
+    Returns:
+    str: Path of the _states.sto file.
+    """
+    basename = basename or f'walking_{numeric_id}'
+    return os.path.join(cohort.patient_results_directory(project_id, numeric_id, 'comak'), f'{basename}_states.sto')
+
+
+def file_signature(file_path):
+    """Returns a signature of a file that changes when the file is rewritten."""
+    info = os.stat(file_path)
+    return hashlib.sha1(f'{os.path.abspath(file_path)}|{info.st_size}|{info.st_mtime_ns}'.encode()).hexdigest()[:16]
+
+
+class StatesOutputs:
+    """
+    On-demand outputs of the model components, computed from the COMAK states instead of a full
+    JointMechanicsTool/ForceReporter dump. The model and the states are loaded on the first request;
+    every output is computed once (realizing the states only to the stage the output depends on)
+    and cached in memory and in results/<project>_<id>/outputs/. The disk cache is invalidated when
+    the model or the states file changes. The states can also be a chunked states table
+    (states_stream.py), which is iterated block by block instead of loaded at once.
+
+    Usage:
+        outputs = StatesOutputs.for_patient('STRATO', '001')
+        strain = outputs.get('/forceset/MCLs1', 'strain')
+        mcl = outputs.group('MCL', 'strain')
+    """
+
+    def __init__(self, model_file, states_file, cache_directory=None):
+        # A chunked states table changes with its manifest
+        states_signature_file = os.path.join(states_file, states_stream.MANIFEST_FILE) if os.path.isdir(states_file) else states_file
+        for file_path in (model_file, states_signature_file):
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(f'File not found: {file_path}')
+        self.model_file = model_file
+        self.states_file = states_file
+        self.cache_directory = cache_directory
+        self.signature = file_signature(model_file) + file_signature(states_signature_file)
+        self.values = {}
+        self._model = None
+        self._trajectory = None
+        self._time = None
+
+        self.index = {}
+        if cache_directory:
+            os.makedirs(cache_directory, exist_ok=True)
+            index_file = os.path.join(cache_directory, INDEX_FILE)
+            if os.path.isfile(index_file):
+                with open(index_file, 'r') as f:
+                    self.index = json.load(f)
+            if self.index.get('signature') != self.signature:
+                self.index = {'signature': self.signature, 'outputs': {}}
+
+    @classmethod
+    def for_patient(cls, project_id, numeric_id, basename=None):
+        """
+        Creates the outputs of a patient from the model in the data directory and the COMAK states.
+
+        Parameters:
+        project_id (str): Project identifier (e.g., 'STRATO').
+        numeric_id (str): Numeric identifier of the patient (e.g., '001').
+        basename (str): Results basename. Defaults to 'walking_<numeric_id>'.
+
+        Returns:
+        StatesOutputs: Outputs of the patient.
+        """
+        patient = next((p for p in cohort.find_patients() if p['project_id'] == project_id and p['numeric_id'] == numeric_id), None)
+        if patient is None:
+            raise KeyError(f'Patient {project_id}_{numeric_id} not found in {cohort.DATA_DIRECTORY}')
+        cache_directory = os.path.join(cohort.patient_results_directory(project_id, numeric_id), CACHE_DIRECTORY_NAME)
+        return cls(patient['model_file'], states_file(project_id, numeric_id, basename or patient['results_basename']), cache_directory)
+
+    def _load(self):
+        # The model and the states are only parsed when an output has to be computed
+        if self._model is None:
+            import opensim as osim
+
+            print(f'[INFO] Loading {self.model_file} and {self.states_file}')
+            self._model = osim.Model(self.model_file)
+            self._model.initSystem()
+            if os.path.isdir(self.states_file):
+                self._trajectory = states_stream.ChunkedStatesTable(self.states_file)
+                self._time = self._trajectory.time
+            else:
+                table = osim.TimeSeriesTable(self.states_file)
+                self._trajectory = osim.StatesTrajectory.createFromStatesTable(self._model, table, True, True)
+                self._time = np.array(table.getIndependentColumn())
+        return self._model, self._trajectory
+
+    @property
+    def time(self):
+        """Time of the states frames."""
+        if self._time is None:
+            cached = self._read_cache('time')
+            if cached is None:
+                self._load()
+                self._write_cache('time', self._time)
+            else:
+                self._time = cached
+        return self._time
+
+    def _cache_file(self, key):
+        return os.path.join(self.cache_directory, hashlib.sha1(key.encode()).hexdigest()[:16] + '.npy')
+
+    def _read_cache(self, key):
+        if self.cache_directory and key in self.index.get('outputs', {}):
+            file_path = self._cache_file(key)
+            if os.path.isfile(file_path):
+                return np.load(file_path)
+        return None
+
+    def _write_cache(self, key, values):
+        if not self.cache_directory:
+            return
+        np.save(self._cache_file(key), values)
+        self.index['outputs'][key] = os.path.basename(self._cache_file(key))
+        self._save_index()
+
+    def _save_index(self):
+        with open(os.path.join(self.cache_directory, INDEX_FILE), 'w') as f:
+            json.dump(self.index, f, indent=2)
+
+    def components(self, class_name, name_filter=''):
+        """
+        Lists the paths of the components of a class.
+
+        Parameters:
+        class_name (str): Component class (e.g., 'Blankevoort1991Ligament' or 'Muscle').
+        name_filter (str): Only components whose name contains this text (e.g., 'MCL').
+
+        Returns:
+        list: Component paths.
+        """
+        key = f'components:{class_name}:{name_filter}'
+        if key not in self.values:
+            if self.cache_directory and key in self.index.get('outputs', {}):
+                self.values[key] = self.index['outputs'][key]
+            else:
+                import opensim as osim
+
+                model, _ = self._load()
+                component_class = getattr(osim, class_name)
+                paths = [c.getAbsolutePathString() for c in model.getComponentsList()
+                         if name_filter in c.getName() and component_class.safeDownCast(c) is not None]
+                self.values[key] = paths
+                if self.cache_directory:
+                    self.index['outputs'][key] = paths
+                    self._save_index()
+        return self.values[key]
+
+    def get(self, component_path, output_name):
+        """
+        Returns one output of a component over all states frames.
+
+        Parameters:
+        component_path (str): Component path (e.g., '/forceset/MCLs1').
+        output_name (str): Output name (e.g., 'strain', 'force_total' or 'activation').
+
+        Returns:
+        np.ndarray: (frames,) for scalar outputs, (frames, 3) for Vec3 outputs.
+        """
+        return self.get_many([component_path], output_name)[0]
+
+    def get_many(self, component_paths, output_name):
+        """
+        Returns one output of several components, computing the uncached ones in a single
+        pass over the states.
+
+        Parameters:
+        component_paths (list): Component paths.
+        output_name (str): Output name.
+
+        Returns:
+        list: One array per component (see get).
+        """
+        keys = [f'{path}|{output_name}' for path in component_paths]
+        missing = []
+        for key in keys:
+            if key not in self.values:
+                cached = self._read_cache(key)
+                if cached is None:
+                    missing.append(key)
+                else:
+                    self.values[key] = cached
+
+        if missing:
+            import opensim as osim
+
+            model, trajectory = self._load()
+            outputs = [model.getComponent(key.split('|')[0]).getOutput(output_name) for key in missing]
+            stage = max((REALIZE_STAGES.index(output.getDependsOnStage().getName())
+                         if output.getDependsOnStage().getName() in REALIZE_STAGES else 0 for output in outputs))
+            realize = getattr(model, f'realize{REALIZE_STAGES[stage]}')
+            typed = []
+            for output in outputs:
+                typed_output = osim.OutputDouble.safeDownCast(output) or osim.OutputVec3.safeDownCast(output)
+                if typed_output is None:
+                    raise ValueError(f'Output {output.getName()} of type {output.getTypeName()} is not supported')
+                typed.append(typed_output)
+
+            if isinstance(trajectory, states_stream.ChunkedStatesTable):
+                states = trajectory.states(model)
+            else:
+                states = (trajectory.get(frame) for frame in range(trajectory.getSize()))
+            values = [[] for _ in missing]
+            for state in states:
+                realize(state)
+                for i, output in enumerate(typed):
+                    value = output.getValue(state)
+                    values[i].append(value if isinstance(value, float) else [value.get(0), value.get(1), value.get(2)])
+            for key, value in zip(missing, values):
+                self.values[key] = np.array(value)
+                self._write_cache(key, self.values[key])
+            print(f'[INFO] Computed {output_name} of {len(missing)} components over {len(self._time)} frames')
+        return [self.values[key] for key in keys]
+
+    def group(self, group, output_name):
+        """
+        Returns one output of a named group of components (see COMPONENT_GROUPS).
+
+        Parameters:
+        group (str): Group name (e.g., 'MCL').
+        output_name (str): Output name (e.g., 'strain').
+
+        Returns:
+        dict: Component name -> values.
+        """
+        if group not in COMPONENT_GROUPS:
+            raise KeyError(f'Unknown component group {group}. Available: {sorted(COMPONENT_GROUPS)}')
+        paths = self.components(*COMPONENT_GROUPS[group])
+        return {path.rsplit('/', 1)[-1]: values for path, values in zip(paths, self.get_many(paths, output_name))}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compute component outputs of a patient from the COMAK states.')
+    parser.add_argument('project_id', type=str, help='Project identifier (e.g., STRATO).')
+    parser.add_argument('numeric_id', type=str, help='Numeric identifier of the patient (e.g., 001).')
+    parser.add_argument('group', type=str, help=f'Component group ({", ".join(COMPONENT_GROUPS)}).')
+    parser.add_argument('output', type=str, help='Output name (e.g., strain).')
+    args = parser.parse_args()
+
+    try:
+        outputs = StatesOutputs.for_patient(args.project_id, args.numeric_id)
+        for name, values in outputs.group(args.group, args.output).items():
+            print(f'{name}\tmin {np.min(values):.6g}\tmax {np.max(values):.6g}')
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
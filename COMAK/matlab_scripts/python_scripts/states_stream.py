@@ -0,0 +1,283 @@
+import os
+import sys
+import json
+
+import numpy as np
+
+# Frames per block on disk; memory of a recorder or a window is bounded by one block
+STATES_CHUNK_SIZE = 1000
+MANIFEST_FILE = 'manifest.json'
+
+
+def chunk_name(index):
+    return f'chunk_{index:05d}.npy'
+
+
+class ChunkedStatesWriter:
+    """
+    Writes a states table to a directory in fixed-size blocks: chunk_<n>.npy files holding the
+    time and the state variable values of chunk_size frames, and manifest.json with the labels
+    and the time range of every block. Only the current block is kept in memory.
+    """
+
+    def __init__(self, directory, labels, chunk_size=STATES_CHUNK_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.labels = list(labels)
+        self.chunk_size = int(chunk_size)
+        self.block = np.empty((self.chunk_size, len(self.labels) + 1))
+        self.rows = 0
+        self.chunks = []
+
+    def append(self, time, values):
+        """
+        Appends one frame.
+
+        Parameters:
+        time (float): Time of the frame.
+        values (np.ndarray): State variable values in the order of the labels.
+
+        Returns:
+        None
+        """
+        self.block[self.rows, 0] = time
+        self.block[self.rows, 1:] = values
+        self.rows += 1
+        if self.rows == self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        name = chunk_name(len(self.chunks))
+        np.save(os.path.join(self.directory, name), self.block[:self.rows])
+        self.chunks.append({'file': name, 'rows': self.rows,
+                            'start_time': float(self.block[0, 0]), 'stop_time': float(self.block[self.rows - 1, 0])})
+        self.rows = 0
+
+    def close(self):
+        """Writes the last block and the manifest."""
+        self._flush()
+        with open(os.path.join(self.directory, MANIFEST_FILE), 'w') as f:
+            json.dump({'labels': self.labels, 'chunk_size': self.chunk_size, 'chunks': self.chunks}, f, indent=2)
+
+
+class StatesRecorder(ChunkedStatesWriter):
+    """
+    Streams the states of a simulation to a chunked table instead of keeping a StatesTrajectory
+    (or the Manager states storage) in memory.
+
+    Usage:
+        recorder = StatesRecorder(model, 'results/STRATO_001/forsim/states')
+        manager = osim.Manager(model)
+        manager.setWriteToStorage(False)
+        manager.initialize(state)
+        for t in times:
+            recorder.record(manager.integrate(t))
+        recorder.close()
+    """
+
+    def __init__(self, model, directory, chunk_size=STATES_CHUNK_SIZE):
+        names = model.getStateVariableNames()
+        super().__init__(directory, [names.get(i) for i in range(names.getSize())], chunk_size)
+        self.model = model
+
+    def record(self, state):
+        """Appends the time and the state variable values of a state."""
+        self.append(state.getTime(), self.model.getStateVariableValues(state).to_numpy())
+
+
+def simulate(model, state, final_time, step, directory, chunk_size=STATES_CHUNK_SIZE):
+    """
+    Integrates a model and streams the states at a fixed reporting interval to a chunked table.
+    The Manager does not store the states, so the memory does not grow with the simulation length.
+
+    Parameters:
+    model (opensim.Model): Initialized model.
+    state (opensim.State): Initial state.
+    final_time (float): End time of the simulation.
+    step (float): Reporting interval.
+    directory (str): Output directory of the table.
+    chunk_size (int): Frames per block.
+
+    Returns:
+    ChunkedStatesTable: The recorded states.
+    """
+    import opensim as osim
+
+    recorder = StatesRecorder(model, directory, chunk_size)
+    manager = osim.Manager(model)
+    manager.setWriteToStorage(False)
+    manager.initialize(state)
+    recorder.record(state)
+    num_steps = int(np.floor((final_time - state.getTime()) / step + 1e-9))
+    start_time = state.getTime()
+    for i in range(1, num_steps + 1):
+        recorder.record(manager.integrate(start_time + i * step))
+    recorder.close()
+    return ChunkedStatesTable(directory)
+
+
+def convert_sto(states_file, directory, chunk_size=STATES_CHUNK_SIZE):
+    """
+    Converts an OpenSim states file (e.g., a long COMAK or ForsimTool _states.sto) into a chunked
+    table, reading chunk_size lines at a time.
+
+    Parameters:
+    states_file (str): States file.
+    directory (str): Output directory of the table.
+    chunk_size (int): Frames per block.
+
+    Returns:
+    ChunkedStatesTable: The converted states.
+    """
+    if not os.path.isfile(states_file):
+        raise FileNotFoundError(f'States file not found: {states_file}')
+    with open(states_file, 'r') as f:
+        for line in f:
+            if line.strip().lower() == 'endheader':
+                break
+        else:
+            raise ValueError(f'No endheader found in {states_file}')
+        labels = [label.strip() for label in next(f).split('\t')][1:]
+        writer = ChunkedStatesWriter(directory, labels, chunk_size)
+        while True:
+            lines = [line for _, line in zip(range(writer.chunk_size), f) if line.strip()]
+            if not lines:
+                break
+            for row in np.loadtxt(lines, ndmin=2):
+                writer.append(row[0], row[1:])
+    writer.close()
+    return ChunkedStatesTable(directory)
+
+
+class ChunkedStatesTable:
+    """
+    Read access to a chunked states table. Blocks are memory-mapped and only read when a window
+    needs them; states are rehydrated lazily, one frame at a time.
+
+    Usage:
+        table = ChunkedStatesTable('results/STRATO_001/forsim/states')
+        for state in table.states(model, start_time=0.5):
+            model.realizeReport(state)
+    """
+
+    def __init__(self, directory):
+        manifest_file = os.path.join(directory, MANIFEST_FILE)
+        if not os.path.isfile(manifest_file):
+            raise FileNotFoundError(f'Chunked states table not found: {manifest_file}')
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        self.directory = directory
+        self.manifest_file = manifest_file
+        self.labels = manifest['labels']
+        self.chunks = manifest['chunks']
+
+    def __len__(self):
+        return sum(chunk['rows'] for chunk in self.chunks)
+
+    def _block(self, chunk):
+        return np.load(os.path.join(self.directory, chunk['file']), mmap_mode='r')
+
+    @property
+    def time(self):
+        """Time of all frames (only the time column of every block is read)."""
+        return np.concatenate([np.array(self._block(chunk)[:, 0]) for chunk in self.chunks]) if self.chunks else np.empty(0)
+
+    def windows(self, start_time=None, stop_time=None, columns=None):
+        """
+        Iterates over the frames of a time window block by block.
+
+        Parameters:
+        start_time (float): First time of the window. Optional.
+        stop_time (float): Last time of the window. Optional.
+        columns (list): Labels of the columns to read. Defaults to all.
+
+        Yields:
+        tuple: (time (rows,), values (rows x columns)) of one block.
+        """
+        indices = None if columns is None else [self.labels.index(label) + 1 for label in columns]
+        for chunk in self.chunks:
+            if (start_time is not None and chunk['stop_time'] < start_time - 1e-9) or \
+                    (stop_time is not None and chunk['start_time'] > stop_time + 1e-9):
+                continue
+            block = self._block(chunk)
+            time = np.array(block[:, 0])
+            keep = np.ones(len(time), dtype=bool)
+            if start_time is not None:
+                keep &= time >= start_time - 1e-9
+            if stop_time is not None:
+                keep &= time <= stop_time + 1e-9
+            values = block[keep, 1:] if indices is None else block[keep][:, indices]
+            yield time[keep], np.array(values)
+
+    def states(self, model, start_time=None, stop_time=None):
+        """
+        Rehydrates the states of a time window as StatesTrajectory.createFromStatesTable(model,
+        table, True, True) does: state variables of the model missing from the table keep their
+        default values, columns the model does not have are ignored, and the values are not
+        assembled. One State object is reused for all frames, so it must not be kept between iterations.
+
+        Parameters:
+        model (opensim.Model): Initialized model.
+        start_time (float): First time of the window. Optional.
+        stop_time (float): Last time of the window. Optional.
+
+        Yields:
+        opensim.State: State of each frame.
+        """
+        import opensim as osim
+
+        names = model.getStateVariableNames()
+        model_labels = [names.get(i) for i in range(names.getSize())]
+        present = [i for i, label in enumerate(model_labels) if label in self.labels]
+        order = [self.labels.index(model_labels[i]) for i in present]
+        state = model.initSystem()
+        values = model.getStateVariableValues(state).to_numpy().copy()
+        for time, block in self.windows(start_time, stop_time):
+            for t, row in zip(time, block[:, order]):
+                values[present] = row
+                state.setTime(float(t))
+                model.setStateVariableValues(state, osim.Vector.createFromMat(values))
+                yield state
+
+    def write_sto(self, states_file, name='states', start_time=None, stop_time=None):
+        """
+        Writes a time window to an OpenSim states file block by block (e.g., as the
+        input_states_file of the JointMechanicsTool).
+
+        Parameters:
+        states_file (str): Output file.
+        name (str): Name in the file header.
+        start_time (float): First time of the window. Optional.
+        stop_time (float): Last time of the window. Optional.
+
+        Returns:
+        str: Path of the file.
+        """
+        time = self.time
+        rows = int(np.sum((time >= (start_time if start_time is not None else -np.inf) - 1e-9) &
+                          (time <= (stop_time if stop_time is not None else np.inf) + 1e-9)))
+        with open(states_file, 'w') as f:
+            f.write(f"{name}\nversion=1\nnRows={rows}\nnColumns={len(self.labels) + 1}\ninDegrees=no\nendheader\n")
+            f.write('\t'.join(['time'] + self.labels) + '\n')
+            for block_time, values in self.windows(start_time, stop_time):
+                np.savetxt(f, np.column_stack([block_time, values]), delimiter='\t', fmt='%.10g')
+        return states_file
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert an OpenSim states file into a chunked states table.')
+    parser.add_argument('states_file', type=str, help='States file (.sto).')
+    parser.add_argument('directory', type=str, help='Output directory of the table.')
+    parser.add_argument('--chunk-size', type=int, default=STATES_CHUNK_SIZE, help='Frames per block (default: 1000).')
+    args = parser.parse_args()
+
+    try:
+        table = convert_sto(args.states_file, args.directory, args.chunk_size)
+        print(f'[INFO] {len(table)} frames in {len(table.chunks)} blocks written to {args.directory}')
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def read_sto(file_path):
+    """
+    Reads an OpenSim .sto/.mot file into NumPy.
+
+    Parameters:
+    file_path (str): Path to the file.
+
+    Returns:
+    dict: 'time', 'labels' (without time), 'data' (frames x labels) and 'in_degrees'.
+    """
+    with open(file_path, 'r') as f:
+        lines = f.read().splitlines()
+    end_header = next(i for i, line in enumerate(lines) if line.strip().lower() == 'endheader')
+    in_degrees = any(line.strip().lower() == 'indegrees=yes' for line in lines[:end_header])
+    labels = lines[end_header + 1].split('\t')
+    values = np.loadtxt(lines[end_header + 2:], ndmin=2)
+    return {'time': values[:, 0], 'labels': [label.strip() for label in labels[1:]], 'data': values[:, 1:], 'in_degrees': in_degrees}
+
+
+def write_sto(file_path, table, name='table'):
+    """
+    Writes a table as returned by read_sto to an OpenSim .sto file.
+
+    Parameters:
+    file_path (str): Output file.
+    table (dict): 'time', 'labels', 'data' and 'in_degrees'.
+    name (str): Name in the file header.
+
+    Returns:
+    None
+    """
+    rows, columns = table['data'].shape
+    with open(file_path, 'w') as f:
+        f.write(f"{name}\nversion=1\nnRows={rows}\nnColumns={columns + 1}\n"
+                f"inDegrees={'yes' if table['in_degrees'] else 'no'}\nendheader\n")
+        f.write('\t'.join(['time'] + table['labels']) + '\n')
+        np.savetxt(f, np.column_stack([table['time'], table['data']]), delimiter='\t', fmt='%.10g')
@@ -0,0 +1,288 @@
+import os
+import sys
+import json
+
+import numpy as np
+
+import cohort
+from cohort_index import CohortIndex, patient_name
+from sto_io import read_sto
+from plot_renderer import MUSCLES, find_column
+
+SUMMARY_FILE = 'summary_metrics.tsv'
+COHORT_SUMMARY_FILE = os.path.join(cohort.RESULTS_DIRECTORY, SUMMARY_FILE)
+CYCLE_POINTS = 101
+GRAVITY = 9.81
+
+# Gait phases in percent of the cycle (heel strike to heel strike)
+CYCLE = (0, 100)
+LOADING_RESPONSE = (0, 12)
+FIRST_PEAK = (0, 30)
+SECOND_PEAK = (30, 62)
+
+REDUCTIONS = ('max', 'min', 'mean', 'argmax')
+
+# Metric -> source ('joint_mechanics': channel of joint_mechanics_h5.CHANNELS, 'activation': column of the
+# COMAK _activation.sto), reduction over the phase (argmax gives the percent of the cycle of the peak),
+# unit, and per_body_weight to divide by the body weight in N. Vector channels are reduced by their norm.
+METRIC_CATALOG = {
+    'peak_contact_force': {'source': 'joint_mechanics', 'channel': 'contact_force', 'reduce': 'max', 'phase': CYCLE, 'unit': 'BW', 'per_body_weight': True},
+    'peak_medial_contact_force': {'source': 'joint_mechanics', 'channel': 'contact_force_medial', 'reduce': 'max', 'phase': CYCLE, 'unit': 'BW', 'per_body_weight': True},
+    'peak_lateral_contact_force': {'source': 'joint_mechanics', 'channel': 'contact_force_lateral', 'reduce': 'max', 'phase': CYCLE, 'unit': 'BW', 'per_body_weight': True},
+    'first_peak_contact_force': {'source': 'joint_mechanics', 'channel': 'contact_force', 'reduce': 'max', 'phase': FIRST_PEAK, 'unit': 'BW', 'per_body_weight': True},
+    'second_peak_contact_force': {'source': 'joint_mechanics', 'channel': 'contact_force', 'reduce': 'max', 'phase': SECOND_PEAK, 'unit': 'BW', 'per_body_weight': True},
+    'peak_medial_pressure': {'source': 'joint_mechanics', 'channel': 'max_pressure_medial', 'reduce': 'max', 'phase': CYCLE, 'unit': 'MPa'},
+    'peak_lateral_pressure': {'source': 'joint_mechanics', 'channel': 'max_pressure_lateral', 'reduce': 'max', 'phase': CYCLE, 'unit': 'MPa'},
+    'first_peak_pressure': {'source': 'joint_mechanics', 'channel': 'max_pressure', 'reduce': 'max', 'phase': FIRST_PEAK, 'unit': 'MPa'},
+    'second_peak_pressure': {'source': 'joint_mechanics', 'channel': 'max_pressure', 'reduce': 'max', 'phase': SECOND_PEAK, 'unit': 'MPa'},
+    'first_peak_pressure_timing': {'source': 'joint_mechanics', 'channel': 'max_pressure', 'reduce': 'argmax', 'phase': FIRST_PEAK, 'unit': '%'},
+    'second_peak_pressure_timing': {'source': 'joint_mechanics', 'channel': 'max_pressure', 'reduce': 'argmax', 'phase': SECOND_PEAK, 'unit': '%'},
+    'loading_contact_area': {'source': 'joint_mechanics', 'channel': 'contact_area', 'reduce': 'mean', 'phase': LOADING_RESPONSE, 'unit': 'mm^2'},
+    'loading_contact_area_medial': {'source': 'joint_mechanics', 'channel': 'contact_area_medial', 'reduce': 'mean', 'phase': LOADING_RESPONSE, 'unit': 'mm^2'},
+    'loading_contact_area_lateral': {'source': 'joint_mechanics', 'channel': 'contact_area_lateral', 'reduce': 'mean', 'phase': LOADING_RESPONSE, 'unit': 'mm^2'},
+}
+METRIC_CATALOG.update({
+    f'peak_activation_{muscle}': {'source': 'activation', 'channel': muscle, 'reduce': 'max', 'phase': CYCLE, 'unit': '-'}
+    for muscle in MUSCLES
+})
+
+
+def load_catalog(catalog_file):
+    """
+    Reads a metric catalog from a JSON file with the structure of METRIC_CATALOG.
+
+    Parameters:
+    catalog_file (str): JSON file.
+
+    Returns:
+    dict: Metric catalog.
+    """
+    if not os.path.isfile(catalog_file):
+        raise FileNotFoundError(f'Metric catalog not found: {catalog_file}')
+    with open(catalog_file, 'r') as f:
+        catalog = json.load(f)
+    for name, metric in catalog.items():
+        if metric.get('reduce') not in REDUCTIONS:
+            raise ValueError(f"Unknown reduction of {name}: {metric.get('reduce')}. Available: {REDUCTIONS}")
+        if metric.get('source') not in ('joint_mechanics', 'activation'):
+            raise ValueError(f"Unknown source of {name}: {metric.get('source')}")
+        metric['phase'] = tuple(metric.get('phase', CYCLE))
+    return catalog
+
+
+def cycle_matrix(time, values):
+    """
+    Resamples the columns of a (frames x columns) array to CYCLE_POINTS points of the cycle with one
+    interpolation for all columns.
+
+    Returns:
+    np.ndarray: (columns x CYCLE_POINTS) curves.
+    """
+    cycle = (time - time[0]) / (time[-1] - time[0])
+    points = np.linspace(0, 1, CYCLE_POINTS)
+    index = np.clip(np.searchsorted(cycle, points, side='right') - 1, 0, len(cycle) - 2)
+    weight = ((points - cycle[index]) / (cycle[index + 1] - cycle[index]))[:, None]
+    return (values[index] * (1 - weight) + values[index + 1] * weight).T
+
+
+def read_sources(project_id, numeric_id, catalog, files=None):
+    """
+    Reads the time series the catalog needs, each file once and only the required channels.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    catalog (dict): Metric catalog.
+    files (dict): Output kind -> file from the cohort index. Defaults to the standard file names.
+
+    Returns:
+    dict: Source -> (time, {channel: (frames,) values}). Sources without results are missing.
+    """
+    files = files or {}
+    channels = {}
+    for metric in catalog.values():
+        channels.setdefault(metric['source'], set()).add(metric['channel'])
+
+    sources = {}
+    if 'joint_mechanics' in channels:
+        try:
+            from joint_mechanics_h5 import JointMechanicsH5, results_file
+
+            with JointMechanicsH5(files.get('joint_mechanics_h5', results_file(project_id, numeric_id))) as jm:
+                data = {}
+                for channel in sorted(channels['joint_mechanics']):
+                    values = np.asarray(jm.channel(channel), dtype=float)
+                    data[channel] = np.linalg.norm(values, axis=1) if values.ndim == 2 else values.ravel()
+                sources['joint_mechanics'] = (jm.time(), data)
+        except (ImportError, FileNotFoundError, KeyError) as e:
+            print(f'[INFO] No joint mechanics metrics for {project_id}_{numeric_id}: {e}')
+
+    if 'activation' in channels:
+        activation_file = files.get('activation', os.path.join(
+            cohort.patient_results_directory(project_id, numeric_id, 'comak'), f'walking_{numeric_id}_activation.sto'))
+        if os.path.isfile(activation_file):
+            table = read_sto(activation_file)
+            data = {}
+            for channel in channels['activation']:
+                column = find_column(table['labels'], channel)
+                if column is not None:
+                    data[channel] = table['data'][:, column]
+            sources['activation'] = (table['time'], data)
+        else:
+            print(f'[INFO] No activation metrics for {project_id}_{numeric_id}: {activation_file} not found')
+    return sources
+
+
+def compute_metrics(catalog, sources, body_weight):
+    """
+    Computes the metrics of a catalog: every source is resampled to the cycle in one operation,
+    then all metrics are reduced over their phase masks at once.
+
+    Parameters:
+    catalog (dict): Metric catalog.
+    sources (dict): Time series as returned by read_sources.
+    body_weight (float): Body weight in kg.
+
+    Returns:
+    dict: Metric -> value (metrics whose channel is missing are left out).
+    """
+    names, curves = [], []
+    for source, (time, data) in sources.items():
+        source_names = [n for n, m in catalog.items() if m['source'] == source and m['channel'] in data]
+        if not source_names:
+            continue
+        channels = sorted({catalog[n]['channel'] for n in source_names})
+        matrix = cycle_matrix(time, np.column_stack([data[c] for c in channels]))
+        names += source_names
+        curves.append(matrix[[channels.index(catalog[n]['channel']) for n in source_names]])
+    if not names:
+        return {}
+    curves = np.vstack(curves)
+
+    points = np.linspace(0, 100, CYCLE_POINTS)
+    phases = np.array([catalog[n]['phase'] for n in names], dtype=float)
+    mask = (points >= phases[:, :1]) & (points <= phases[:, 1:])
+    scale = np.array([1.0 / (body_weight * GRAVITY) if catalog[n].get('per_body_weight') else 1.0 for n in names])
+    curves = curves * scale[:, None]
+
+    reductions = {
+        'max': np.max(np.where(mask, curves, -np.inf), axis=1),
+        'min': np.min(np.where(mask, curves, np.inf), axis=1),
+        'mean': np.sum(np.where(mask, curves, 0.0), axis=1) / np.maximum(mask.sum(axis=1), 1),
+        'argmax': points[np.argmax(np.where(mask, curves, -np.inf), axis=1)],
+    }
+    return {name: float(reductions[catalog[name]['reduce']][i]) for i, name in enumerate(names)}
+
+
+def write_summary(file_path, metrics, catalog):
+    """
+    Writes the metrics of a patient as a compact table (metric, value, unit).
+
+    Parameters:
+    file_path (str): Output file.
+    metrics (dict): Metric -> value.
+    catalog (dict): Metric catalog (for the units).
+
+    Returns:
+    str: Path of the file.
+    """
+    with open(file_path, 'w') as f:
+        f.write('metric\tvalue\tunit\n')
+        for name, value in metrics.items():
+            f.write(f"{name}\t{value:.6g}\t{catalog[name].get('unit', '')}\n")
+    return file_path
+
+
+def summarize_patient(project_id, numeric_id, catalog=METRIC_CATALOG, index=None):
+    """
+    Runs the summary stage of a patient after the JointMechanicsTool: computes the catalog and
+    writes results/<project>_<id>/summary_metrics.tsv and the metrics of the cohort index.
+
+    Parameters:
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    catalog (dict): Metric catalog. Defaults to METRIC_CATALOG.
+    index (CohortIndex): Open cohort index. Defaults to the cohort index of the results directory.
+
+    Returns:
+    dict: Metric -> value.
+    """
+    own_index = index is None
+    index = CohortIndex() if own_index else index
+    try:
+        patient = next((p for p in index.patients(project_id) if p['numeric_id'] == numeric_id), None)
+        if patient is None:
+            index.record_stage(project_id, numeric_id, 'joint_mechanics')
+            patient = next(p for p in index.patients(project_id) if p['numeric_id'] == numeric_id)
+        files = {}
+        for kind in ('joint_mechanics_h5', 'activation'):
+            output = index.output(project_id, numeric_id, kind)
+            if output:
+                files[kind] = output['path']
+
+        metrics = compute_metrics(catalog, read_sources(project_id, numeric_id, catalog, files), patient['body_weight'])
+        if not metrics:
+            raise FileNotFoundError(f'No results to summarize for {patient_name(project_id, numeric_id)}')
+        file_path = write_summary(os.path.join(cohort.patient_results_directory(project_id, numeric_id), SUMMARY_FILE), metrics, catalog)
+        index.record_metrics(project_id, numeric_id, metrics)
+        print(f'[INFO] {len(metrics)} summary metrics of {project_id}_{numeric_id} saved to {file_path}')
+        return metrics
+    finally:
+        if own_index:
+            index.close()
+
+
+def write_cohort_summary(file_path=COHORT_SUMMARY_FILE, index=None):
+    """
+    Writes the metrics of all indexed patients as one table (one row per patient).
+
+    Parameters:
+    file_path (str): Output file.
+    index (CohortIndex): Open cohort index. Defaults to the cohort index of the results directory.
+
+    Returns:
+    str: Path of the file.
+    """
+    own_index = index is None
+    index = CohortIndex() if own_index else index
+    try:
+        patients = [p for p in index.patients() if p['metrics']]
+    finally:
+        if own_index:
+            index.close()
+    metrics = sorted({metric for p in patients for metric in p['metrics']})
+    with open(file_path, 'w') as f:
+        f.write('\t'.join(['patient', 'project_id', 'numeric_id', 'body_weight'] + metrics) + '\n')
+        for p in patients:
+            values = [f"{p['metrics'][m]:.6g}" if m in p['metrics'] else 'NaN' for m in metrics]
+            f.write('\t'.join([p['name'], p['project_id'], p['numeric_id'], f"{p['body_weight']:.6g}"] + values) + '\n')
+    print(f'[INFO] Summary metrics of {len(patients)} patients saved to {file_path}')
+    return file_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compute the summary metrics of the patients after the joint mechanics stage.')
+    parser.add_argument('--patients', type=str, nargs='*', default=None, help='Patients as <project>_<id> (default: all).')
+    parser.add_argument('--catalog', type=str, default=None, help='JSON metric catalog (default: METRIC_CATALOG).')
+    args = parser.parse_args()
+
+    try:
+        catalog = load_catalog(args.catalog) if args.catalog else METRIC_CATALOG
+        with CohortIndex() as index:
+            patients = index.patients()
+            if not patients:
+                index.refresh()
+                patients = index.patients()
+            for patient in patients:
+                if args.patients and patient['name'] not in args.patients:
+                    continue
+                try:
+                    summarize_patient(patient['project_id'], patient['numeric_id'], catalog, index)
+                except FileNotFoundError as e:
+                    print(f'[ERROR] {e}')
+            write_cohort_summary(index=index)
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        print(f'[ERROR] {e}')
+        sys.exit(1)
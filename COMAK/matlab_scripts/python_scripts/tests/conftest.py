@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts are imported as top-level modules, as when they are run from python_scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
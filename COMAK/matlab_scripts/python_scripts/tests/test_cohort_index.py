@@ -0,0 +1,82 @@
+"""Tests of the queries of the SQLite cohort index of cohort_index.py (no OpenSim needed)."""
+
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import cohort
+import cohort_index
+from sto_io import write_sto
+
+
+def patient(project_id, numeric_id, body_weight):
+    return {'project_id': project_id, 'numeric_id': numeric_id, 'body_weight': body_weight, 'time_start': 0.5,
+            'time_stop': 1.6, 'model_file': f'model_{project_id}_{numeric_id}.osim', 'results_basename': f'walking_{numeric_id}'}
+
+
+class TestCohortIndex(unittest.TestCase):
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        results_directory = os.path.join(self.temporary.name, 'results')
+        patcher = mock.patch.object(cohort, 'RESULTS_DIRECTORY', results_directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.json_file = os.path.join(results_directory, 'cohort_index.json')
+        self.index = cohort_index.CohortIndex(os.path.join(results_directory, 'cohort_index.sqlite'), self.json_file)
+        self.addCleanup(self.index.close)
+
+        self.index.add_patient(patient('STRATO', '001', 70.0), commit=False)
+        self.index.add_patient(patient('STRATO', '002', 82.5), commit=False)
+        self.index.add_patient(patient('HOLOA', '001', 64.0), commit=False)
+        self.index.record_metrics('STRATO', '001', {'peak_medial_pressure': 6.5}, commit=False)
+        self.index.record_metrics('STRATO', '002', {'peak_medial_pressure': 4.0}, commit=False)
+        self.index.record_metrics('HOLOA', '001', {'peak_medial_pressure': 7.5}, commit=False)
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def names(self, *args, **kwargs):
+        return [p['name'] for p in self.index.patients(*args, **kwargs)]
+
+    def test_project_and_metric_conditions(self):
+        self.assertEqual(self.names(), ['HOLOA_001', 'STRATO_001', 'STRATO_002'])
+        self.assertEqual(self.names('STRATO'), ['STRATO_001', 'STRATO_002'])
+        self.assertEqual(self.names(conditions=[('peak_medial_pressure', '>', 5)]), ['HOLOA_001', 'STRATO_001'])
+        self.assertEqual(self.names('STRATO', conditions=[cohort_index.parse_condition('peak_medial_pressure<=6.5')]),
+                         ['STRATO_001', 'STRATO_002'])
+        with self.assertRaises(ValueError):
+            self.index.patients(conditions=[('peak_medial_pressure', 'LIKE', 5)])
+
+    def test_record_stage_registers_outputs(self):
+        comak_directory = cohort.patient_results_directory('STRATO', '001', 'comak')
+        os.makedirs(comak_directory)
+        write_sto(os.path.join(comak_directory, 'walking_001_activation.sto'),
+                  {'time': np.array([0.5, 0.6]), 'labels': ['vasmed_r', 'soleus_r'], 'data': np.zeros((2, 2)), 'in_degrees': False})
+
+        registered = self.index.record_stage('STRATO', '001', 'comak')
+        self.assertEqual(list(registered), ['activation'])
+        self.index.record_stage('STRATO', '002', 'comak', status='failed', message='COMAK did not converge')
+        self.assertEqual(self.names(stage='comak'), ['STRATO_001'])
+        self.assertEqual(self.index.patients('STRATO')[1]['stages'], {'comak': 'failed'})
+
+        output = self.index.output('STRATO', '001', 'activation')
+        self.assertEqual(output['stage'], 'comak')
+        self.assertEqual(output['labels'], ['time', 'vasmed_r', 'soleus_r'])
+        self.assertIsNone(self.index.output('STRATO', '001', 'states'))
+
+    def test_json_export(self):
+        self.index.record_stage('HOLOA', '001', 'joint_mechanics')
+        with open(self.json_file, 'r') as f:
+            exported = json.load(f)
+        entries = {entry['name']: entry for entry in exported['patients']}
+        self.assertEqual(sorted(entries), ['HOLOA_001', 'STRATO_001', 'STRATO_002'])
+        self.assertEqual(entries['HOLOA_001']['stages'], {'joint_mechanics': 'complete'})
+        self.assertEqual(entries['STRATO_002']['metrics'], {'peak_medial_pressure': 4.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
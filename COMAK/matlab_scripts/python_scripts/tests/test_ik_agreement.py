@@ -0,0 +1,56 @@
+"""Tests of the agreement statistics of ik_agreement.py (no OpenSim needed)."""
+
+import unittest
+
+import numpy as np
+
+import ik_agreement
+
+
+class TestAgreementMetrics(unittest.TestCase):
+    def test_identical_curves(self):
+        curve = np.sin(np.linspace(0, 2 * np.pi, ik_agreement.CYCLE_POINTS))
+        metrics = ik_agreement.agreement_metrics(curve, curve)
+        for name in ('mae', 'max_error', 'rmse', 'bias', 'sd_difference'):
+            self.assertAlmostEqual(float(metrics[name]), 0.0)
+        self.assertAlmostEqual(float(metrics['pearson_r']), 1.0)
+
+    def test_constant_offset(self):
+        reference = np.sin(np.linspace(0, 2 * np.pi, ik_agreement.CYCLE_POINTS))
+        metrics = ik_agreement.agreement_metrics(reference + 2.0, reference)
+        self.assertAlmostEqual(float(metrics['mae']), 2.0)
+        self.assertAlmostEqual(float(metrics['max_error']), 2.0)
+        self.assertAlmostEqual(float(metrics['rmse']), 2.0)
+        self.assertAlmostEqual(float(metrics['bias']), 2.0)
+        self.assertAlmostEqual(float(metrics['loa_lower']), 2.0)
+        self.assertAlmostEqual(float(metrics['loa_upper']), 2.0)
+        self.assertAlmostEqual(float(metrics['r_squared']), 1.0)
+
+    def test_batched_along_last_axis(self):
+        rng = np.random.default_rng(0)
+        simulation = rng.normal(size=(4, 3, ik_agreement.CYCLE_POINTS))
+        reference = rng.normal(size=(4, 3, ik_agreement.CYCLE_POINTS))
+        metrics = ik_agreement.agreement_metrics(simulation, reference)
+        self.assertEqual(metrics['rmse'].shape, (4, 3))
+        single = ik_agreement.agreement_metrics(simulation[2, 1], reference[2, 1])
+        for name, values in metrics.items():
+            self.assertAlmostEqual(float(values[2, 1]), float(single[name]))
+        self.assertAlmostEqual(float(single['pearson_r']), np.corrcoef(simulation[2, 1], reference[2, 1])[0, 1])
+        difference = simulation[2, 1] - reference[2, 1]
+        self.assertAlmostEqual(float(single['loa_upper']), difference.mean() + 1.96 * difference.std(ddof=1))
+
+
+class TestTCritical(unittest.TestCase):
+    def test_tabulated_values(self):
+        # Two-sided 95% quantiles of the t distribution
+        for dof, value in ((10, 2.228139), (30, 2.042272), (100, 1.983972), (1000, 1.962339)):
+            self.assertAlmostEqual(float(ik_agreement.t_critical_95(dof)), value, delta=2e-4)
+
+    def test_vectorized(self):
+        values = ik_agreement.t_critical_95(np.array([10, 100]))
+        self.assertEqual(values.shape, (2,))
+        self.assertGreater(values[0], values[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
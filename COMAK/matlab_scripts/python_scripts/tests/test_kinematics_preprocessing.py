@@ -0,0 +1,75 @@
+"""Tests of the filter and resampling of kinematics_preprocessing.py (no OpenSim needed)."""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import kinematics_preprocessing
+from sto_io import read_sto, write_sto
+
+
+class TestResample(unittest.TestCase):
+    def test_uniform_grid_of_linear_data(self):
+        time = np.array([0.0, 0.1, 0.25, 0.3, 0.5])
+        data = np.column_stack([2 * time, 1 - time])
+        grid, values = kinematics_preprocessing.resample(time, data, step=0.05)
+        np.testing.assert_allclose(grid, np.arange(11) * 0.05)
+        np.testing.assert_allclose(values, np.column_stack([2 * grid, 1 - grid]))
+
+    def test_default_step_is_the_median_interval(self):
+        time = np.array([0.0, 0.01, 0.02, 0.04, 0.05])
+        grid, values = kinematics_preprocessing.resample(time, time[:, None])
+        np.testing.assert_allclose(grid, np.arange(6) * 0.01)
+        np.testing.assert_allclose(values[:, 0], grid)
+
+    def test_too_few_frames(self):
+        with self.assertRaises(ValueError):
+            kinematics_preprocessing.resample(np.array([0.0]), np.zeros((1, 1)))
+
+
+class TestLowpassFilter(unittest.TestCase):
+    sample_rate = 100.0
+
+    def signal(self, frequency):
+        time = np.arange(200) / self.sample_rate
+        return np.sin(2 * np.pi * frequency * time)[:, None]
+
+    def test_keeps_low_frequencies(self):
+        data = self.signal(1.0)
+        filtered = kinematics_preprocessing.lowpass_filter(data, self.sample_rate, cutoff=6.0)
+        np.testing.assert_allclose(filtered[20:-20], data[20:-20], atol=1e-2)
+
+    def test_removes_high_frequencies(self):
+        filtered = kinematics_preprocessing.lowpass_filter(self.signal(30.0), self.sample_rate, cutoff=6.0)
+        self.assertLess(np.abs(filtered[20:-20]).max(), 0.05)
+
+    def test_linear_trend_is_kept(self):
+        # The odd reflection padding keeps ramps free of edge transients, as filtfilt
+        data = np.linspace(0, 1, 150)[:, None]
+        filtered = kinematics_preprocessing.lowpass_filter(data, self.sample_rate, cutoff=6.0)
+        np.testing.assert_allclose(filtered, data, atol=1e-3)
+
+    def test_cutoff_above_nyquist(self):
+        with self.assertRaises(ValueError):
+            kinematics_preprocessing.lowpass_filter(self.signal(1.0), self.sample_rate, cutoff=60.0)
+
+
+class TestPreprocessKinematics(unittest.TestCase):
+    def test_writes_processed_table(self):
+        with tempfile.TemporaryDirectory() as directory:
+            motion_file = os.path.join(directory, 'walking_001_ik.mot')
+            time = np.linspace(0, 1, 101)
+            write_sto(motion_file, {'time': time, 'labels': ['knee_flex_r'], 'data': 30 * np.sin(np.pi * time)[:, None],
+                                    'in_degrees': True})
+            output_file = kinematics_preprocessing.preprocess_kinematics(motion_file)
+            self.assertEqual(output_file, os.path.join(directory, 'walking_001_ik_processed.mot'))
+            table = read_sto(output_file)
+            self.assertEqual(table['labels'], ['knee_flex_r'])
+            self.assertTrue(table['in_degrees'])
+            np.testing.assert_allclose(table['data'][:, 0], 30 * np.sin(np.pi * table['time']), atol=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Round-trip tests of the chunked states tables of states_stream.py (no OpenSim needed)."""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import states_stream
+from sto_io import read_sto, write_sto
+
+LABELS = ['/jointset/knee_r/knee_flex_r/value', '/jointset/knee_r/knee_flex_r/speed', '/forceset/vasmed_r/activation']
+
+
+class TestChunkedStates(unittest.TestCase):
+    def setUp(self):
+        self.temporary = tempfile.TemporaryDirectory()
+        self.directory = self.temporary.name
+        self.time = np.round(np.arange(25) * 0.01, 10)
+        self.data = np.column_stack([np.sin(self.time), np.cos(self.time), self.time ** 2])
+
+    def tearDown(self):
+        self.temporary.cleanup()
+
+    def write_table(self, chunk_size=10):
+        writer = states_stream.ChunkedStatesWriter(os.path.join(self.directory, 'states'), LABELS, chunk_size)
+        for t, row in zip(self.time, self.data):
+            writer.append(t, row)
+        writer.close()
+        return states_stream.ChunkedStatesTable(os.path.join(self.directory, 'states'))
+
+    def test_writer_round_trip(self):
+        table = self.write_table()
+        self.assertEqual(len(table), len(self.time))
+        self.assertEqual([chunk['rows'] for chunk in table.chunks], [10, 10, 5])
+        self.assertEqual(table.labels, LABELS)
+        np.testing.assert_array_equal(table.time, self.time)
+        blocks = list(table.windows())
+        np.testing.assert_array_equal(np.concatenate([values for _, values in blocks]), self.data)
+
+    def test_window_and_columns(self):
+        table = self.write_table()
+        blocks = list(table.windows(start_time=0.08, stop_time=0.12, columns=[LABELS[2]]))
+        # Only the blocks overlapping the window are read
+        self.assertEqual(len(blocks), 2)
+        time = np.concatenate([t for t, _ in blocks])
+        values = np.concatenate([v for _, v in blocks])
+        np.testing.assert_allclose(time, [0.08, 0.09, 0.10, 0.11, 0.12])
+        np.testing.assert_allclose(values[:, 0], time ** 2)
+
+    def test_sto_round_trip(self):
+        states_file = os.path.join(self.directory, 'walking_states.sto')
+        write_sto(states_file, {'time': self.time, 'labels': LABELS, 'data': self.data, 'in_degrees': False})
+        table = states_stream.convert_sto(states_file, os.path.join(self.directory, 'converted'), chunk_size=7)
+        self.assertEqual(len(table.chunks), 4)
+        np.testing.assert_allclose(table.time, self.time)
+
+        output_file = table.write_sto(os.path.join(self.directory, 'window.sto'), start_time=0.05, stop_time=0.2)
+        window = read_sto(output_file)
+        self.assertEqual(window['labels'], LABELS)
+        keep = (self.time >= 0.05 - 1e-9) & (self.time <= 0.2 + 1e-9)
+        np.testing.assert_allclose(window['time'], self.time[keep])
+        np.testing.assert_allclose(window['data'], self.data[keep], rtol=1e-9)
+
+    def test_missing_table(self):
+        with self.assertRaises(FileNotFoundError):
+            states_stream.ChunkedStatesTable(os.path.join(self.directory, 'missing'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""Tests of the metric reductions of summary_metrics.py (no OpenSim needed)."""
+
+import os
+import json
+import tempfile
+import unittest
+
+import numpy as np
+
+import summary_metrics
+
+BODY_WEIGHT = 70.0
+
+
+class TestComputeMetrics(unittest.TestCase):
+    def setUp(self):
+        # Two frames per percent of the cycle, the resampled points fall on frames
+        self.time = np.linspace(1.0, 2.0, 201)
+        percent = np.linspace(0, 100, 201)
+        force = np.exp(-((percent - 15) / 5) ** 2) * 2.5 + np.exp(-((percent - 45) / 5) ** 2) * 2.0
+        self.sources = {
+            'joint_mechanics': (self.time, {
+                'contact_force': force * BODY_WEIGHT * summary_metrics.GRAVITY,
+                'max_pressure': 5.0 + np.sin(np.pi * percent / 100),
+                'contact_area': np.where(percent <= 12, 300.0, 100.0),
+            }),
+            'activation': (self.time, {'vasmed_r': np.clip(np.sin(2 * np.pi * percent / 100), 0, None)}),
+        }
+
+    def test_catalog_metrics(self):
+        metrics = summary_metrics.compute_metrics(summary_metrics.METRIC_CATALOG, self.sources, BODY_WEIGHT)
+        self.assertAlmostEqual(metrics['first_peak_contact_force'], 2.5, places=3)
+        self.assertAlmostEqual(metrics['second_peak_contact_force'], 2.0, places=3)
+        self.assertAlmostEqual(metrics['peak_contact_force'], 2.5, places=3)
+        self.assertAlmostEqual(metrics['first_peak_pressure_timing'], 30.0)
+        self.assertAlmostEqual(metrics['second_peak_pressure_timing'], 50.0)
+        self.assertAlmostEqual(metrics['loading_contact_area'], 300.0)
+        self.assertAlmostEqual(metrics['peak_activation_vasmed_r'], 1.0, places=3)
+
+    def test_missing_channels_are_left_out(self):
+        metrics = summary_metrics.compute_metrics(summary_metrics.METRIC_CATALOG, self.sources, BODY_WEIGHT)
+        self.assertNotIn('peak_medial_pressure', metrics)
+        self.assertNotIn('peak_activation_soleus_r', metrics)
+        self.assertEqual(summary_metrics.compute_metrics(summary_metrics.METRIC_CATALOG, {}, BODY_WEIGHT), {})
+
+    def test_min_and_mean_reductions(self):
+        catalog = {
+            'min_pressure': {'source': 'joint_mechanics', 'channel': 'max_pressure', 'reduce': 'min', 'phase': (0, 100)},
+            'mean_late_area': {'source': 'joint_mechanics', 'channel': 'contact_area', 'reduce': 'mean', 'phase': (50, 100)},
+        }
+        metrics = summary_metrics.compute_metrics(catalog, self.sources, BODY_WEIGHT)
+        self.assertAlmostEqual(metrics['min_pressure'], 5.0)
+        self.assertAlmostEqual(metrics['mean_late_area'], 100.0)
+
+
+class TestLoadCatalog(unittest.TestCase):
+    def write(self, catalog):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        catalog_file = os.path.join(temporary.name, 'catalog.json')
+        with open(catalog_file, 'w') as f:
+            json.dump(catalog, f)
+        return catalog_file
+
+    def test_phase_defaults_to_the_cycle(self):
+        catalog = summary_metrics.load_catalog(self.write({'peak': {'source': 'activation', 'channel': 'soleus_r', 'reduce': 'max'}}))
+        self.assertEqual(catalog['peak']['phase'], summary_metrics.CYCLE)
+
+    def test_invalid_reduction(self):
+        with self.assertRaises(ValueError):
+            summary_metrics.load_catalog(self.write({'peak': {'source': 'activation', 'channel': 'soleus_r', 'reduce': 'median'}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+import traceback
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cohort
+import setup_generator
+import kinematics_preprocessing
+from log_sink import patient_log
+from cohort_index import CohortIndex, STAGE_DIRECTORIES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# The MATLAB scripts and the ParaView script resolve '../results' and '../data' from here
+MATLAB_SCRIPTS_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Job type -> tool class name, setup file written by setup_generator.py
+TOOL_JOBS = {
+    'comak_inverse_kinematics': 'COMAKInverseKinematicsTool',
+    'comak': 'COMAKTool',
+    'joint_mechanics': 'JointMechanicsTool',
+}
+# 'moco_inverse' is the MocoInverse backend of the muscle-redundancy stage (alternative to 'comak')
+JOB_TYPES = list(TOOL_JOBS) + ['moco_inverse', 'render']
+
+
+class WorkerService:
+    """
+    Long-lived worker that imports OpenSim and ParaView once, keeps parsed models loaded
+    and runs submitted jobs one after the other.
+    """
+
+    def __init__(self, stages=('opensim', 'paraview')):
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.models = {}
+        self.osim = None
+        self.renderer = None
+
+        if 'opensim' in stages:
+            import opensim
+            self.osim = opensim
+            print('[INFO] OpenSim loaded.')
+        if 'paraview' in stages:
+            import paraview_visualization
+            self.renderer = paraview_visualization
+            print('[INFO] ParaView loaded.')
+
+        threading.Thread(target=self._run_jobs, daemon=True).start()
+
+    def submit(self, job_type, project_id, numeric_id, tier=None):
+        """
+        Queues a job.
+
+        Parameters:
+        job_type (str): One of JOB_TYPES.
+        project_id (str): Project identifier (e.g., 'STRATO').
+        numeric_id (str): Numeric identifier of the patient (e.g., '001').
+        tier (str): Render tier of render jobs (see paraview_renderer.RENDER_TIERS). Optional.
+
+        Returns:
+        dict: The job record.
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f'Unknown job type: {job_type}')
+        if (job_type == 'render' and self.renderer is None) or (job_type != 'render' and self.osim is None):
+            raise ValueError(f'The service was started without support for {job_type} jobs')
+
+        with self.lock:
+            job = {'id': len(self.jobs) + 1, 'type': job_type, 'project_id': project_id, 'numeric_id': numeric_id,
+                   'tier': tier, 'status': 'queued', 'progress': 0.0, 'message': '', 'submitted': time.time(),
+                   'started': None, 'finished': None}
+            self.jobs[job['id']] = job
+        self.queue.put(job['id'])
+        return dict(job)
+
+    def get(self, job_id):
+        with self.lock:
+            return dict(self.jobs[job_id]) if job_id in self.jobs else None
+
+    def list(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def _update(self, job_id, **values):
+        with self.lock:
+            self.jobs[job_id].update(values)
+
+    def _run_jobs(self):
+        while True:
+            job_id = self.queue.get()
+            job = self.get(job_id)
+            self._update(job_id, status='running', started=time.time())
+            try:
+                if job['type'] == 'render':
+                    self._render(job)
+                elif job['type'] == 'moco_inverse':
+                    self._run_moco_inverse(job)
+                else:
+                    self._run_tool(job)
+                self._update(job_id, status='done', progress=1.0, finished=time.time())
+                self._index(job, 'complete')
+            except Exception as e:
+                self._update(job_id, status='failed', message=f'{e}\n{traceback.format_exc()}', finished=time.time())
+                self._index(job, 'failed', str(e))
+
+    def _index(self, job, status, message=''):
+        # Stage status and output files of the patient in the cohort index
+        if job['type'] not in STAGE_DIRECTORIES:
+            return
+        try:
+            with CohortIndex() as index:
+                index.record_stage(job['project_id'], job['numeric_id'], job['type'], status, message)
+                if job['type'] == 'joint_mechanics' and status == 'complete':
+                    # Summary stage: scalar metrics of the patient computed once after the joint mechanics
+                    import summary_metrics
+
+                    summary_metrics.summarize_patient(job['project_id'], job['numeric_id'], index=index)
+        except Exception as e:
+            print(f"[ERROR] Cohort index or summary metrics not updated for job {job['id']}: {e}")
+
+    def _load_model(self, model_file):
+        """
+        Returns a copy of the parsed model, reloading it only if the file changed. The tools add
+        the reserve actuators and external loads to the model they are given, so every job gets
+        its own copy and the cached model stays as parsed.
+        """
+        key = (os.path.abspath(model_file), os.path.getmtime(model_file))
+        if key not in self.models:
+            self.models = {k: v for k, v in self.models.items() if k[0] != key[0]}
+            self.models[key] = self.osim.Model(model_file)
+        return self.models[key].clone()
+
+    def _run_tool(self, job):
+        tool_name = TOOL_JOBS[job['type']]
+        setup_file = os.path.join(cohort.patient_inputs_directory(job['project_id'], job['numeric_id']),
+                                  setup_generator.SETUP_FILES[tool_name])
+        if not os.path.isfile(setup_file):
+            raise FileNotFoundError(f'Setup file not found (run setup_generator.py first): {setup_file}')
+
+        if tool_name == 'COMAKTool':
+            kinematics_preprocessing.preprocess_patient(job['project_id'], job['numeric_id'])
+
+        self._update(job['id'], message=f'Loading {os.path.basename(setup_file)}', progress=0.1)
+        tool = getattr(self.osim, tool_name)(setup_file)
+        tool.setModel(self._load_model(tool.get_model_file()))
+
+        self._update(job['id'], message=f'Running {tool_name}', progress=0.2)
+        # Debug log of the run goes to results/<patient>/logs, rate-limited and written asynchronously
+        with patient_log(job['project_id'], job['numeric_id'], job['type']):
+            if not tool.run():
+                raise RuntimeError(f'{tool_name} failed')
+
+    def _run_moco_inverse(self, job):
+        import moco_inverse
+
+        self._update(job['id'], message='Solving MocoInverse', progress=0.1)
+        with patient_log(job['project_id'], job['numeric_id'], job['type']):
+            moco_inverse.run_moco_inverse(job['project_id'], job['numeric_id'])
+
+    def _render(self, job):
+        def progress(view, done, total):
+            # Two views, the first one covers 10-55 %, the second one 55-100 %
+            offset = 0.1 if view == 'side' else 0.55
+            self._update(job['id'], message=f'Rendering {view} view ({done}/{total})', progress=offset + 0.45 * done / total)
+
+        self._update(job['id'], message='Rendering ParaView views', progress=0.1)
+        if job['tier']:
+            self.renderer.run_paraview_analysis(job['numeric_id'], job['project_id'], job['tier'], progress=progress)
+        else:
+            self.renderer.run_paraview_analysis(job['numeric_id'], job['project_id'], progress=progress)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            parts = self.path.strip('/').split('/')
+            if parts == ['jobs']:
+                self._reply(200, service.list())
+            elif len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+                job = service.get(int(parts[1]))
+                self._reply(200 if job else 404, job or {'error': 'job not found'})
+            else:
+                self._reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if self.path.strip('/') != 'jobs':
+                self._reply(404, {'error': 'not found'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                job = service.submit(request['type'], request['project_id'], str(request['numeric_id']), request.get('tier'))
+                self._reply(202, job)
+            except (ValueError, KeyError) as e:
+                self._reply(400, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, stages=('opensim', 'paraview')):
+    """
+    Starts the worker service and blocks until interrupted.
+
+    Parameters:
+    host (str): Interface to bind to. Only bind to local interfaces.
+    port (int): Port to listen on.
+    stages (tuple): Runtimes to load ('opensim', 'paraview').
+
+    Returns:
+    None
+    """
+    os.chdir(MATLAB_SCRIPTS_DIRECTORY)
+    service = WorkerService(stages)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    print(f'[INFO] Worker service listening on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def request(path, body=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Sends a request to a running worker service.
+
+    Parameters:
+    path (str): Endpoint (e.g., '/jobs' or '/jobs/3').
+    body (dict): JSON body for POST requests. GET if None.
+    host (str): Service host.
+    port (int): Service port.
+
+    Returns:
+    dict or list: Decoded JSON response.
+    """
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f'http://{host}:{port}{path}', data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read())
+
+
+def submit_job(job_type, project_id, numeric_id, tier=None, wait=True, poll_interval=1.0, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    Submits a job to a running worker service and optionally waits for it, printing progress.
+
+    Parameters:
+    job_type (str): One of JOB_TYPES.
+    project_id (str): Project identifier (e.g., 'STRATO').
+    numeric_id (str): Numeric identifier of the patient (e.g., '001').
+    tier (str): Render tier of render jobs. Optional.
+    wait (bool): Wait until the job is done or failed.
+    poll_interval (float): Seconds between status requests.
+    host (str): Service host.
+    port (int): Service port.
+
+    Returns:
+    dict: The last job record.
+    """
+    body = {'type': job_type, 'project_id': project_id, 'numeric_id': numeric_id}
+    if tier:
+        body['tier'] = tier
+    job = request('/jobs', body, host, port)
+    if 'error' in job:
+        raise ValueError(job['error'])
+    message = None
+    while wait and job['status'] in ('queued', 'running'):
+        time.sleep(poll_interval)
+        job = request(f"/jobs/{job['id']}", host=host, port=port)
+        if job['message'] != message and job['status'] == 'running':
+            message = job['message']
+            print(f"[INFO] Job {job['id']} ({job['progress'] * 100:.0f}%): {message}")
+    return job
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Persistent worker service for the COMAK workflow.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST, help='Host of the service.')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port of the service.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Start the service.')
+    serve_parser.add_argument('--stages', type=str, nargs='+', default=['opensim', 'paraview'], choices=['opensim', 'paraview'], help='Runtimes to load.')
+
+    submit_parser = subparsers.add_parser('submit', help='Submit a job and wait for it.')
+    submit_parser.add_argument('type', type=str, choices=JOB_TYPES, help='Job type.')
+    submit_parser.add_argument('project', type=str, help='Project name (e.g., STRATO).')
+    submit_parser.add_argument('id', type=str, help='Numeric patient ID (e.g., 001).')
+    submit_parser.add_argument('--tier', type=str, default=None, help='Render tier of render jobs (archive, report or preview).')
+
+    subparsers.add_parser('status', help='List all jobs.')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.host, args.port, tuple(args.stages))
+    elif args.command == 'submit':
+        result = submit_job(args.type, args.project, args.id, args.tier, host=args.host, port=args.port)
+        print(f"[INFO] Job {result['id']} {result['status']}")
+        if result['status'] == 'failed':
+            print(f"[ERROR] {result['message']}")
+            sys.exit(1)
+    else:
+        for job in request('/jobs', host=args.host, port=args.port):
+            print(f"{job['id']:>5} {job['type']:<26} {job['project_id']}_{job['numeric_id']} {job['status']:<8} {job['progress'] * 100:5.0f}%")
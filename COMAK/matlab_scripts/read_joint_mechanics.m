@@ -0,0 +1,109 @@
+function jm = read_joint_mechanics(results_file, channel_names)
+    % READ_JOINT_MECHANICS Reads joint mechanics channels of the tibiofemoral contact.
+    %
+    % The HDF5 file written by the JointMechanicsTool is read if it exists: only the datasets
+    % of the requested channels are loaded. Older results without an HDF5 file are read from
+    % the ForceReporter .sto file.
+    %
+    % Inputs:
+    %   results_file  - Path to the .h5 file, to the _ForceReporter_forces.sto file, or the
+    %                   results path without extension (e.g., '.../joint_mechanics/walking_001'),
+    %                   in which case the .h5 file is preferred.
+    %   channel_names - Cell array of channel names (see joint_mechanics_channels). Optional,
+    %                   all channels by default.
+    %
+    % Outputs:
+    %   jm - Struct with the field 'time' and one field per channel ([nFrames x 1] or [nFrames x 3]).
+
+    channels = joint_mechanics_channels();
+    if nargin < 2
+        channel_names = fieldnames(channels);
+    end
+
+    % Resolve the results file
+    [~, ~, extension] = fileparts(results_file);
+    if ~any(strcmp(extension, {'.h5', '.sto'}))
+        if isfile([results_file '.h5'])
+            results_file = [results_file '.h5'];
+        else
+            results_file = [results_file '_ForceReporter_forces.sto'];
+        end
+        [~, ~, extension] = fileparts(results_file);
+    end
+    if ~isfile(results_file)
+        error('Joint mechanics results not found: %s', results_file);
+    end
+
+    jm = struct();
+    if strcmp(extension, '.h5')
+        datasets = h5_dataset_paths(results_file);
+        jm.time = h5read(results_file, find_dataset(datasets, '', 'time', ''));
+        jm.time = jm.time(:);
+        for i = 1:length(channel_names)
+            c = channels.(channel_names{i});
+            data = h5read(results_file, find_dataset(datasets, '/tf_contact/', c.output, 'tibia'));
+            jm.(channel_names{i}) = select_region(data, numel(jm.time), c.region, c.output);
+        end
+    else
+        [forces_data, ~, ~] = read_opensim_mot(results_file);
+        jm.time = forces_data(:, 1);
+        for i = 1:length(channel_names)
+            jm.(channel_names{i}) = forces_data(:, channels.(channel_names{i}).sto_columns);
+        end
+    end
+end
+
+function paths = h5_dataset_paths(file)
+    % Lists the dataset paths of an HDF5 file (cached until the file changes)
+    persistent cache
+    if isempty(cache)
+        cache = containers.Map();
+    end
+    file_info = dir(file);
+    key = sprintf('%s|%f', file, file_info.datenum);
+    if ~isKey(cache, key)
+        cache(key) = collect_datasets(h5info(file));
+    end
+    paths = cache(key);
+end
+
+function paths = collect_datasets(group)
+    paths = {};
+    for i = 1:length(group.Datasets)
+        paths{end + 1} = [regexprep(group.Name, '/$', '') '/' group.Datasets(i).Name]; %#ok<AGROW>
+    end
+    for i = 1:length(group.Groups)
+        paths = [paths, collect_datasets(group.Groups(i))]; %#ok<AGROW>
+    end
+end
+
+function path = find_dataset(paths, component, output, mesh)
+    % Finds the dataset of an output, e.g. /Smith2018ArticularContactForce/tf_contact/tibia_cartilage/total_mean_pressure
+    matches = paths(contains(paths, component) & contains(paths, mesh) & ...
+        ~cellfun(@isempty, regexp(paths, ['(^|/|_)' output '$'])));
+    if numel(matches) ~= 1
+        error('%d datasets for %s%s in the joint mechanics HDF5 file.', numel(matches), component, output);
+    end
+    path = matches{1};
+end
+
+function values = select_region(data, num_frames, region, output)
+    % Returns [nFrames x nComponents] for totals or the selected region of regional outputs.
+    % MATLAB reads HDF5 data in reversed dimension order: scalar totals are [nFrames x 1], vector
+    % totals [3 x nFrames], regional outputs [6 x nFrames] or, for vectors, [3 x 6 x nFrames].
+    if region == 0
+        if isequal(size(data), [num_frames, 1])
+            values = data;
+        elseif isequal(size(data), [3, num_frames])
+            values = data';
+        else
+            error('Unexpected layout of %s in the joint mechanics HDF5 file.', output);
+        end
+    elseif ndims(data) == 3 && isequal(size(data), [3, 6, num_frames])
+        values = squeeze(data(:, region, :))';
+    elseif isequal(size(data), [6, num_frames])
+        values = data(region, :)';
+    else
+        error('Unexpected layout of %s in the joint mechanics HDF5 file.', output);
+    end
+end
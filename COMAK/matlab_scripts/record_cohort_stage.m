@@ -0,0 +1,22 @@
+function record_cohort_stage(project_id, numeric_id, stage, data_directory)
+    % RECORD_COHORT_STAGE Records a completed stage of a patient in the cohort index.
+    %
+    % Calls "python cohort_index.py record", which marks the stage complete and registers its
+    % output files, so cohort_patients and the cohort plots find the patient without scanning
+    % the results directory.
+    %
+    % Inputs:
+    %   project_id     - Project identifier (e.g., 'STRATO').
+    %   numeric_id     - Numeric identifier of the patient (e.g., '001').
+    %   stage          - Stage name: 'comak_inverse_kinematics', 'comak' or 'joint_mechanics'.
+    %   data_directory - Directory containing the patient folders (read if the patient is not indexed yet).
+
+    script = fullfile(fileparts(mfilename('fullpath')), 'python_scripts', 'cohort_index.py');
+    cmd = sprintf('python "%s" record %s %s %s --data-directory "%s"', script, project_id, numeric_id, stage, data_directory);
+    [status, output] = system(cmd);
+    if status ~= 0
+        disp(['ERROR: Stage ' stage ' of ' project_id '_' numeric_id ' not recorded in the cohort index: ' strtrim(output)]);
+    else
+        disp(strtrim(output));
+    end
+end
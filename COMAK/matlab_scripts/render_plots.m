@@ -0,0 +1,22 @@
+function render_plots(plot_types, patients)
+    % RENDER_PLOTS Renders the activation, kinematics and mean activation PNGs with plot_renderer.py.
+    %
+    % Replaces plot_activations, plot_kinematics and plot_all_patients_activations in the workflow:
+    % the figures are rendered by parallel Python workers with the same file names.
+    %
+    % Inputs:
+    %   plot_types - Cell array of plot types: 'activations', 'kinematics' and/or 'mean_activations'.
+    %   patients   - Cell array of patients as '<project>_<id>' (e.g., {'STRATO_001'}). Optional,
+    %                all patients of the cohort index by default.
+
+    script = fullfile(fileparts(mfilename('fullpath')), 'python_scripts', 'plot_renderer.py');
+    cmd = sprintf('python "%s" --types %s', script, strjoin(plot_types, ' '));
+    if nargin > 1 && ~isempty(patients)
+        cmd = [cmd ' --patients ' strjoin(patients, ' ')];
+    end
+    [status, output] = system(cmd);
+    disp(strtrim(output));
+    if status ~= 0
+        disp(['ERROR: Plots not rendered: ' strjoin(plot_types, ', ')]);
+    end
+end
@@ -1,11 +1,14 @@
-function runParaviewVisualization(id, project)
+function runParaviewVisualization(id, project, tier)
     % runParaviewVisualization - Executes a Paraview visualization script from MATLAB.
     % Usage:
     %   runParaviewVisualization(id, project)
+    %   runParaviewVisualization(id, project, tier)
     %
     % Parameters:
     %   id      - Identifier for the visualization (string).
     %   project - Name of the project (string).
+    %   tier    - Render tier: 'preview', 'report' (default) or 'archive' (string).
+    %             Lower tiers are derived from up-to-date higher tiers if available.
     %
     % This function sets up a Conda environment and runs a Python script 
     % for visualizing simulation results using Paraview. It checks if the 
@@ -22,28 +25,58 @@ function runParaviewVisualization(id, project)
     % Date: July 2024
 
 
+    if nargin < 3
+        tier = 'report';
+    end
+
+    % Use the persistent worker service if it is running (see python_scripts/worker_service.py)
+    % so ParaView does not have to be started for every patient
+    serviceUrl = 'http://127.0.0.1:8765/jobs';
+    try
+        job = webwrite(serviceUrl, struct('type', 'render', 'project_id', project, 'numeric_id', id, 'tier', tier), ...
+            weboptions('MediaType', 'application/json', 'Timeout', 5));
+    catch
+        job = []; % No service running, fall back to a new Python process
+    end
+
+    if ~isempty(job)
+        fprintf('Running Paraview visualization for ID: %s, Project: %s on worker service (job %d)...\n', id, project, job.id);
+        while any(strcmp(job.status, {'queued', 'running'}))
+            pause(1);
+            job = webread(sprintf('%s/%d', serviceUrl, job.id), weboptions('Timeout', 30));
+        end
+        if strcmp(job.status, 'failed')
+            disp(['ERROR: Paraview visualization failed: ' job.message]);
+        end
+        return;
+    end
+
     % Define environment and dependencies
     envName = 'paraview-env'; % Name of the Conda environment
     dependencies = ["paraview", "tqdm"]; % Required Python packages
 
-    % Check if Conda environment exists
-    [~, envList] = system('conda env list'); % Get list of Conda environments
-    envExists = contains(envList, envName); % Check if 'paraview-env' exists
+    % Check if Conda environment exists (only once per MATLAB session)
+    persistent envChecked
+    if isempty(envChecked)
+        [~, envList] = system('conda env list'); % Get list of Conda environments
+        envExists = contains(envList, envName); % Check if 'paraview-env' exists
 
-    if ~envExists
-        % Create the Conda environment if it doesn't exist
-        system(sprintf('conda create -n %s python=3.8 -y', envName)); % Create environment
-        % Activate the environment and install dependencies
-        for dep = dependencies
-            system(sprintf('conda run -n %s pip install %s', envName, dep)); % Install each dependency
+        if ~envExists
+            % Create the Conda environment if it doesn't exist
+            system(sprintf('conda create -n %s python=3.8 -y', envName)); % Create environment
+            % Activate the environment and install dependencies
+            for dep = dependencies
+                system(sprintf('conda run -n %s pip install %s', envName, dep)); % Install each dependency
+            end
         end
+        envChecked = true;
     end
 
     % Define the path to the Python script
     pythonScriptPath = 'python_scripts/paraview_visualization.py';
 
     % Create the command to run the Python script
-    cmd = sprintf('conda run -n %s python "%s" %s %s', envName, pythonScriptPath, id, project);
+    cmd = sprintf('conda run -n %s python "%s" %s %s --tier %s', envName, pythonScriptPath, id, project, tier);
 
     % Run the Python script from MATLAB
     fprintf('Running Paraview visualization for ID: %s, Project: %s...\n', id, project); % Display message
@@ -38,13 +38,23 @@ function [] = run_comak(model_file, ext_load_file, comak_result_dir, numeric_id,
         comak_contact_energy_result_dir = []
     end
      
+    % Filter and resample the IK motion once (6 Hz, python_scripts/kinematics_preprocessing.py);
+    % COMAK reads the preprocessed table with its own filtering disabled
+    ik_file = ['../results/' project_id '_' numeric_id '/comak_inverse_kinematics/' results_basename '_ik.mot'];
+    [status, output] = system(sprintf('python "%s" --motion-files "%s"', ...
+        fullfile(fileparts(mfilename('fullpath')), 'python_scripts', 'kinematics_preprocessing.py'), ik_file));
+    disp(strtrim(output));
+    if status ~= 0
+        error('Preprocessing of the IK motion failed: %s', ik_file);
+    end
+
     % Run COMAK
     import org.opensim.modeling.*
     Logger.setLevelString('Debug');
 
     comak = COMAKTool();
     comak.set_model_file(model_file);
-    comak.set_coordinates_file(['../results/' project_id '_' numeric_id '/comak_inverse_kinematics/' results_basename '_ik.mot']);
+    comak.set_coordinates_file(['../results/' project_id '_' numeric_id '/comak_inverse_kinematics/' results_basename '_ik_processed.mot']);
     comak.set_external_loads_file(ext_load_file);
     comak.set_results_directory(comak_result_dir);
     comak.set_results_prefix(results_basename);
@@ -53,7 +63,7 @@ function [] = run_comak(model_file, ext_load_file, comak_result_dir, numeric_id,
     comak.set_start_time(time_start);
     comak.set_stop_time(time_stop);
     comak.set_time_step(0.01);
-    comak.set_lowpass_filter_frequency(6);
+    comak.set_lowpass_filter_frequency(-1);
     comak.set_print_processed_input_kinematics(false);
     comak.set_prescribed_coordinates(0,'/jointset/gnd_pelvis/pelvis_tx');
     comak.set_prescribed_coordinates(1,'/jointset/gnd_pelvis/pelvis_ty');
@@ -47,16 +47,18 @@ function [] = run_joint_mechanics(model_file, comak_result_dir, jnt_mech_result_
     jnt_mech.set_contacts(0,'all');
     jnt_mech.set_contact_outputs(0,'all');
     jnt_mech.set_contact_mesh_properties(0,'none');
-    jnt_mech.set_ligaments(0,'all');
-    jnt_mech.set_ligament_outputs(0,'all');
-    jnt_mech.set_muscles(0,'all');
-    jnt_mech.set_muscle_outputs(0,'all');
+    % Ligament and muscle outputs are computed on demand from the COMAK states
+    % (python_scripts/states_outputs.py) instead of being dumped for every frame
+    jnt_mech.set_ligaments(0,'none');
+    jnt_mech.set_ligament_outputs(0,'none');
+    jnt_mech.set_muscles(0,'none');
+    jnt_mech.set_muscle_outputs(0,'none');
     jnt_mech.set_attached_geometry_bodies(0,'all');
     jnt_mech.set_output_orientation_frame('ground');
     jnt_mech.set_output_position_frame('ground');
     jnt_mech.set_write_vtp_files(print_vtp);
     jnt_mech.set_vtp_file_format('binary');
-    jnt_mech.set_write_h5_file(false);
+    jnt_mech.set_write_h5_file(true); % Primary results file, read by read_joint_mechanics.m
     jnt_mech.set_h5_kinematics_data(true);
     jnt_mech.set_h5_states_data(true);
     jnt_mech.set_write_transforms_file(false);
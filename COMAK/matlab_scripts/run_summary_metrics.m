@@ -0,0 +1,19 @@
+function run_summary_metrics(project_id, numeric_id)
+    % RUN_SUMMARY_METRICS Computes the summary metrics of a patient after the joint mechanics stage.
+    %
+    % Calls "python summary_metrics.py --patients <project>_<id>", which writes the patient's
+    % summary file, records the metrics in the cohort index and updates the cohort summary
+    % (the same stage the worker service runs after its joint mechanics jobs).
+    %
+    % Inputs:
+    %   project_id - Project identifier (e.g., 'STRATO').
+    %   numeric_id - Numeric identifier of the patient (e.g., '001').
+
+    script = fullfile(fileparts(mfilename('fullpath')), 'python_scripts', 'summary_metrics.py');
+    cmd = sprintf('python "%s" --patients %s_%s', script, project_id, numeric_id);
+    [status, output] = system(cmd);
+    disp(strtrim(output));
+    if status ~= 0
+        disp(['ERROR: Summary metrics of ' project_id '_' numeric_id ' not computed.']);
+    end
+end
@@ -4,7 +4,8 @@ function save_output_to_text_file(project_id, numeric_id, forces_file)
     % Inputs:
     %   project_id - Identifier for the project.
     %   numeric_id - Numeric identifier for the patient.
-    %   forces_file - File containing joint forces data.
+    %   forces_file - ForceReporter .sto file, or the joint mechanics results path without
+    %                 extension (the _ForceReporter_forces.sto file next to the .h5 file is read).
     %
     % This function extracts relevant data from the provided forces file and saves it to a text file
     % named 'force_data.txt' in the results directory of the project.
@@ -12,6 +13,15 @@ function save_output_to_text_file(project_id, numeric_id, forces_file)
     % Author: Aurel Berger
     % Date: July 2024
     
+    % Resolve the ForceReporter file written by the JointMechanicsTool (run_joint_mechanics)
+    [results_path, results_name, extension] = fileparts(forces_file);
+    if ~strcmp(extension, '.sto')
+        forces_file = fullfile(results_path, [results_name '_ForceReporter_forces.sto']);
+    end
+    if ~isfile(forces_file)
+        error('ForceReporter file not found (rerun run_joint_mechanics): %s', forces_file);
+    end
+
     % Extract the relevant data and labels
     [forces_data, forces_labels, ~] = read_opensim_mot(forces_file);
     columns = forces_labels([584:594, 3, 4, 599, 600, 605, 606, 611, 612, 625:630, 635, 636, 641, 642, 655:660, 673:678, 691:696], :);
@@ -93,7 +93,7 @@ def bilateralize(name, ls_dict):
     return name, ls_dict
 
 def getIndexForNearestValue(vec, val):
-    return min(range(len(vec)), key=lambda i: abs(vec[i]-val))
+    return int(np.argmin(np.abs(np.asarray(vec) - val)))
 
 def truncate(string, max_length):
     """https://www.xormedia.com/string-truncate-middle-with-ellipsis/"""
@@ -107,6 +107,60 @@ def truncate(string, max_length):
     return '{0}...{1}'.format(string[:n_1], string[-n_2:])
 
 
+class TrajectoryCache(object):
+    """Columnar view of a MocoTrajectory. The time vector and the matrices of
+    the states, controls, multipliers, derivatives and parameters are fetched
+    once with the bulk NumPy accessors (getStatesTrajectoryMat(), etc.), and
+    variables are looked up through name-to-column indexes, instead of one SWIG
+    call per element. If max_num_times is given, longer trajectories are first
+    decimated with MocoTrajectory.resampleWithNumTimes()."""
+    def __init__(self, trajectory, max_num_times=None):
+        if max_num_times and trajectory.getNumTimes() > max_num_times:
+            trajectory.resampleWithNumTimes(int(max_num_times))
+        self.time = np.asarray(trajectory.getTimeMat()).ravel()
+        self.matrices = dict()
+        self.indexes = dict()
+        variables = [
+            ('state', trajectory.getStateNames,
+             trajectory.getStatesTrajectoryMat),
+            ('control', trajectory.getControlNames,
+             trajectory.getControlsTrajectoryMat),
+            ('multiplier', trajectory.getMultiplierNames,
+             trajectory.getMultipliersTrajectoryMat),
+            ('derivative', trajectory.getDerivativeNames,
+             trajectory.getDerivativesTrajectoryMat),
+        ]
+        # Slacks are not accessible through the MocoTrajectory bindings of
+        # every version.
+        if (hasattr(trajectory, 'getSlackNames') and
+                hasattr(trajectory, 'getSlacksTrajectoryMat')):
+            variables.append(('slack', trajectory.getSlackNames,
+                              trajectory.getSlacksTrajectoryMat))
+        for var_type, getNames, getMat in variables:
+            names = list(getNames())
+            self.indexes[var_type] = {name: i for i, name in enumerate(names)}
+            self.matrices[var_type] = (np.asarray(getMat()) if names else
+                                       np.empty((len(self.time), 0)))
+        names = list(trajectory.getParameterNames())
+        self.indexes['parameter'] = {name: i for i, name in enumerate(names)}
+        self.parameters = (np.asarray(trajectory.getParametersMat()).ravel()
+                           if names else np.empty(0))
+
+    def names(self, var_type):
+        return list(self.indexes[var_type].keys())
+
+    def has(self, var_type, name):
+        return name in self.indexes.get(var_type, {})
+
+    def get(self, var_type, name):
+        if var_type == 'parameter':
+            return self.parameters[self.indexes['parameter'][name]]
+        if not self.has(var_type, name):
+            raise KeyError("No %s named '%s' in the trajectory." % (var_type,
+                                                                   name))
+        return self.matrices[var_type][:, self.indexes[var_type][name]]
+
+
 class Report(object):
     def __init__(self,
                  model,
@@ -115,11 +169,14 @@ class Report(object):
                  ref_files=None,
                  colormap=None,
                  output=None,
+                 max_num_times=None,
                  ):
         self.model = model
         self.model.initSystem()
         self.trajectory_filepath = trajectory_filepath
         self.trajectory = osim.MocoTrajectory(self.trajectory_filepath)
+        # Load all variables once; plots index these arrays.
+        self.cache = TrajectoryCache(self.trajectory, max_num_times)
         self.bilateral = bilateral
         self.ref_files = ref_files
         self.colormap = colormap
@@ -202,8 +259,7 @@ class Report(object):
 
         # Time
         # -----
-        # Convert trajectory time vector to a plotting-friendly NumPy array.
-        self.time = convert(self.trajectory.getTime())
+        self.time = self.cache.time
         # Create a conservative set of x-tick values based on the time vector.
         nexttime = math.ceil(self.time[0] * 10) / 10
         nexttolast = math.floor(self.time[-1] * 10) / 10
@@ -218,32 +274,7 @@ class Report(object):
         self.num_rows = (self.plots_per_page / self.num_cols) + 1
 
     def getVariable(self, type, path):
-        if type == 'state':
-            var = convert(self.trajectory.getState(path))
-        elif type == 'control':
-            var = convert(self.trajectory.getControl(path))
-        elif type == 'multiplier':
-            var = convert(self.trajectory.getMultiplier(path))
-        elif type == 'derivative':
-            derivativesTraj = self.trajectory.getDerivativesTrajectory()
-            derivativeNames = self.trajectory.getDerivativeNames()
-            count = 0
-            col = 0
-            for derivName in derivativeNames:
-                if derivName == path:
-                    col = count
-                count += 1
-
-            n = derivativesTraj.nrow()
-            var = np.empty(n)
-            for row in range(n):
-                var[row] = derivativesTraj.get(row, col)
-        elif type == 'slack':
-            var = convert(self.trajectory.getSlack(path))
-        elif type == 'parameter':
-            var = convert(self.trajectory.getParameter(path))
-
-        return var
+        return self.cache.get(type, path)
 
     def plotVariables(self, var_type, var_dict, ls_dict, label_dict):
         import matplotlib.pyplot as plt
@@ -337,8 +368,8 @@ class Report(object):
 
             # States & Accelerations
             # ----------------------
-            state_names = self.trajectory.getStateNames()
-            derivative_names = self.trajectory.getDerivativeNames()
+            state_names = self.cache.names('state')
+            derivative_names = self.cache.names('derivative')
             derivs = True if (len(derivative_names) > 0) else False
             accels = False
             auxiliary_derivative_names = list()
@@ -482,7 +513,7 @@ class Report(object):
 
             # Controls
             # --------
-            control_names = self.trajectory.getControlNames()
+            control_names = self.cache.names('control')
             if len(control_names) > 0:
                 control_dict = OrderedDict()
                 ls_dict = defaultdict(list)
@@ -507,7 +538,7 @@ class Report(object):
 
             # Multipliers
             # -----------
-            multiplier_names = self.trajectory.getMultiplierNames()
+            multiplier_names = self.cache.names('multiplier')
             if len(multiplier_names) > 0:
                 multiplier_dict = OrderedDict()
                 ls_dict = defaultdict(list)
@@ -534,14 +565,14 @@ class Report(object):
             # Parameters
             # ----------
             # TODO: this is a crude first attempt, need to refine.
-            parameter_names = self.trajectory.getParameterNames()
+            parameter_names = self.cache.names('parameter')
             if len(parameter_names) > 0:
                 fig = plt.figure(figsize=(8.5, 11))
                 fig.patch.set_visible(False)
                 ax = plt.axes()
 
                 cell_text = []
-                parameters = convert(self.trajectory.getParameters())
+                parameters = self.cache.parameters
                 cell_text.append(['%10.5f' % p for p in parameters])
 
                 plt.table(cellText=cell_text, rowLabels=parameter_names,
@@ -563,7 +594,7 @@ class Report(object):
 
             # Slacks
             # ------
-            # TODO slacks not accessible through MocoTrajectory
+            # TODO slacks are only cached if MocoTrajectory exposes them
             # TODO should we even plot these?
 
 def main():
@@ -596,6 +627,10 @@ def main():
                         help="Write the report to this filepath. "
                              "Default: the report is named "
                              "<trajectory-without-.sto>_report.pdf")
+    parser.add_argument('--max-num-times', type=int,
+                        help="Resample trajectories with more time points "
+                             "to this number of times before plotting. "
+                             "Default: plot all time points.")
     args = parser.parse_args()
 
     # Load the Model and MocoTrajectory from file.
@@ -614,6 +649,7 @@ def main():
                     colormap=args.colormap,
                     ref_files=ref_files,
                     output=args.output,
+                    max_num_times=args.max_num_times,
                     )
     report.generate()
 
@@ -216,6 +216,38 @@ class TestSwigAddtlInterface(unittest.TestCase):
         assert (it.getDerivativesTrajectoryMat() == dt).all()
         assert (it.getParametersMat() == p).all()
 
+    def test_report_TrajectoryCache(self):
+        try:
+            import numpy as np
+        except ImportError as e:
+            print("Could not import numpy; skipping test.")
+            return
+        from opensim.report import TrajectoryCache
+
+        time = np.linspace(0, 0.2, 5)
+        st = np.random.rand(5, 2)
+        ct = np.random.rand(5, 3)
+        mt = np.random.rand(5, 1)
+        dt = np.random.rand(5, 1)
+        p = np.random.rand(2)
+        it = osim.MocoTrajectory(time, ['s0', 's1'], ['c0', 'c1', 'c2'],
+                              ['m0'], ['d0'], ['p0', 'p1'], st, ct, mt, dt, p)
+        cache = TrajectoryCache(it)
+        assert (cache.time == time).all()
+        assert (cache.get('state', 's1') == st[:, 1]).all()
+        assert (cache.get('control', 'c2') == ct[:, 2]).all()
+        assert (cache.get('multiplier', 'm0') == mt[:, 0]).all()
+        assert (cache.get('derivative', 'd0') == dt[:, 0]).all()
+        assert cache.get('parameter', 'p1') == p[1]
+        assert cache.names('control') == ['c0', 'c1', 'c2']
+        with self.assertRaises(KeyError):
+            cache.get('state', 'c0')
+
+        # Decimation.
+        cache = TrajectoryCache(it, max_num_times=3)
+        assert len(cache.time) == 3
+        assert cache.get('state', 's0').shape == (3,)
+
     def test_createRep(self):
         model = osim.Model()
         model.setName('sliding_mass')